@@ -0,0 +1,95 @@
+import bisect
+import hashlib
+import random
+import threading
+import time
+from array import array
+from datetime import date
+
+
+def _ordinal(fecha):
+    if isinstance(fecha, str):
+        fecha = date.fromisoformat(fecha[:10])
+    return fecha.toordinal()
+
+
+class AlbumesAleatorios:
+    """Álbum al azar en tiempo constante, sin ORDER BY RAND().
+
+    Guarda las fechas de los álbumes completos (activos y con todas sus
+    imágenes) como un array ordenado de ordinales: 4 bytes por álbum. Elegir
+    uno es un bisect para quedarse con los anteriores a hoy (nunca se
+    destapa un álbum programado) y un índice al azar. Con `semilla` el índice
+    sale de un hash de la semilla, así que todos los procesos eligen el mismo
+    álbum para la misma fecha.
+
+    Tras subir, programar o desactivar imágenes se vuelve a comprobar solo
+    esa fecha (actualizar); cada `intervalo_recarga` segundos se recarga
+    todo, para recoger los cambios que hicieron otros procesos.
+    """
+
+    def __init__(self, cargar, totales, minimo_imagenes=6, intervalo_recarga=300):
+        self._cargar = cargar      # () -> fechas de los álbumes completos (None si falla)
+        self._totales = totales    # fechas -> {fecha: imágenes activas} (None si falla)
+        self._minimo = minimo_imagenes
+        self._intervalo = intervalo_recarga
+        self._lock = threading.Lock()
+        self._fechas = None
+        self._proxima_recarga = 0
+
+    def _vigentes(self):
+        ahora = time.monotonic()
+        fechas = self._fechas
+        if fechas is not None and ahora < self._proxima_recarga:
+            return fechas
+
+        with self._lock:
+            if self._fechas is None or ahora >= self._proxima_recarga:
+                cargadas = self._cargar()
+                if cargadas is not None:
+                    self._fechas = array('i', sorted({_ordinal(fecha) for fecha in cargadas}))
+                # También si falla: no reintentar en cada petición
+                self._proxima_recarga = ahora + self._intervalo
+            return self._fechas
+
+    def elegir(self, antes=None, semilla=None):
+        """Fecha de un álbum completo anterior a `antes` (hoy por defecto), o None si no hay ninguno"""
+        fechas = self._vigentes()
+        if not fechas:
+            return None
+        disponibles = bisect.bisect_left(fechas, _ordinal(antes or date.today()))
+        if disponibles == 0:
+            return None
+
+        if semilla is None:
+            indice = random.randrange(disponibles)
+        else:
+            resumen = hashlib.sha256(str(semilla).encode('utf-8')).digest()
+            indice = int.from_bytes(resumen[:8], 'big') % disponibles
+        return date.fromordinal(fechas[indice])
+
+    def actualizar(self, fechas):
+        """Vuelve a comprobar esas fechas (tras subir, programar o desactivar imágenes)"""
+        fechas = [fecha for fecha in fechas if fecha]
+        if not fechas or self._fechas is None:
+            return  # sin cargar todavía: la primera elección ya lo leerá todo
+        totales = self._totales(fechas)
+        if totales is None:
+            return
+        totales = {_ordinal(fecha): total for fecha, total in totales.items()}
+
+        with self._lock:
+            # Copia: quien está eligiendo sin lock sigue viendo un array coherente
+            nuevas = array('i', self._fechas)
+            for ordinal in sorted({_ordinal(fecha) for fecha in fechas}):
+                i = bisect.bisect_left(nuevas, ordinal)
+                presente = i < len(nuevas) and nuevas[i] == ordinal
+                completo = totales.get(ordinal, 0) >= self._minimo
+                if completo and not presente:
+                    nuevas.insert(i, ordinal)
+                elif presente and not completo:
+                    del nuevas[i]
+            self._fechas = nuevas
+
+    def __len__(self):
+        return len(self._fechas or ())
@@ -0,0 +1,56 @@
+import hashlib
+import os
+import re
+import tempfile
+
+# Nombre de un archivo direccionado por contenido: <sha256>.<extensión>
+PATRON_HASH = re.compile(r'^([0-9a-f]{64})\.[a-z0-9]+$')
+# Variante derivada de un archivo direccionado por contenido
+PATRON_VARIANTE_HASH = re.compile(r'^variantes/([0-9a-f]{64})-\d+\.[a-z0-9]+$')
+
+TAMANO_BLOQUE = 64 * 1024
+
+
+def extension_normalizada(nombre):
+    extension = nombre.rsplit('.', 1)[1].lower() if '.' in nombre else 'bin'
+    return 'jpg' if extension == 'jpeg' else extension
+
+
+def hash_de_nombre(nombre):
+    """sha256 si el nombre (o la variante) es direccionado por contenido, si no None"""
+    coincidencia = PATRON_HASH.match(nombre) or PATRON_VARIANTE_HASH.match(nombre)
+    return coincidencia.group(1) if coincidencia else None
+
+
+def guardar_por_contenido(origen, nombre_original, carpeta):
+    """Guarda el archivo como <sha256>.<ext> en la carpeta.
+
+    `origen` es cualquier objeto con read() (p. ej. el FileStorage de Flask).
+    Se escribe en un temporal de la misma carpeta mientras se calcula el hash
+    y luego se renombra; si ya existía un archivo con ese contenido se
+    descarta el temporal. Devuelve (nombre_final, sha256, ya_existia).
+    """
+    sha256 = hashlib.sha256()
+    descriptor, temporal = tempfile.mkstemp(dir=carpeta, prefix='.subida-', suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'wb') as destino:
+            for bloque in iter(lambda: origen.read(TAMANO_BLOQUE), b''):
+                sha256.update(bloque)
+                destino.write(bloque)
+        return mover_por_contenido(temporal, sha256.hexdigest(), nombre_original, carpeta)
+    except Exception:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+
+
+def mover_por_contenido(temporal, sha256, nombre_original, carpeta):
+    """Renombra un temporal ya escrito a su nombre por contenido (o lo descarta si está repetido)"""
+    nombre = f"{sha256}.{extension_normalizada(nombre_original)}"
+    destino = os.path.join(carpeta, nombre)
+    if os.path.exists(destino):
+        os.remove(temporal)
+        return nombre, sha256, True
+    os.chmod(temporal, 0o644)  # mkstemp lo crea solo legible por el dueño
+    os.replace(temporal, destino)
+    return nombre, sha256, False
@@ -1,29 +1,73 @@
 from flask import Flask, request, jsonify, send_from_directory, session
 from flask_cors import CORS
+import logging
 import os
-from datetime import datetime, timedelta
+import tarfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, date
+from werkzeug.exceptions import HTTPException
 from werkzeug.utils import secure_filename
 from config import Config
-from models import ImagenModel
+from models import ImagenModel, hash_usuario, CONSULTA_MI_INTENTO, CONSULTA_MIS_INTENTOS
+from almacen import guardar_por_contenido, mover_por_contenido, hash_de_nombre
+from subidas import PeticionConSubidas, ArchivoSubido
+from importacion import importar, ErrorImportacion
+from planificador import planificar
+from estaticos import servir_estatico
+from paquetes import (
+    partes_del_paquete, etag_paquete, cabecera_paquete, tamano_paquete, generar_paquete, TIPO_PAQUETE
+)
+from database import Database, liberar_conexion_de_peticion, estadisticas_pool
+from logs import configurar_logs
+from metricas import instrumentar
+import perfilador
+from cache import CacheAlbumes, segundos_hasta_medianoche, calcular_etag
+from busqueda import IndiceTitulos
+from corpus import SnapshotCorpus
+from aleatorio import AlbumesAleatorios
+from registro_intentos import RegistroIntentos
+from estadisticas import EstadisticasEnVivo
+from imagenes_derivadas import (
+    generar_variantes, calcular_previa, formatos_disponibles, elegir_variante, IndiceVariantes, FORMATOS
+)
 import uuid
 
+configurar_logs()
+log = logging.getLogger('muzikdle')
+
 app = Flask(__name__)
+# Las imágenes subidas se escriben en disco mientras llegan (ver subidas.py)
+app.request_class = PeticionConSubidas
 app.secret_key = Config.SECRET_KEY
 
+# Orígenes permitidos para la API (también los usa asgi.py)
+ORIGENES_CORS = [
+    "https://www.muzikdle.com",
+    "https://muzikdle.com",
+    "http://localhost:5000",  # Para desarrollo local
+    "http://127.0.0.1:5000"   # Para desarrollo local
+]
+
 CORS(app, resources={
     r"/api/*": {
-        "origins": [
-            "https://www.muzikdle.com",
-            "https://muzikdle.com",
-            "http://localhost:5000",  # Para desarrollo local
-            "http://127.0.0.1:5000"   # Para desarrollo local
-        ],
+        "origins": ORIGENES_CORS,
         "methods": ["GET", "POST", "OPTIONS"],
         "allow_headers": ["Content-Type", "Authorization"]
     }
 })
 app.config.from_object(Config)
 
+# Devolver al pool la conexión de cada petición al terminarla
+app.teardown_appcontext(liberar_conexion_de_peticion)
+
+# Latencia por ruta, consultas a MySQL por petición... en GET /metrics
+metricas = instrumentar(app)
+
+# Sentencias lentas, EXPLAIN y N+1 en GET /api/debug/perfil (solo si se activa)
+if Config.PERFILADOR_ACTIVO:
+    perfilador.instrumentar(app)
+
 # Crear carpeta de uploads si no existe
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 @app.route('/robots.txt')
@@ -44,18 +88,210 @@ def sitemap():
 
 # Instancia del modelo
 imagen_model = ImagenModel()
+
+# Variantes WebP/AVIF de cada archivo, para elegir la mejor al servir /uploads
+indice_variantes = IndiceVariantes(imagen_model.get_variantes)
+
+def cargar_album(fecha):
+    """Carga las imágenes de un álbum con sus URLs (None si falla la BD)"""
+    imagenes = imagen_model.get_imagenes_por_fecha(fecha)
+    if imagenes is None:
+        return None
+    return preparar_album(imagenes)
+
+def preparar_album(imagenes):
+    """Añade URL y srcset a las filas de un álbum (también lo usa asgi.py)"""
+    for imagen in imagenes:
+        imagen['url'] = f"/uploads/{os.path.basename(imagen['ruta_archivo'])}"  # URL relativa
+        # Anchos disponibles, para que el navegador elija (y precargue) el adecuado
+        anchos = sorted({variante['ancho'] for variante in imagen.get('variantes') or []})
+        imagen['srcset'] = ', '.join(f"{imagen['url']}?w={ancho} {ancho}w" for ancho in anchos) or None
+        # Ya que las tenemos, evitar la consulta al servir la imagen
+        indice_variantes.guardar(os.path.basename(imagen['ruta_archivo']), imagen.get('variantes'))
+    return imagenes
+
+# Caché de álbumes por fecha (se invalida al subir o programar imágenes)
+cache_albumes = CacheAlbumes(
+    cargar_album,
+    ttl=Config.CACHE_ALBUM_TTL,
+    max_entradas=Config.CACHE_ALBUM_MAX_ENTRADAS
+)
+
+# Álbumes completos para elegir uno al azar (respaldo cuando hoy no hay álbum)
+albumes_aleatorios = AlbumesAleatorios(
+    lambda: imagen_model.get_fechas_albumes_completos(Config.ALBUM_IMAGENES),
+    imagen_model.get_totales_albumes,
+    minimo_imagenes=Config.ALBUM_IMAGENES,
+    intervalo_recarga=Config.ALBUMES_ALEATORIOS_RECARGA
+)
+
+def album_del_dia(hoy=None):
+    """(álbum de hoy, None) o, si hoy no hay y ALBUM_RESPALDO, (álbum pasado al azar, su fecha)"""
+    hoy = hoy or date.today()
+    album = cache_albumes.obtener(hoy)
+    if (album and album['imagenes']) or not Config.ALBUM_RESPALDO:
+        return album, None
+    # Semilla = hoy: todos los jugadores (y todos los workers) reciben el mismo
+    fecha = albumes_aleatorios.elegir(antes=hoy, semilla=hoy.isoformat())
+    if fecha is None:
+        return album, None
+    return cache_albumes.obtener(fecha), fecha
+
+def numero_de_album(fecha):
+    """Número del álbum de una fecha, como lo calculan script.js e historial.js"""
+    return max(1, (fecha - date.fromisoformat(Config.FECHA_INICIO)).days + 1)
+
+def datos_respaldo(fecha_respaldo):
+    """Fecha y número del álbum de respaldo: el frontend registra la partida y pide estadísticas con ellos"""
+    return {'album_respaldo': fecha_respaldo.isoformat(), 'numero_respaldo': numero_de_album(fecha_respaldo)}
+
+def max_age_album_del_dia(fecha_respaldo=None):
+    """La misma URL sirve otro álbum mañana: no cachear más allá de medianoche (ni mucho el respaldo)"""
+    max_age = min(Config.CACHE_ALBUM_MAX_AGE, segundos_hasta_medianoche())
+    return min(max_age, Config.ALBUM_RESPALDO_MAX_AGE) if fecha_respaldo else max_age
+
+# Corpus de títulos y descripciones ya serializado y comprimido
+corpus_titulos = SnapshotCorpus(
+    imagen_model.get_corpus_titulos,
+    imagen_model.get_huella_imagenes,
+    intervalo_verificacion=Config.CORPUS_VERIFICACION_SEGUNDOS
+)
+
+# Estadísticas de los álbumes más consultados, en memoria
+contadores_en_vivo = EstadisticasEnVivo(
+    max_albumes=Config.ESTADISTICAS_MAX_ALBUMES,
+    intervalo=Config.ESTADISTICAS_RECONCILIACION_SEGUNDOS
+)
+
+# Partidas terminadas: se encolan y se escriben por lotes en segundo plano
+registro_intentos = RegistroIntentos(
+    max_cola=Config.INTENTOS_COLA_MAX,
+    intervalo=Config.INTENTOS_INTERVALO_ESCRITURA,
+    max_lote=Config.INTENTOS_LOTE_MAX,
+    activo=Config.INTENTOS_WRITE_BEHIND,
+    en_vivo=contadores_en_vivo
+)
+
+def formatear_estadisticas(stats):
+    """Estadísticas de un álbum en el formato que espera el frontend"""
+    porcentaje_acierto = 0
+    if stats['total_jugadores'] > 0:
+        porcentaje_acierto = (stats['aciertos'] / stats['total_jugadores']) * 100
+    
+    return {
+        'total_jugadores': stats['total_jugadores'],
+        'aciertos': stats['aciertos'],
+        'fallos': stats['fallos'],
+        'total_intentos': stats['total_intentos'],
+        'porcentaje_acierto': round(porcentaje_acierto, 1),
+        'distribucion_aciertos': {
+            'intento_1': stats['aciertos_intento_1'],
+            'intento_2': stats['aciertos_intento_2'],
+            'intento_3': stats['aciertos_intento_3'],
+            'intento_4': stats['aciertos_intento_4'],
+            'intento_5': stats['aciertos_intento_5']
+        }
+    }
+
+# Índice de títulos para el autocompletado (se construye en la primera búsqueda)
+indice_titulos = IndiceTitulos(
+    imagen_model.get_titulos_y_descripciones,
+    imagen_model.get_huella_imagenes,
+    intervalo_verificacion=Config.CORPUS_VERIFICACION_SEGUNDOS
+)
+
+@metricas.recolector
+def metricas_de_estado():
+    """Aciertos de las cachés, pool de MySQL y cola de partidas, leídos al exportar /metrics"""
+    caches = {
+        'album': cache_albumes,
+        'variantes': indice_variantes,
+        'estadisticas': contadores_en_vivo,
+    }
+    for nombre, cache in caches.items():
+        total = cache.aciertos + cache.fallos
+        etiquetas = {'cache': nombre}
+        yield 'muzikdle_cache_aciertos_total', 'counter', 'Lecturas servidas desde memoria', etiquetas, cache.aciertos
+        yield 'muzikdle_cache_fallos_total', 'counter', 'Lecturas que tuvieron que cargar los datos', etiquetas, cache.fallos
+        yield ('muzikdle_cache_ratio_aciertos', 'gauge', 'Aciertos / lecturas desde el arranque',
+               etiquetas, round(cache.aciertos / total, 4) if total else 0)
+
+    pool = estadisticas_pool()
+    yield 'muzikdle_db_pool_conexiones', 'gauge', 'Conexiones del pool', {'estado': 'en_uso'}, pool['en_uso']
+    yield 'muzikdle_db_pool_conexiones', 'gauge', 'Conexiones del pool', {'estado': 'maximo'}, pool['tamano']
+    for nombre in ('checkouts', 'agotamientos', 'timeouts', 'reconexiones'):
+        yield f'muzikdle_db_pool_{nombre}_total', 'counter', f'Pool de MySQL: {nombre}', None, pool[nombre]
+    yield ('muzikdle_db_pool_espera_segundos_total', 'counter', 'Tiempo esperando conexión libre',
+           None, pool['espera_total_ms'] / 1000)
+
+    yield 'muzikdle_intentos_en_cola', 'gauge', 'Partidas pendientes de escribir', None, registro_intentos.en_cola
+    yield 'muzikdle_intentos_escritos_total', 'counter', 'Partidas escritas por lotes', None, registro_intentos.intentos_escritos
+    yield ('muzikdle_intentos_escrituras_directas_total', 'counter', 'Partidas escritas en la petición (cola llena)',
+           None, registro_intentos.escrituras_directas)
+    yield ('muzikdle_intentos_descartados_total', 'counter', 'Partidas que MySQL rechazó y no se escribirán',
+           None, registro_intentos.intentos_descartados)
+
+def actualizar_historial(fechas):
+    """Refresca resumen_albumes tras un cambio; si falla, la escritura principal ya está hecha"""
+    fechas = [fecha for fecha in fechas if fecha]
+    try:
+        imagen_model.actualizar_resumen(fechas)
+        albumes_aleatorios.actualizar(fechas)
+    except Exception as e:
+        log.warning("No se pudo actualizar el resumen del historial: %s", e)
+
+def respuesta_cacheable(respuesta, etag, max_age):
+    """Añade ETag y Cache-Control, y responde 304 si el cliente ya lo tiene"""
+    respuesta.set_etag(etag)
+    respuesta.cache_control.public = True
+    respuesta.cache_control.max_age = max_age
+    return respuesta.make_conditional(request)
+
+def enlaces_precarga(imagenes, url_api=None):
+    """Valores de la cabecera Link para empezar a descargar el álbum cuanto antes.
+
+    Precarga la primera pista con el mismo srcset/sizes que usa el <img> del
+    frontend (si no coinciden, el navegador la descarga dos veces) y, desde
+    el HTML, también el JSON del álbum. Un CDN o proxy con Early Hints puede
+    reenviar estas cabeceras como 103 antes de que llegue la respuesta.
+    """
+    enlaces = []
+    if url_api:
+        enlaces.append(f"<{url_api}>; rel=preload; as=fetch; crossorigin")
+    if imagenes:
+        primera = imagenes[0]
+        enlace = f"<{primera['url']}>; rel=preload; as=image; fetchpriority=high"
+        if primera.get('srcset'):
+            enlace += f'; imagesrcset="{primera["srcset"]}"; imagesizes="{Config.IMAGEN_SIZES}"'
+        enlaces.append(enlace)
+    return enlaces
+
+def formatos_aceptados():
+    """Formatos derivados (avif/webp) que el cliente nombra en su cabecera Accept.
+
+    Solo cuenta el tipo exacto: `*/*` o `image/*` los envían también navegadores
+    que no saben decodificarlos.
+    """
+    aceptados = {m.lower() for m, q in request.accept_mimetypes if q > 0}
+    return {formato for formato, (mimetype, _) in FORMATOS.items() if mimetype in aceptados}
+
+def archivo_para_cliente(filename, aceptados, ancho=None):
+    """(archivo a enviar, variante elegida o None) para un archivo de uploads"""
+    variante = None
+    if aceptados:
+        variante = elegir_variante(indice_variantes.obtener(filename), aceptados, ancho)
+    return (variante['archivo'] if variante else filename), variante
 @app.route('/api/get-user-id', methods=['GET'])
 def api_get_user_id():
     try:
         user_id = get_or_create_user_id()
-        print(f"📤 Enviando user_id al frontend: {user_id}")
         return jsonify({
             'success': True,
             'user_id': user_id,
             'first_visit': session.get('first_visit')
         })
     except Exception as e:
-        print(f"Error en get-user-id: {str(e)}")
+        log.exception("Error en get-user-id")
         return jsonify({
             'success': False,
             'error': str(e),
@@ -64,65 +300,86 @@ def api_get_user_id():
 
 def get_or_create_user_id():
     """Genera o recupera un ID único para el usuario"""
-    print("=" * 60)
-    print("🔍 DEBUG get_or_create_user_id()")
-    
     # PRIMERA prioridad: user_id del frontend (localStorage)
     user_id_from_frontend = request.headers.get('X-User-ID')
     
-    print(f"   X-User-ID en headers: {user_id_from_frontend}")
-    
     # Si el frontend envía un user_id, USAR ESE SIEMPRE
     if user_id_from_frontend:
-        print(f"   ✅ USER ID DEL FRONTEND (localStorage): {user_id_from_frontend}")
-        
         # Guardar en sesión por compatibilidad
         session['user_id'] = user_id_from_frontend
         
         # Registrar primera visita si no existe
         if 'first_visit' not in session:
             session['first_visit'] = datetime.now().isoformat()
-            print(f"   📅 Primera visita registrada: {session['first_visit']}")
         
-        print(f"   🎯 User ID final (usando frontend): {user_id_from_frontend}")
-        print("=" * 60)
-        return user_id_from_frontend
+        origen, user_id = 'frontend', user_id_from_frontend
     
     # Si no hay user_id del frontend (primera carga sin JS ejecutado)
     # Usar sesión existente o crear nueva
-    if 'user_id' in session:
-        print(f"   🔄 Usando sesión existente: {session['user_id']}")
-        return session['user_id']
+    elif 'user_id' in session:
+        origen, user_id = 'sesion', session['user_id']
     else:
         # Crear nuevo user_id temporal
-        nuevo_id = str(uuid.uuid4())[:12]
-        session['user_id'] = nuevo_id
+        user_id = str(uuid.uuid4())[:12]
+        session['user_id'] = user_id
         session['first_visit'] = datetime.now().isoformat()
-        print(f"   🔴 NUEVO TEMPORAL (sin frontend): {nuevo_id}")
-        print("=" * 60)
-        return nuevo_id
+        origen = 'nuevo'
+    
+    # Se llama en cada petición: solo preparar el registro si DEBUG está activo
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("user_id resuelto", extra={
+            'user_id': user_id, 'origen': origen, 'primera_visita': session.get('first_visit')
+        })
+    return user_id
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
 
+# Métricas del pool de conexiones (checkouts, esperas, agotamientos)
+@app.route('/api/estado-pool', methods=['GET'])
+def get_estado_pool():
+    return jsonify({
+        'success': True,
+        'pool': estadisticas_pool()
+    })
+
+# Carpeta del frontend (las rutas relativas dependen del directorio de arranque)
+FRONTEND_FOLDER = os.path.join(app.root_path, '..', 'frontend')
+
 # Ruta para obtener la imagen del día
 @app.route('/')
 def serve_index():
-    return send_from_directory('../frontend', 'index.html')
+    respuesta = servir_estatico(FRONTEND_FOLDER, 'index.html', max_age=Config.CACHE_HTML_MAX_AGE)
+    try:
+        # El álbum que va a mostrar script.js (el del día o el de ?album=YYYY-MM-DD). Solo la
+        # primera pista: el JSON llega con /api/bootstrap, que lleva X-User-ID y no se puede precargar
+        fecha = request.args.get('album')
+        if fecha and request.args.get('dia'):
+            fecha = date.fromisoformat(fecha)
+        else:
+            fecha = None
+        album = cache_albumes.obtener(fecha) if fecha else album_del_dia()[0]
+        if album and album['imagenes']:
+            for enlace in enlaces_precarga(album['imagenes']):
+                respuesta.headers.add('Link', enlace)
+    except Exception as e:
+        # Las pistas de precarga son opcionales: nunca romper la portada por ellas
+        log.warning("No se pudieron añadir los enlaces de precarga: %s", e)
+    return respuesta
 
 # Ruta para archivos estáticos del frontend (CSS, JS)
 @app.route('/<path:filename>')
 def serve_frontend_files(filename):
-    return send_from_directory('../frontend', filename)
+    return servir_estatico(FRONTEND_FOLDER, filename, max_age=Config.CACHE_HTML_MAX_AGE)
 
 # Ruta para archivos dentro de carpetas (css/, js/)
 @app.route('/css/<path:filename>')
 def serve_css(filename):
-    return send_from_directory('../frontend/css', filename)
+    return servir_estatico(os.path.join(FRONTEND_FOLDER, 'css'), filename, max_age=Config.CACHE_CSS_JS_MAX_AGE)
 
 @app.route('/js/<path:filename>')
 def serve_js(filename):
-    return send_from_directory('../frontend/js', filename)
+    return servir_estatico(os.path.join(FRONTEND_FOLDER, 'js'), filename, max_age=Config.CACHE_CSS_JS_MAX_AGE)
 @app.route('/api/imagen-del-dia', methods=['GET'])
 def get_imagen_del_dia():
     try:
@@ -157,90 +414,35 @@ def get_imagen_del_dia():
 @app.route('/api/todos-titulos-y-descripciones', methods=['GET'])
 def get_todos_titulos_y_descripciones():
     try:
-        # Obtener títulos únicos
-        query_titulos = """
-        SELECT DISTINCT titulo 
-        FROM imagenes 
-        WHERE activa = TRUE 
-          AND titulo IS NOT NULL 
-          AND titulo != ''
-          AND LENGTH(titulo) > 1
-        ORDER BY titulo
-        """
-        
-        # Obtener pares (descripción → título) para búsqueda
-        query_descripciones = """
-        SELECT DISTINCT 
-            descripcion,
-            titulo
-        FROM imagenes 
-        WHERE activa = TRUE 
-          AND descripcion IS NOT NULL 
-          AND descripcion != '' 
-          AND LENGTH(descripcion) > 1
-          AND descripcion NOT LIKE '%http%'
-          AND descripcion NOT LIKE '%.jpg%'
-          AND descripcion NOT LIKE '%.png%'
-          AND descripcion NOT LIKE '%.jpeg%'
-          AND descripcion NOT LIKE '%.gif%'
-          AND descripcion NOT REGEXP '^[0-9]+$'
-        ORDER BY descripcion
-        """
-
-        from database import Database
-        db = Database()
-        db.connect()
-        cursor = db.connection.cursor(dictionary=True)
-        
-        # Ejecutar consulta de títulos
-        cursor.execute(query_titulos)
-        titulos_result = cursor.fetchall()
-        
-        # Ejecutar consulta de descripciones
-        cursor.execute(query_descripciones)
-        descripciones_result = cursor.fetchall()
-        
-        cursor.close()
-        db.connection.close()
+        snapshot = corpus_titulos.obtener()
+        if snapshot is None:
+            raise Exception('No se pudo generar el corpus de títulos')
 
-        # Preparar respuesta
-        resultados = {
-            'titulos': [],
-            'descripciones_titulos': []  # Pares para búsqueda
-        }
-        
-        # Agregar títulos directos
-        if titulos_result:
-            resultados['titulos'] = [row['titulo'].strip() for row in titulos_result if row['titulo']]
-        
-        # Agregar pares descripción → título
-        if descripciones_result:
-            for row in descripciones_result:
-                if row['descripcion'] and row['titulo']:
-                    resultados['descripciones_titulos'].append({
-                        'descripcion': row['descripcion'].strip(),
-                        'titulo': row['titulo'].strip()
-                    })
-        
-        # Eliminar duplicados en títulos
-        titulos_unicos = []
-        titulos_vistos = set()
-        for titulo in resultados['titulos']:
-            titulo_lower = titulo.lower()
-            if titulo_lower not in titulos_vistos:
-                titulos_vistos.add(titulo_lower)
-                titulos_unicos.append(titulo)
-        
-        return jsonify({
-            'success': True,
-            'titulos': titulos_unicos,
-            'descripciones_titulos': resultados['descripciones_titulos'],
-            'total_titulos': len(titulos_unicos),
-            'total_descripciones': len(resultados['descripciones_titulos'])
-        })
+        # Elegir la versión precomprimida que acepte el cliente
+        codificaciones = request.accept_encodings
+        if snapshot['br'] and codificaciones['br']:
+            respuesta = app.response_class(snapshot['br'], mimetype='application/json')
+            respuesta.headers['Content-Encoding'] = 'br'
+        elif codificaciones['gzip']:
+            respuesta = app.response_class(snapshot['gzip'], mimetype='application/json')
+            respuesta.headers['Content-Encoding'] = 'gzip'
+        else:
+            respuesta = app.response_class(snapshot['json'], mimetype='application/json')
+        respuesta.vary.add('Accept-Encoding')
 
-    except Exception as e:
-        print(f"Error en todos-titulos-y-descripciones: {str(e)}")
+        # Débil: la misma versión se sirve con distintas codificaciones
+        respuesta.set_etag(snapshot['version'], weak=True)
+        respuesta.cache_control.public = True
+        if request.args.get('v') == snapshot['version']:
+            # URL versionada: su contenido no cambia nunca
+            respuesta.cache_control.max_age = 31536000
+            respuesta.cache_control.immutable = True
+        else:
+            respuesta.cache_control.no_cache = True
+        return respuesta.make_conditional(request)
+
+    except Exception:
+        log.exception("Error en todos-titulos-y-descripciones")
         
         return jsonify({
             'success': True,
@@ -255,6 +457,32 @@ def get_todos_titulos_y_descripciones():
             'total_descripciones': 0,
             'mensaje': 'Usando datos de respaldo'
         })
+# Autocompletado: títulos que coinciden con el texto, ordenados por relevancia
+@app.route('/api/buscar-titulos', methods=['GET'])
+def buscar_titulos():
+    try:
+        texto = request.args.get('q', '')
+        limite = min(max(request.args.get('limite', 10, type=int), 1), 50)
+
+        resultados = indice_titulos.buscar(texto, limite)
+
+        respuesta = jsonify({
+            'success': True,
+            'q': texto,
+            'resultados': resultados,
+            'total': len(resultados)
+        })
+        respuesta.cache_control.public = True
+        respuesta.cache_control.max_age = 300
+        return respuesta
+
+    except Exception as e:
+        log.exception("Error en buscar-titulos")
+        return jsonify({
+            'success': False,
+            'message': f'Error: {str(e)}'
+        }), 500
+
 # Ruta para subir nuevas imágenes
 @app.route('/api/subir-imagen', methods=['POST'])
 def subir_imagen():
@@ -274,14 +502,45 @@ def subir_imagen():
             descripcion = request.form.get('descripcion', '')
             fecha_programada = request.form.get('fecha_programada')
 
-            # Guardar archivo
+            # Guardar archivo con su hash como nombre: el mismo contenido se guarda una sola vez
             filename = secure_filename(file.filename)
-            # Agregar timestamp para evitar duplicados
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            unique_filename = f"{timestamp}_{filename}"
-
+            if isinstance(file.stream, ArchivoSubido):
+                # Ya se escribió en disco (con su hash) mientras se recibía: solo falta renombrarlo
+                if file.stream.tipo is None:
+                    return jsonify({'success': False, 'message': 'El archivo no es una imagen válida'}), 400
+                file.stream.cerrar()
+                unique_filename, hash_contenido, ya_existia = mover_por_contenido(
+                    file.stream.ruta, file.stream.sha256, f"{filename}.{file.stream.tipo}", app.config['UPLOAD_FOLDER']
+                )
+            else:
+                unique_filename, hash_contenido, ya_existia = guardar_por_contenido(
+                    file.stream, filename, app.config['UPLOAD_FOLDER']
+                )
             filepath = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-            file.save(filepath)
+
+            # Versiones reducidas en WebP (y AVIF si está activado), sin metadatos
+            variantes = indice_variantes.obtener(unique_filename) if ya_existia else None
+            if not variantes:
+                try:
+                    variantes = generar_variantes(
+                        filepath,
+                        app.config['UPLOAD_FOLDER'],
+                        Config.VARIANTES_ANCHOS,
+                        formatos_disponibles(Config.VARIANTES_AVIF),
+                        calidad=Config.VARIANTES_CALIDAD
+                    )
+                except Exception as e:
+                    log.warning("No se pudieron generar variantes de %s: %s", unique_filename, e)
+                    variantes = None
+
+            # Dimensiones y previsualización para pintar el hueco antes de que llegue la imagen
+            previa = imagen_model.get_previa(unique_filename) if ya_existia else None
+            if not previa:
+                try:
+                    previa = calcular_previa(filepath)
+                except Exception as e:
+                    log.warning("No se pudo calcular la previsualización de %s: %s", unique_filename, e)
+                    previa = None
 
             # Guardar en base de datos
             imagen_id = imagen_model.subir_imagen(
@@ -289,8 +548,17 @@ def subir_imagen():
                 ruta_archivo=unique_filename,
                 titulo=titulo,
                 descripcion=descripcion,
-                fecha_programada=fecha_programada
+                fecha_programada=fecha_programada,
+                variantes=variantes,
+                hash_contenido=hash_contenido,
+                previa=previa
             )
+            indice_variantes.guardar(unique_filename, variantes)
+            if fecha_programada:
+                cache_albumes.invalidar(fecha_programada)
+                actualizar_historial([fecha_programada])
+            indice_titulos.agregar(titulo, descripcion)
+            corpus_titulos.invalidar()
 
             return jsonify({
                 'success': True,
@@ -303,36 +571,107 @@ def subir_imagen():
                 'message': 'Tipo de archivo no permitido'
             }), 400
 
+    except HTTPException as e:
+        # Subida cortada mientras se recibía (demasiado grande o no es una imagen)
+        return jsonify({
+            'success': False,
+            'message': e.description
+        }), e.code
     except Exception as e:
         return jsonify({
             'success': False,
             'message': f'Error al subir imagen: {str(e)}'
         }), 500
 
+# Importación masiva: un ZIP/TAR con muchos álbumes `Título(n).jpg` y su manifest.json
+@app.route('/api/importar-albumes', methods=['POST'])
+def importar_albumes():
+    try:
+        # El límite general (MAX_CONTENT_LENGTH) es para una imagen suelta
+        request.max_content_length = Config.IMPORTACION_MAX_BYTES
+
+        if 'archivo' not in request.files or request.files['archivo'].filename == '':
+            return jsonify({'success': False, 'message': 'No se encontró el archivo'}), 400
+
+        archivo = request.files['archivo']
+        manifiesto = None
+        if 'manifiesto' in request.files:
+            manifiesto = request.files['manifiesto'].read()
+        elif request.form.get('manifiesto'):
+            manifiesto = request.form['manifiesto']
+
+        # Werkzeug ya volcó la subida a un temporal en disco: se lee por bloques desde ahí
+        resumen = importar(archivo.stream, archivo.filename, manifiesto)
+
+        if resumen['imagenes']:
+            cache_albumes.invalidar()
+            albumes_aleatorios.actualizar(resumen['fechas'])
+            for titulo, descripcion in resumen['titulos']:
+                indice_titulos.agregar(titulo, descripcion)
+            corpus_titulos.invalidar()
+
+        return jsonify({
+            'success': not resumen['errores'],
+            'albumes': resumen['albumes'],
+            'imagenes': resumen['imagenes'],
+            'ya_importadas': resumen['ya_importadas'],
+            'fechas': resumen['fechas'],
+            'omitidos': resumen['omitidos'],
+            'errores': resumen['errores']
+        })
+
+    except (ErrorImportacion, ValueError, zipfile.BadZipFile, tarfile.TarError) as e:
+        return jsonify({
+            'success': False,
+            'message': f'Archivo no válido: {str(e)}'
+        }), 400
+    except Exception as e:
+        log.exception("Error en importar-albumes")
+        return jsonify({
+            'success': False,
+            'message': f'Error al importar: {str(e)}'
+        }), 500
+
 # Ruta para servir archivos estáticos (imágenes)
 @app.route('/uploads/<filename>')
 def servir_imagen(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    # Elegir la variante según el formato que acepta el navegador y el ancho pedido (?w=)
+    archivo, variante = archivo_para_cliente(
+        filename, formatos_aceptados(), request.args.get('w', type=int)
+    )
+    hash_contenido = hash_de_nombre(archivo)
+
+    if hash_contenido:
+        # Nombre por contenido: el archivo no cambia nunca, cachear para siempre
+        etag = hash_contenido if not variante else f"{hash_contenido}-{variante['ancho']}-{variante['formato']}"
+        respuesta = servir_estatico(
+            app.config['UPLOAD_FOLDER'], archivo, max_age=31536000, immutable=True, etag=etag
+        )
+    else:
+        respuesta = servir_estatico(app.config['UPLOAD_FOLDER'], archivo, max_age=Config.CACHE_UPLOADS_MAX_AGE)
+    respuesta.vary.add('Accept')
+    return respuesta
 # Nueva ruta para obtener TODAS las imágenes del día
 # En la función get_imagenes_del_dia() y similares:
 @app.route('/api/imagenes-del-dia', methods=['GET'])
 def get_imagenes_del_dia():
     try:
-        imagenes = imagen_model.get_imagenes_del_dia()
+        album, fecha_respaldo = album_del_dia()
+        imagenes = album['imagenes'] if album else []
 
         if imagenes:
-            # CAMBIA ESTO:
-            for imagen in imagenes:
-                # En lugar de localhost, usa la URL base de la solicitud
-                imagen['url'] = f"{request.host_url}uploads/{os.path.basename(imagen['ruta_archivo'])}"
-                # O mejor aún:
-                imagen['url'] = f"/uploads/{os.path.basename(imagen['ruta_archivo'])}"  # URL relativa
-
-            return jsonify({
+            datos = {
                 'success': True,
                 'imagenes': imagenes,
                 'total': len(imagenes)
-            })
+            }
+            if fecha_respaldo:
+                # Hoy no hay álbum programado: este es uno anterior
+                datos.update(datos_respaldo(fecha_respaldo))
+            respuesta = jsonify(datos)
+            for enlace in enlaces_precarga(imagenes):
+                respuesta.headers.add('Link', enlace)
+            return respuesta_cacheable(respuesta, album['etag'], max_age_album_del_dia(fecha_respaldo))
         else:
             return jsonify({
                 'success': False,
@@ -378,7 +717,12 @@ def programar_imagen():
                 'message': 'Se requiere imagen_id y fecha'
             }), 400
 
+        fecha_anterior = imagen_model.get_fecha_programada(imagen_id)
         resultado = imagen_model.programar_imagen(imagen_id, fecha)
+        cache_albumes.invalidar(fecha)
+        if fecha_anterior:
+            cache_albumes.invalidar(fecha_anterior)
+        actualizar_historial([fecha_anterior, fecha])
 
         return jsonify({
             'success': True,
@@ -389,6 +733,106 @@ def programar_imagen():
             'success': False,
             'message': f'Error: {str(e)}'
         }), 500
+
+def leer_asignaciones(datos):
+    """Valida el cuerpo de /api/programar-imagenes; ValueError si algo no cuadra"""
+    asignaciones = (datos or {}).get('asignaciones')
+    if not isinstance(asignaciones, list) or not asignaciones:
+        raise ValueError('Se requiere una lista "asignaciones"')
+    if len(asignaciones) > Config.PROGRAMACION_MAX:
+        raise ValueError(f'Como mucho {Config.PROGRAMACION_MAX} imágenes por petición')
+
+    leidas, vistos, ordenes = [], set(), set()
+    for asignacion in asignaciones:
+        if not isinstance(asignacion, dict):
+            raise ValueError('Cada asignación es un objeto {imagen_id, fecha, orden_dia}')
+        imagen_id = int(asignacion.get('imagen_id'))
+        fecha = date.fromisoformat(str(asignacion.get('fecha'))).isoformat()
+        orden_dia = asignacion.get('orden_dia')
+        if orden_dia is not None:
+            orden_dia = int(orden_dia)
+            if not 1 <= orden_dia <= Config.ALBUM_IMAGENES:
+                raise ValueError(f'orden_dia va de 1 a {Config.ALBUM_IMAGENES}')
+            if (fecha, orden_dia) in ordenes:
+                raise ValueError(f'orden_dia {orden_dia} repetido en {fecha}')
+            ordenes.add((fecha, orden_dia))
+        if imagen_id in vistos:
+            raise ValueError(f'La imagen {imagen_id} aparece dos veces')
+        vistos.add(imagen_id)
+        leidas.append({'imagen_id': imagen_id, 'fecha': fecha, 'orden_dia': orden_dia})
+    return leidas
+
+def recargar_album(fecha):
+    """Descarta lo que hubiera en caché para `fecha` (p. ej. un álbum vacío) y lo vuelve a cargar"""
+    cache_albumes.invalidar(fecha)
+    return cache_albumes.obtener(fecha)
+
+def tras_programar(fechas):
+    """Invalida las cachés y el historial de las fechas que cambiaron"""
+    for fecha in fechas:
+        cache_albumes.invalidar(fecha)
+    actualizar_historial(sorted(fechas))
+
+# Programación masiva: muchas imágenes en una transacción
+@app.route('/api/programar-imagenes', methods=['POST'])
+def programar_imagenes():
+    try:
+        datos = request.get_json(silent=True)
+        try:
+            asignaciones = leer_asignaciones(datos)
+        except (TypeError, ValueError) as e:
+            return jsonify({'success': False, 'message': f'Asignaciones no válidas: {str(e)}'}), 400
+
+        # Por defecto cada fecha tocada tiene que quedar como un álbum completo
+        completos = datos.get('completos', True)
+        try:
+            fechas = imagen_model.programar_imagenes(
+                asignaciones,
+                imagenes_por_album=Config.ALBUM_IMAGENES if completos else None,
+                lote=Config.PROGRAMACION_LOTE
+            )
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 409
+        tras_programar(fechas)
+
+        return jsonify({
+            'success': True,
+            'imagenes': len(asignaciones),
+            'fechas': sorted(fechas)
+        })
+    except Exception as e:
+        log.exception("Error en programar-imagenes")
+        return jsonify({
+            'success': False,
+            'message': f'Error: {str(e)}'
+        }), 500
+
+# Rellena los próximos días libres con álbumes completos sin programar
+@app.route('/api/planificar', methods=['POST'])
+def planificar_dias():
+    try:
+        datos = request.get_json(silent=True) or {}
+        try:
+            dias = int(datos.get('dias', 30))
+            desde = date.fromisoformat(datos['desde']) if datos.get('desde') else None
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'message': 'dias o desde no válidos'}), 400
+        if not 1 <= dias <= 366:
+            return jsonify({'success': False, 'message': 'dias va de 1 a 366'}), 400
+        guardar = not datos.get('dry_run', False)
+
+        resumen = planificar(dias, desde, modelo=imagen_model, guardar=guardar, calentar=recargar_album)
+        if guardar and resumen['programados']:
+            albumes_aleatorios.actualizar([programado['fecha'] for programado in resumen['programados']])
+
+        return jsonify({'success': True, **resumen})
+    except Exception as e:
+        log.exception("Error en planificar")
+        return jsonify({
+            'success': False,
+            'message': f'Error: {str(e)}'
+        }), 500
+
 @app.route('/api/todos-titulos', methods=['GET'])
 def get_todos_titulos():
     try:
@@ -397,7 +841,6 @@ def get_todos_titulos():
 
         # Necesitas modificar tu models.py para ejecutar esta query
         # O hacerlo directamente:
-        from database import Database
         db = Database()
         result = db.execute_query(query, fetch=True)
 
@@ -408,7 +851,8 @@ def get_todos_titulos():
             'titulos': titulos
         })
 
-    except Exception as e:
+    except Exception:
+        log.exception("Error en todos-titulos")
         # Lista de respaldo si hay error
         titulos_respaldo = [
             "parís", "londres", "roma", "berlín", "madrid",
@@ -422,64 +866,67 @@ def get_todos_titulos():
 # Ruta para obtener el historial completo
 @app.route('/api/historial-completo', methods=['GET'])
 def get_historial_completo():
+    """Álbumes ya jugables (anteriores a hoy), del más reciente al más antiguo.
+
+    Paginación por clave: ?limite=N devuelve como mucho N días y, en
+    `siguiente`, la fecha que hay que pasar como ?antes= para pedir los
+    anteriores (None en la última página). Sale de resumen_albumes, así que
+    cada página cuesta lo mismo por muchos años de álbumes que haya.
+    """
+    hoy = date.today()
     try:
-        # Intento 1: Query optimizada
-        query = """
-        SELECT
-            fecha_programada,
-            COUNT(*) as total_imagenes
-        FROM imagenes
-        WHERE activa = TRUE
-        AND fecha_programada IS NOT NULL
-        GROUP BY fecha_programada
-        ORDER BY fecha_programada DESC
-        """
-
-        from database import Database
-        db = Database()
-        db.connect()
-        cursor = db.connection.cursor(dictionary=True)
-        cursor.execute(query)
-        resultados = cursor.fetchall()
-        cursor.close()
-        db.connection.close()
-
-        if not resultados:
+        antes = date.fromisoformat(request.args['antes']) if request.args.get('antes') else hoy
+        limite = int(request.args.get('limite', Config.HISTORIAL_LIMITE))
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'message': 'Parámetros antes (YYYY-MM-DD) o limite no válidos'
+        }), 400
+    # Nunca el álbum de hoy ni los programados
+    antes = min(antes, hoy)
+    limite = max(1, min(limite, Config.HISTORIAL_LIMITE_MAX))
+
+    try:
+        # Uno más para saber si hay otra página
+        resultados = imagen_model.get_resumen_albumes(antes, limite + 1)
+        if resultados is None:
+            raise Exception('No se pudo leer resumen_albumes')
+
+        if not resultados and not request.args.get('antes'):
             # Si no hay datos, genera algunos
             return jsonify({
                 'success': True,
                 'albumes': generar_albumes_ejemplo(30),
                 'total': 30,
+                'siguiente': None,
                 'mensaje': 'Base de datos vacía - datos de ejemplo'
             })
 
-        # Formatear resultados
-        albumes = []
-        for row in resultados:
-            # Asegurar formato de fecha
-            fecha = row['fecha_programada']
-            if hasattr(fecha, 'isoformat'):
-                fecha_str = fecha.isoformat()
-            elif isinstance(fecha, str):
-                fecha_str = fecha.split()[0]  # Si tiene hora, toma solo fecha
-            else:
-                fecha_str = str(fecha)
-
-            albumes.append({
-                'fecha_programada': fecha_str,
+        albumes = [
+            {
+                'fecha_programada': row['fecha'].isoformat(),
                 'total_imagenes': row['total_imagenes'],
-                'primer_titulo': f'Álbum del {fecha_str}',
+                'primer_titulo': row['primer_titulo'],
                 'completado': row['total_imagenes'] >= 6
-            })
+            }
+            for row in resultados[:limite]
+        ]
+        siguiente = albumes[-1]['fecha_programada'] if len(resultados) > limite else None
 
-        return jsonify({
+        datos = {
             'success': True,
             'albumes': albumes,
-            'total': len(albumes)
-        })
+            'total': len(albumes),
+            'siguiente': siguiente
+        }
+        # La primera página gana un día a medianoche; las anteriores solo cambian si se reprograma
+        max_age = Config.CACHE_ALBUM_MAX_AGE
+        if not request.args.get('antes'):
+            max_age = min(max_age, segundos_hasta_medianoche())
+        return respuesta_cacheable(jsonify(datos), calcular_etag(datos), max_age)
 
     except Exception as e:
-        print(f"Error en historial: {str(e)}")
+        log.exception("Error en historial")
         # En caso de error grave, devuelve datos de ejemplo
         return jsonify({
             'success': True,
@@ -510,19 +957,8 @@ def generar_albumes_ejemplo(cantidad=30):
 def get_album_por_fecha(fecha):
     try:
         # Obtener imágenes para una fecha específica
-        query = """
-        SELECT * FROM imagenes
-        WHERE fecha_programada = %s AND activa = TRUE
-        ORDER BY orden_dia
-        """
-
-        from database import Database
-        db = Database()
-        db.connect()
-        cursor = db.connection.cursor(dictionary=True)
-        cursor.execute(query, (fecha,))
-        imagenes = cursor.fetchall()
-        cursor.close()
+        album = cache_albumes.obtener(fecha)
+        imagenes = album['imagenes'] if album else []
 
         if not imagenes:
             return jsonify({
@@ -530,24 +966,87 @@ def get_album_por_fecha(fecha):
                 'message': 'No se encontró el álbum'
             }), 404
 
-        # Añadir URLs
-        for imagen in imagenes:
-            imagen['url'] = f"/uploads/{os.path.basename(imagen['ruta_archivo'])}"
-
-        return jsonify({
+        respuesta = jsonify({
             'success': True,
             'fecha': fecha,
             'imagenes': imagenes,
             'total': len(imagenes),
             'titulo_final': imagenes[-1]['titulo'] if imagenes else None
         })
+        for enlace in enlaces_precarga(imagenes):
+            respuesta.headers.add('Link', enlace)
+        return respuesta_cacheable(respuesta, album['etag'], Config.CACHE_ALBUM_MAX_AGE)
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error: {str(e)}'
+        }), 500
+
+def respuesta_paquete(album, max_age):
+    """Todas las imágenes del álbum en una respuesta (formato en paquetes.py).
+
+    Cada imagen se elige como en /uploads: variante según Accept y ?w=.
+    Con ?desde=N se omiten las N primeras (la primera pista ya viene
+    precargada por la cabecera Link). El cuerpo se envía por bloques desde disco y se cachea por álbum con
+    ETag y Cache-Control, igual que el JSON del álbum.
+    """
+    imagenes = album['imagenes'][max(0, request.args.get('desde', 0, type=int)):]
+    aceptados = formatos_aceptados()
+    ancho = request.args.get('w', type=int)
+    archivos = [
+        archivo_para_cliente(os.path.basename(imagen['ruta_archivo']), aceptados, ancho)[0]
+        for imagen in imagenes
+    ]
+    partes = partes_del_paquete(app.config['UPLOAD_FOLDER'], archivos)
+    cabecera = cabecera_paquete([imagen['id'] for imagen in imagenes], partes)
+
+    respuesta = app.response_class(generar_paquete(cabecera, partes), mimetype=TIPO_PAQUETE)
+    respuesta.content_length = tamano_paquete(cabecera, partes)
+    respuesta.vary.add('Accept')
+    return respuesta_cacheable(respuesta, etag_paquete(album['etag'], partes), max_age)
+
+# Paquete con las seis imágenes del álbum del día
+@app.route('/api/paquete-del-dia', methods=['GET'])
+def get_paquete_del_dia():
+    try:
+        album, fecha_respaldo = album_del_dia()
+        if not album or not album['imagenes']:
+            return jsonify({'success': False, 'message': 'No hay imágenes para hoy'}), 404
+        return respuesta_paquete(album, max_age_album_del_dia(fecha_respaldo))
 
     except Exception as e:
+        log.exception("Error en paquete-del-dia")
         return jsonify({
             'success': False,
             'message': f'Error: {str(e)}'
         }), 500
 
+# Paquete con las imágenes de un álbum concreto
+@app.route('/api/album/<fecha>/paquete', methods=['GET'])
+def get_paquete_album(fecha):
+    try:
+        album = cache_albumes.obtener(fecha)
+        if not album or not album['imagenes']:
+            return jsonify({'success': False, 'message': 'No se encontró el álbum'}), 404
+        return respuesta_paquete(album, Config.CACHE_ALBUM_MAX_AGE)
+
+    except Exception as e:
+        log.exception("Error en paquete de álbum")
+        return jsonify({
+            'success': False,
+            'message': f'Error: {str(e)}'
+        }), 500
+
+def intentos_a_guardar(acierto, intentos):
+    """Intentos que se guardan: 1-5 si acertó, 6 si falló; ValueError si no cuadran"""
+    if not acierto:
+        return 6
+    intentos = int(intentos)
+    if not 1 <= intentos <= 5:
+        raise ValueError('intentos va de 1 a 5')
+    return intentos
+
 # Ruta para registrar intento por álbum específico
 @app.route('/api/registrar-intento-album', methods=['POST'])
 def registrar_intento_album():
@@ -557,7 +1056,7 @@ def registrar_intento_album():
         
         fecha_album = data.get('fecha_album')
         numero_album = data.get('numero_album')
-        acierto = data.get('acierto', False)
+        acierto = bool(data.get('acierto', False))
         intentos_usuario = data.get('intentos', 1)
         
         if not fecha_album or not numero_album:
@@ -567,125 +1066,22 @@ def registrar_intento_album():
             }), 400
         
         # Calcular intentos a guardar
-        if acierto:
-            intentos_guardar = min(int(intentos_usuario), 5)  # 1-5 si acertó
-        else:
-            intentos_guardar = 6  # 6 si falló
-        
-        from database import Database
-        db = Database()
-        db.connect()
-        cursor = db.connection.cursor()
-        
-        # Verificar si es la PRIMERA vez que juega este álbum
-        cursor.execute('''
-            SELECT veces_jugado 
-            FROM intentos_usuario_album 
-            WHERE user_id_hash = MD5(%s) 
-              AND fecha_album = %s 
-              AND numero_album = %s
-        ''', (user_id, fecha_album, int(numero_album)))
-        
-        resultado = cursor.fetchone()
-        
-        es_primera_vez = False
-        veces_jugado = 1
-        
-        if resultado:
-            # Ya ha jugado antes - NO actualizar estadísticas
-            veces_jugado = resultado[0] + 1
-            es_primera_vez = False
-            
-            cursor.execute('''
-                UPDATE intentos_usuario_album 
-                SET veces_jugado = veces_jugado + 1,
-                    updated_at = CURRENT_TIMESTAMP
-                WHERE user_id_hash = MD5(%s) 
-                  AND fecha_album = %s 
-                  AND numero_album = %s
-            ''', (user_id, fecha_album, numero_album))
-            
-        else:
-            # Es primera vez - SÍ actualizar estadísticas
-            veces_jugado = 1
-            es_primera_vez = True
-            
-            # Insertar registro del usuario
-            cursor.execute('''
-                INSERT INTO intentos_usuario_album 
-                (user_id_hash, fecha_album, numero_album, acierto, intentos_necesarios, veces_jugado)
-                VALUES (MD5(%s), %s, %s, %s, %s, 1)
-            ''', (user_id, fecha_album, numero_album, acierto, intentos_guardar))
-            
-            # Actualizar estadísticas del álbum SOLO si es acierto
-            if acierto:
-                # Construir la consulta dinámicamente según el intento
-                columna_intento = f"aciertos_intento_{intentos_guardar}"
-                
-                cursor.execute(f'''
-                    INSERT INTO estadisticas_album 
-                    (fecha_album, numero_album, total_jugadores, aciertos, fallos, total_intentos, {columna_intento})
-                    VALUES (%s, %s, 1, 1, 0, %s, 1)
-                    ON DUPLICATE KEY UPDATE
-                        total_jugadores = total_jugadores + 1,
-                        aciertos = aciertos + 1,
-                        {columna_intento} = {columna_intento} + 1,
-                        total_intentos = total_intentos + %s
-                ''', (fecha_album, numero_album, intentos_guardar, intentos_guardar))
-            else:
-                # Si es fallo
-                cursor.execute('''
-                    INSERT INTO estadisticas_album 
-                    (fecha_album, numero_album, total_jugadores, aciertos, fallos, total_intentos)
-                    VALUES (%s, %s, 1, 0, 1, %s)
-                    ON DUPLICATE KEY UPDATE
-                        total_jugadores = total_jugadores + 1,
-                        fallos = fallos + 1,
-                        total_intentos = total_intentos + %s
-                ''', (fecha_album, numero_album, intentos_guardar, intentos_guardar))
-        
-        # Obtener estadísticas COMPLETAS del álbum
-        cursor.execute('''
-            SELECT 
-                total_jugadores,
-                aciertos,
-                fallos,
-                total_intentos,
-                aciertos_intento_1,
-                aciertos_intento_2,
-                aciertos_intento_3,
-                aciertos_intento_4,
-                aciertos_intento_5
-            FROM estadisticas_album 
-            WHERE fecha_album = %s AND numero_album = %s
-        ''', (fecha_album, int(numero_album)))
-        
-        stats = cursor.fetchone()
-        
-        # Calcular porcentaje y distribuciones
-        porcentaje_acierto = 0
-        if stats and stats[0] and stats[0] > 0:
-            porcentaje_acierto = (stats[1] / stats[0]) * 100 if stats[1] else 0
+        try:
+            intentos_guardar = intentos_a_guardar(acierto, intentos_usuario)
+        except (TypeError, ValueError) as e:
+            return jsonify({
+                'success': False,
+                'message': f'Intentos no válidos: {str(e)}'
+            }), 400
         
-        # Crear objeto con estadísticas detalladas
-        estadisticas_detalladas = {
-            'total_jugadores': stats[0] if stats and stats[0] else 0,
-            'aciertos': stats[1] if stats and stats[1] else 0,
-            'fallos': stats[2] if stats and stats[2] else 0,
-            'total_intentos': stats[3] if stats and stats[3] else 0,
-            'porcentaje_acierto': round(porcentaje_acierto, 1),
-            'distribucion_aciertos': {
-                'intento_1': stats[4] if stats and len(stats) > 4 and stats[4] else 0,
-                'intento_2': stats[5] if stats and len(stats) > 5 and stats[5] else 0,
-                'intento_3': stats[6] if stats and len(stats) > 6 and stats[6] else 0,
-                'intento_4': stats[7] if stats and len(stats) > 7 and stats[7] else 0,
-                'intento_5': stats[8] if stats and len(stats) > 8 and stats[8] else 0
-            }
-        }
+        # Primera partida + encolado; la escritura en BD la hace el registro en segundo plano
+        es_primera_vez, veces_jugado = registro_intentos.registrar(
+            hash_usuario(user_id), fecha_album, int(numero_album), acierto, intentos_guardar
+        )
         
-        db.connection.commit()
-        cursor.close()
-        db.connection.close()
+        # Obtener estadísticas COMPLETAS del álbum (incluye lo que aún está en cola)
+        stats = registro_intentos.estadisticas(fecha_album, int(numero_album))
+        estadisticas_detalladas = formatear_estadisticas(stats)
         
         return jsonify({
             'success': True,
@@ -696,9 +1092,7 @@ def registrar_intento_album():
         })
         
     except Exception as e:
-        print(f"Error registrar intento álbum: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Error registrar intento álbum")
         return jsonify({
             'success': False,
             'message': f'Error: {str(e)}'
@@ -717,72 +1111,18 @@ def get_estadisticas_album():
                 'message': 'Se requiere fecha y número del álbum'
             }), 400
         
-        from database import Database
-        db = Database()
-        db.connect()
-        cursor = db.connection.cursor(dictionary=True)
-        
-        # Obtener estadísticas completas
-        cursor.execute('''
-            SELECT 
-                total_jugadores,
-                aciertos,
-                fallos,
-                total_intentos,
-                COALESCE(aciertos_intento_1, 0) as aciertos_intento_1,
-                COALESCE(aciertos_intento_2, 0) as aciertos_intento_2,
-                COALESCE(aciertos_intento_3, 0) as aciertos_intento_3,
-                COALESCE(aciertos_intento_4, 0) as aciertos_intento_4,
-                COALESCE(aciertos_intento_5, 0) as aciertos_intento_5
-            FROM estadisticas_album 
-            WHERE fecha_album = %s AND numero_album = %s
-        ''', (fecha_album, int(numero_album)))
-        
-        stats = cursor.fetchone()
-        
-        if not stats:
-            stats = {
-                'total_jugadores': 0,
-                'aciertos': 0,
-                'fallos': 0,
-                'total_intentos': 0,
-                'aciertos_intento_1': 0,
-                'aciertos_intento_2': 0,
-                'aciertos_intento_3': 0,
-                'aciertos_intento_4': 0,
-                'aciertos_intento_5': 0
-            }
-        
-        # Calcular porcentaje
-        porcentaje_acierto = 0
-        if stats['total_jugadores'] > 0:
-            porcentaje_acierto = (stats['aciertos'] / stats['total_jugadores']) * 100
-        
-        cursor.close()
-        db.connection.close()
+        # Contadores en memoria (reconciliados con MySQL cada pocos segundos)
+        stats = registro_intentos.estadisticas(fecha_album, int(numero_album))
         
         return jsonify({
             'success': True,
             'fecha_album': fecha_album,
             'numero_album': numero_album,
-            'estadisticas': {
-                'total_jugadores': stats['total_jugadores'],
-                'aciertos': stats['aciertos'],
-                'fallos': stats['fallos'],
-                'total_intentos': stats['total_intentos'],
-                'porcentaje_acierto': round(porcentaje_acierto, 1),
-                'distribucion_aciertos': {
-                    'intento_1': stats['aciertos_intento_1'],
-                    'intento_2': stats['aciertos_intento_2'],
-                    'intento_3': stats['aciertos_intento_3'],
-                    'intento_4': stats['aciertos_intento_4'],
-                    'intento_5': stats['aciertos_intento_5']
-                }
-            }
+            'estadisticas': formatear_estadisticas(stats)
         })
         
-    except Exception as e:
-        print(f"Error estadísticas álbum: {str(e)}")
+    except Exception:
+        log.exception("Error estadísticas álbum")
         return jsonify({
             'success': True,
             'fecha_album': fecha_album,
@@ -803,6 +1143,46 @@ def get_estadisticas_album():
             }
         })
 
+def formatear_mi_intento(mi_intento):
+    """Respuesta de mi-intento-album a partir de la fila (o None si no jugó)"""
+    if mi_intento:
+        # Formatear intentos para mostrar
+        if mi_intento['acierto']:
+            texto_intentos = f"en {mi_intento['intentos_necesarios']} intento{'s' if mi_intento['intentos_necesarios'] > 1 else ''}"
+        else:
+            texto_intentos = "no acertaste"
+        
+        return {
+            'success': True,
+            'ya_jugo': True,
+            'veces_jugado': mi_intento['veces_jugado'],
+            'es_primera_vez': mi_intento['es_primera_vez'],
+            'resultado': {
+                'acierto': mi_intento['acierto'],
+                'intentos': mi_intento['intentos_necesarios'],
+                'texto_intentos': texto_intentos,
+                'primera_vez': mi_intento['created_at'].isoformat() if mi_intento['created_at'] else None,
+                'ultima_vez': mi_intento['updated_at'].isoformat() if mi_intento['updated_at'] else None
+            }
+        }
+    return {
+        'success': True,
+        'ya_jugo': False,
+        'veces_jugado': 0,
+        'es_primera_vez': True,
+        'resultado': None
+    }
+
+def consultar_mi_intento(user_id, fecha_album, numero_album):
+    """Fila de intentos_usuario_album del jugador en ese álbum, con lo que siga en cola (None si no jugó)"""
+    user_id_hash = hash_usuario(user_id)
+    filas = Database().execute_query(
+        CONSULTA_MI_INTENTO, (user_id_hash, fecha_album, numero_album), fetch=True
+    )
+    if filas is None:
+        raise Exception('No se pudo consultar el intento')
+    return registro_intentos.mi_intento(user_id_hash, fecha_album, numero_album, filas[0] if filas else None)
+
 # Ruta para ver si el usuario YA jugó este álbum específico
 @app.route('/api/mi-intento-album', methods=['GET'])
 def get_mi_intento_album():
@@ -817,65 +1197,186 @@ def get_mi_intento_album():
                 'message': 'Se requiere fecha y número del álbum'
             }), 400
         
-        from database import Database
-        db = Database()
-        db.connect()
-        cursor = db.connection.cursor(dictionary=True)
-        
-        cursor.execute('''
-            SELECT 
-                acierto,
-                intentos_necesarios,
-                veces_jugado,
-                es_primera_vez,
-                created_at,
-                updated_at
-            FROM intentos_usuario_album 
-            WHERE user_id_hash = MD5(%s) 
-              AND fecha_album = %s 
-              AND numero_album = %s
-        ''', (user_id, fecha_album, int(numero_album)))
-        
-        mi_intento = cursor.fetchone()
-        
-        cursor.close()
-        db.connection.close()
-        
-        if mi_intento:
-            # Formatear intentos para mostrar
-            if mi_intento['acierto']:
-                texto_intentos = f"en {mi_intento['intentos_necesarios']} intento{'s' if mi_intento['intentos_necesarios'] > 1 else ''}"
-            else:
-                texto_intentos = "no acertaste"
+        return jsonify(formatear_mi_intento(consultar_mi_intento(user_id, fecha_album, int(numero_album))))
             
-            return jsonify({
-                'success': True,
-                'ya_jugo': True,
-                'veces_jugado': mi_intento['veces_jugado'],
-                'es_primera_vez': mi_intento['es_primera_vez'],
-                'resultado': {
-                    'acierto': mi_intento['acierto'],
-                    'intentos': mi_intento['intentos_necesarios'],
-                    'texto_intentos': texto_intentos,
-                    'primera_vez': mi_intento['created_at'].isoformat() if mi_intento['created_at'] else None,
-                    'ultima_vez': mi_intento['updated_at'].isoformat() if mi_intento['updated_at'] else None
-                }
-            })
+    except Exception as e:
+        log.exception("Error mi intento álbum")
+        return jsonify({
+            'success': False,
+            'message': f'Error: {str(e)}'
+        }), 500
+
+# Columnas de cada fila de /api/mis-intentos
+CAMPOS_MIS_INTENTOS = ['dia', 'numero', 'acierto', 'intentos', 'veces']
+
+def leer_rango_intentos(args):
+    """(desde, hasta) de ?desde=&hasta= (por defecto, hasta hoy); ValueError si no es válido"""
+    hasta = date.fromisoformat(args['hasta']) if args.get('hasta') else date.today()
+    if args.get('desde'):
+        desde = date.fromisoformat(args['desde'])
+    else:
+        desde = hasta - timedelta(days=Config.MIS_INTENTOS_MAX_DIAS - 1)
+    if desde > hasta:
+        raise ValueError('desde es posterior a hasta')
+    if (hasta - desde).days >= Config.MIS_INTENTOS_MAX_DIAS:
+        raise ValueError(f'Como mucho {Config.MIS_INTENTOS_MAX_DIAS} días por petición')
+    return desde, hasta
+
+def formatear_mis_intentos(filas, desde, hasta):
+    """Respuesta compacta de mis-intentos: una lista por álbum jugado, con el día relativo a `desde`"""
+    intentos = []
+    for fila in filas:
+        fecha = fila['fecha_album']
+        if isinstance(fecha, str):
+            fecha = date.fromisoformat(fecha)
+        intentos.append([
+            (fecha - desde).days,
+            fila['numero_album'],
+            1 if fila['acierto'] else 0,
+            fila['intentos_necesarios'],
+            fila['veces_jugado']
+        ])
+    return {
+        'success': True,
+        'desde': desde.isoformat(),
+        'hasta': hasta.isoformat(),
+        'campos': CAMPOS_MIS_INTENTOS,
+        'intentos': intentos
+    }
+
+# Resultados del usuario en todos los álbumes de un rango (insignias del historial)
+@app.route('/api/mis-intentos', methods=['GET'])
+def get_mis_intentos():
+    try:
+        try:
+            desde, hasta = leer_rango_intentos(request.args)
+        except ValueError as e:
+            return jsonify({'success': False, 'message': f'Rango no válido: {str(e)}'}), 400
+
+        user_id_hash = hash_usuario(get_or_create_user_id())
+        filas = Database().execute_query(
+            CONSULTA_MIS_INTENTOS, (user_id_hash, desde, hasta), fetch=True
+        )
+        if filas is None:
+            raise Exception('No se pudieron consultar los intentos')
+        # Las partidas recién terminadas pueden seguir en la cola
+        filas = registro_intentos.mis_intentos(user_id_hash, desde, hasta, filas)
+
+        respuesta = jsonify(formatear_mis_intentos(filas, desde, hasta))
+        # Cambia en cuanto el jugador termina un álbum: solo para él y siempre revalidado
+        respuesta.cache_control.private = True
+        respuesta.cache_control.no_cache = True
+        return respuesta
+
+    except Exception as e:
+        log.exception("Error mis intentos")
+        return jsonify({
+            'success': False,
+            'message': f'Error: {str(e)}'
+        }), 500
+
+# Hilos para montar /api/bootstrap: sus partes se piden a la vez
+hilos_bootstrap = ThreadPoolExecutor(max_workers=Config.BOOTSTRAP_HILOS, thread_name_prefix='bootstrap')
+
+def leer_parametros_bootstrap(args):
+    """(fecha, numero, historico) de ?fecha=&numero=&historico=1; ValueError si no son válidos"""
+    fecha = date.fromisoformat(args['fecha']) if args.get('fecha') else date.today()
+    numero = int(args['numero']) if args.get('numero') else None
+    return fecha, numero, args.get('historico') == '1'
+
+def formatear_bootstrap(user_id, fecha, numero, album, fecha_respaldo, mi_intento, stats, version_corpus,
+                        first_visit=None):
+    """Respuesta de /api/bootstrap: lo que necesita script.js para empezar a jugar.
+
+    Cada parte es None si no se pudo obtener (o si falta `numero`, para el
+    intento y las estadísticas); el frontend la pide entonces por su ruta.
+    Con álbum de respaldo, `fecha` y `numero` son los de ese álbum.
+    """
+    datos_album = None
+    if album and album['imagenes']:
+        datos_album = {'imagenes': album['imagenes'], 'total': len(album['imagenes'])}
+        if fecha_respaldo:
+            datos_album.update(datos_respaldo(fecha_respaldo))
+    intento = None
+    if mi_intento is not False:
+        intento = formatear_mi_intento(mi_intento)
+        del intento['success']
+    return {
+        'success': True,
+        'user_id': user_id,
+        'first_visit': first_visit,
+        'fecha': fecha.isoformat(),
+        'numero': numero,
+        'album': datos_album,
+        'mi_intento': intento,
+        'estadisticas': formatear_estadisticas(stats) if stats else None,
+        'corpus_version': version_corpus
+    }
+
+def resultado_parte(futuro, parte, respaldo=None):
+    """Resultado de una parte del bootstrap, o `respaldo` si falló o tardó demasiado"""
+    if futuro is None:
+        return respaldo
+    try:
+        return futuro.result(timeout=Config.BOOTSTRAP_TIMEOUT)
+    except Exception as e:
+        log.warning("Bootstrap sin %s: %s", parte, e)
+        return respaldo
+
+# Todo lo que necesita la portada para empezar a jugar, en una sola petición
+@app.route('/api/bootstrap', methods=['GET'])
+def get_bootstrap():
+    try:
+        try:
+            fecha, numero, historico = leer_parametros_bootstrap(request.args)
+        except ValueError as e:
+            return jsonify({'success': False, 'message': f'Parámetros no válidos: {str(e)}'}), 400
+
+        user_id = get_or_create_user_id()
+        # Fuera de la petición los hilos cogen su propia conexión del pool (o nada, si todo está en caché)
+        if historico:
+            futuro_album = hilos_bootstrap.submit(lambda: (cache_albumes.obtener(fecha), None))
         else:
-            return jsonify({
-                'success': True,
-                'ya_jugo': False,
-                'veces_jugado': 0,
-                'es_primera_vez': True,
-                'resultado': None
-            })
-            
+            futuro_album = hilos_bootstrap.submit(album_del_dia, fecha)
+        futuro_corpus = hilos_bootstrap.submit(lambda: corpus_titulos.version)
+
+        def pedir_intento_y_stats():
+            if numero is None:
+                return None, None
+            return (hilos_bootstrap.submit(consultar_mi_intento, user_id, fecha.isoformat(), numero),
+                    hilos_bootstrap.submit(registro_intentos.estadisticas, fecha.isoformat(), numero))
+
+        # Con el álbum del día puede tocar el de respaldo, que cambia fecha y número:
+        # se espera al álbum (casi siempre en caché) antes de pedir el intento y las estadísticas
+        if historico:
+            futuro_intento, futuro_stats = pedir_intento_y_stats()
+        album, fecha_respaldo = resultado_parte(futuro_album, 'álbum', (None, None))
+        if not historico:
+            if fecha_respaldo and numero is not None:
+                # Hoy no hay álbum: el intento y las estadísticas son los del álbum de respaldo
+                fecha, numero = fecha_respaldo, numero_de_album(fecha_respaldo)
+            futuro_intento, futuro_stats = pedir_intento_y_stats()
+        datos = formatear_bootstrap(
+            user_id, fecha, numero, album, fecha_respaldo,
+            # False: no se sabe (distinto de None, que es "no jugó")
+            resultado_parte(futuro_intento, 'intento', False),
+            resultado_parte(futuro_stats, 'estadísticas'),
+            resultado_parte(futuro_corpus, 'versión del corpus'),
+            first_visit=session.get('first_visit')
+        )
+
+        respuesta = jsonify(datos)
+        # Lleva datos del jugador: nada de cachés compartidas
+        respuesta.cache_control.private = True
+        respuesta.cache_control.no_cache = True
+        return respuesta
+
     except Exception as e:
-        print(f"Error mi intento álbum: {str(e)}")
+        log.exception("Error en bootstrap")
         return jsonify({
             'success': False,
             'message': f'Error: {str(e)}'
         }), 500
-        
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
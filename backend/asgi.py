@@ -0,0 +1,442 @@
+"""Servidor ASGI opcional: la misma API, con las rutas más concurridas en asíncrono.
+
+Uso: pip install -r requirements-asgi.txt
+     uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 4
+
+En el cambio de día miles de jugadores piden a la vez el álbum, su intento
+y las estadísticas. Aquí esas rutas se atienden con manejadores async y el
+pool de aiomysql (database_async.py): una consulta a MySQL ya no ocupa un
+hilo, así que un proceso aguanta muchas más conexiones abiertas. Todo lo
+demás (estáticos, subidas, historial...) lo sigue sirviendo la app Flask de
+app.py, montada como WSGI, y las rutas asíncronas reutilizan sus cachés,
+su registro de intentos y su serialización JSON: las respuestas son las
+mismas que con `python app.py` o gunicorn.
+"""
+import asyncio
+import contextlib
+import logging
+import time
+from datetime import date
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import Response
+from starlette.routing import Mount, Route
+from werkzeug.http import parse_etags
+from config import Config
+from database_async import abrir_pool, cerrar_pool, consultar
+from models import (
+    CONSULTA_IMAGENES_POR_FECHA, CONSULTA_MI_INTENTO, CONSULTA_MIS_INTENTOS, decodificar_variantes, hash_usuario
+)
+from registro_intentos import COLUMNAS_ESTADISTICAS
+from metricas import en_curso, observar_peticion
+from app import (
+    app as flask_app, cache_albumes, albumes_aleatorios, registro_intentos, preparar_album, enlaces_precarga,
+    formatear_estadisticas, formatear_mi_intento, formatear_mis_intentos, leer_rango_intentos, ORIGENES_CORS,
+    corpus_titulos, formatear_bootstrap, leer_parametros_bootstrap, datos_respaldo, max_age_album_del_dia,
+    numero_de_album, intentos_a_guardar
+)
+
+log = logging.getLogger('muzikdle.asgi')
+
+# La app Flask completa, para todo lo que no tiene versión asíncrona
+wsgi = WSGIMiddleware(flask_app)
+
+
+class DelegarEnFlask:
+    """Respuesta que pasa la petición, tal cual, a la app Flask"""
+
+    async def __call__(self, scope, receive, send):
+        await wsgi(scope, receive, send)
+
+
+def medido(ruta, manejador):
+    """Registra latencia y estado del manejador en las mismas métricas que Flask (/metrics)"""
+    async def manejador_medido(request):
+        inicio = time.perf_counter()
+        en_curso.sumar()
+        estado = 500
+        try:
+            respuesta = await manejador(request)
+            estado = getattr(respuesta, 'status_code', None)
+            return respuesta
+        finally:
+            en_curso.sumar(valor=-1)
+            # Lo delegado en Flask ya lo miden sus propios hooks
+            if estado is not None:
+                observar_peticion(ruta, request.method, estado, time.perf_counter() - inicio)
+    return manejador_medido
+
+
+def respuesta_json(datos, status=200, headers=None):
+    """Mismo cuerpo que jsonify (claves ordenadas, fechas HTTP, separadores compactos)"""
+    cuerpo = flask_app.json.dumps(datos, separators=(',', ':')) + '\n'
+    return Response(cuerpo, status_code=status, media_type='application/json', headers=headers)
+
+
+def respuesta_cacheable(request, datos, etag, max_age, enlaces=()):
+    """Como respuesta_cacheable de app.py: ETag, Cache-Control y 304 si el cliente ya lo tiene"""
+    cabeceras = {'ETag': f'"{etag}"', 'Cache-Control': f'public, max-age={max_age}'}
+    if enlaces:
+        cabeceras['Link'] = ', '.join(enlaces)
+    if parse_etags(request.headers.get('if-none-match')).contains_weak(etag):
+        return Response(status_code=304, headers=cabeceras)
+    return respuesta_json(datos, headers=cabeceras)
+
+
+# Cargas de álbum en curso: si llegan mil peticiones con la caché vacía, una sola consulta
+_cargas_album = {}
+
+
+async def obtener_album(fecha):
+    """Equivalente asíncrono de cache_albumes.obtener(fecha)"""
+    clave = cache_albumes.clave(fecha)
+    entrada, generacion = cache_albumes.consultar(clave)
+    if entrada is not None:
+        return entrada
+
+    carga = _cargas_album.get(clave)
+    if carga is None:
+        carga = asyncio.ensure_future(_cargar_album(clave, generacion))
+        _cargas_album[clave] = carga
+        carga.add_done_callback(lambda _: _cargas_album.pop(clave, None))
+    # shield: si un cliente se desconecta no se cancela la carga de los demás
+    return await asyncio.shield(carga)
+
+
+async def _cargar_album(clave, generacion):
+    imagenes = await consultar(CONSULTA_IMAGENES_POR_FECHA, (clave,))
+    if imagenes is None:
+        # Error de base de datos: no se guarda en caché
+        return None
+    return cache_albumes.guardar(clave, preparar_album(decodificar_variantes(list(imagenes))), generacion)
+
+
+async def imagenes_del_dia(request):
+    try:
+        hoy = date.today()
+        album = await obtener_album(hoy)
+        fecha_respaldo = None
+        if (not album or not album['imagenes']) and Config.ALBUM_RESPALDO:
+            # Como album_del_dia() de app.py; la primera elección carga las fechas de MySQL
+            fecha_respaldo = await run_in_threadpool(albumes_aleatorios.elegir, hoy, hoy.isoformat())
+            if fecha_respaldo:
+                album = await obtener_album(fecha_respaldo)
+        imagenes = album['imagenes'] if album else []
+
+        if imagenes:
+            datos = {
+                'success': True,
+                'imagenes': imagenes,
+                'total': len(imagenes)
+            }
+            if fecha_respaldo:
+                datos.update(datos_respaldo(fecha_respaldo))
+            return respuesta_cacheable(
+                request, datos, album['etag'], max_age_album_del_dia(fecha_respaldo), enlaces_precarga(imagenes)
+            )
+        return respuesta_json({
+            'success': False,
+            'message': 'No hay imágenes para hoy'
+        }, 404)
+
+    except Exception as e:
+        return respuesta_json({
+            'success': False,
+            'message': f'Error: {str(e)}'
+        }, 500)
+
+
+async def album_por_fecha(request):
+    fecha = request.path_params['fecha']
+    try:
+        album = await obtener_album(fecha)
+        imagenes = album['imagenes'] if album else []
+
+        if not imagenes:
+            return respuesta_json({
+                'success': False,
+                'message': 'No se encontró el álbum'
+            }, 404)
+
+        return respuesta_cacheable(request, {
+            'success': True,
+            'fecha': fecha,
+            'imagenes': imagenes,
+            'total': len(imagenes),
+            'titulo_final': imagenes[-1]['titulo'] if imagenes else None
+        }, album['etag'], Config.CACHE_ALBUM_MAX_AGE, enlaces_precarga(imagenes))
+
+    except Exception as e:
+        return respuesta_json({
+            'success': False,
+            'message': f'Error: {str(e)}'
+        }, 500)
+
+
+async def estadisticas_album(request):
+    fecha_album = request.query_params.get('fecha')
+    numero_album = request.query_params.get('numero')
+    if not fecha_album or not numero_album:
+        return respuesta_json({
+            'success': False,
+            'message': 'Se requiere fecha y número del álbum'
+        }, 400)
+
+    try:
+        # Casi siempre está en memoria; solo la reconciliación con MySQL va a un hilo
+        stats = registro_intentos.estadisticas_en_vivo(fecha_album, int(numero_album))
+        if stats is None:
+            stats = await run_in_threadpool(registro_intentos.estadisticas, fecha_album, int(numero_album))
+        estadisticas = formatear_estadisticas(stats)
+    except Exception:
+        log.exception("Error estadísticas álbum")
+        estadisticas = formatear_estadisticas({columna: 0 for columna in COLUMNAS_ESTADISTICAS})
+
+    return respuesta_json({
+        'success': True,
+        'fecha_album': fecha_album,
+        'numero_album': numero_album,
+        'estadisticas': estadisticas
+    })
+
+
+async def mi_intento_album(request):
+    user_id = request.headers.get('X-User-ID')
+    if not user_id:
+        # Sin cabecera el user_id sale de la sesión de Flask (y puede crearse)
+        return DelegarEnFlask()
+
+    fecha_album = request.query_params.get('fecha')
+    numero_album = request.query_params.get('numero')
+    if not fecha_album or not numero_album:
+        return respuesta_json({
+            'success': False,
+            'message': 'Se requiere fecha y número del álbum'
+        }, 400)
+
+    try:
+        user_id_hash = hash_usuario(user_id)
+        filas = await consultar(CONSULTA_MI_INTENTO, (user_id_hash, fecha_album, int(numero_album)))
+        if filas is None:
+            raise Exception('No se pudo consultar el intento')
+        return respuesta_json(formatear_mi_intento(registro_intentos.mi_intento(
+            user_id_hash, fecha_album, int(numero_album), filas[0] if filas else None
+        )))
+
+    except Exception as e:
+        log.exception("Error mi intento álbum")
+        return respuesta_json({
+            'success': False,
+            'message': f'Error: {str(e)}'
+        }, 500)
+
+
+async def mis_intentos(request):
+    user_id = request.headers.get('X-User-ID')
+    if not user_id:
+        return DelegarEnFlask()
+
+    try:
+        desde, hasta = leer_rango_intentos(request.query_params)
+    except ValueError as e:
+        return respuesta_json({'success': False, 'message': f'Rango no válido: {str(e)}'}, 400)
+
+    try:
+        user_id_hash = hash_usuario(user_id)
+        filas = await consultar(CONSULTA_MIS_INTENTOS, (user_id_hash, desde, hasta))
+        if filas is None:
+            raise Exception('No se pudieron consultar los intentos')
+        # Las partidas recién terminadas pueden seguir en la cola
+        filas = registro_intentos.mis_intentos(user_id_hash, desde, hasta, filas)
+        return respuesta_json(
+            formatear_mis_intentos(filas, desde, hasta), headers={'Cache-Control': 'private, no-cache'}
+        )
+
+    except Exception as e:
+        log.exception("Error mis intentos")
+        return respuesta_json({
+            'success': False,
+            'message': f'Error: {str(e)}'
+        }, 500)
+
+
+async def _album_bootstrap(fecha, historico):
+    album = await obtener_album(fecha)
+    if historico or (album and album['imagenes']) or not Config.ALBUM_RESPALDO:
+        return album, None
+    fecha_respaldo = await run_in_threadpool(albumes_aleatorios.elegir, fecha, fecha.isoformat())
+    if fecha_respaldo is None:
+        return album, None
+    return await obtener_album(fecha_respaldo), fecha_respaldo
+
+
+async def _intento_bootstrap(user_id, fecha, numero):
+    user_id_hash = hash_usuario(user_id)
+    filas = await consultar(CONSULTA_MI_INTENTO, (user_id_hash, fecha.isoformat(), numero))
+    if filas is None:
+        raise Exception('No se pudo consultar el intento')
+    return registro_intentos.mi_intento(user_id_hash, fecha.isoformat(), numero, filas[0] if filas else None)
+
+
+async def _nada():
+    return None
+
+
+def _intento_y_stats(user_id, fecha, numero):
+    """Corrutinas del intento y las estadísticas del bootstrap (nada si falta `numero`)"""
+    if numero is None:
+        return _nada(), _nada()
+    return (_intento_bootstrap(user_id, fecha, numero),
+            run_in_threadpool(registro_intentos.estadisticas, fecha.isoformat(), numero))
+
+
+async def bootstrap(request):
+    user_id = request.headers.get('X-User-ID')
+    if not user_id:
+        # Sin cabecera el user_id sale de la sesión de Flask (y puede crearse)
+        return DelegarEnFlask()
+
+    try:
+        fecha, numero, historico = leer_parametros_bootstrap(request.query_params)
+    except ValueError as e:
+        return respuesta_json({'success': False, 'message': f'Parámetros no válidos: {str(e)}'}, 400)
+
+    try:
+        con_numero = numero is not None
+        tarea_corpus = asyncio.ensure_future(run_in_threadpool(lambda: corpus_titulos.version))
+        if historico:
+            album, mi_intento, stats = await asyncio.gather(
+                _album_bootstrap(fecha, historico), *_intento_y_stats(user_id, fecha, numero),
+                return_exceptions=True
+            )
+        else:
+            # Con el álbum del día puede tocar el de respaldo, que cambia fecha y número:
+            # se espera al álbum (casi siempre en caché) antes de pedir el intento y las estadísticas
+            (album,) = await asyncio.gather(_album_bootstrap(fecha, historico), return_exceptions=True)
+            if not isinstance(album, Exception) and album[1] and con_numero:
+                # Hoy no hay álbum: el intento y las estadísticas son los del álbum de respaldo
+                fecha, numero = album[1], numero_de_album(album[1])
+            mi_intento, stats = await asyncio.gather(*_intento_y_stats(user_id, fecha, numero), return_exceptions=True)
+        (version_corpus,) = await asyncio.gather(tarea_corpus, return_exceptions=True)
+        # Como en app.py: una parte que falla va como None (False en el intento: no se sabe)
+        for parte, valor in (('álbum', album), ('intento', mi_intento), ('estadísticas', stats),
+                             ('versión del corpus', version_corpus)):
+            if isinstance(valor, Exception):
+                log.warning("Bootstrap sin %s: %s", parte, valor)
+        if isinstance(album, Exception):
+            album = (None, None)
+        if isinstance(mi_intento, Exception) or not con_numero:
+            mi_intento = False
+        if isinstance(stats, Exception):
+            stats = None
+        if isinstance(version_corpus, Exception):
+            version_corpus = None
+
+        return respuesta_json(
+            formatear_bootstrap(user_id, fecha, numero, *album, mi_intento, stats, version_corpus),
+            headers={'Cache-Control': 'private, no-cache'}
+        )
+
+    except Exception as e:
+        log.exception("Error en bootstrap")
+        return respuesta_json({
+            'success': False,
+            'message': f'Error: {str(e)}'
+        }, 500)
+
+
+def _registrar_intento(user_id, fecha_album, numero_album, acierto, intentos_guardar):
+    # registrar() puede leer de MySQL con el driver síncrono: se ejecuta en un hilo
+    es_primera_vez, veces_jugado = registro_intentos.registrar(
+        hash_usuario(user_id), fecha_album, numero_album, acierto, intentos_guardar
+    )
+    stats = registro_intentos.estadisticas(fecha_album, numero_album)
+    return es_primera_vez, veces_jugado, stats
+
+
+async def registrar_intento_album(request):
+    user_id = request.headers.get('X-User-ID')
+    if not user_id:
+        # Antes de leer el cuerpo: Flask lo necesita entero
+        return DelegarEnFlask()
+
+    try:
+        data = await request.json()
+
+        fecha_album = data.get('fecha_album')
+        numero_album = data.get('numero_album')
+        acierto = bool(data.get('acierto', False))
+        intentos_usuario = data.get('intentos', 1)
+
+        if not fecha_album or not numero_album:
+            return respuesta_json({
+                'success': False,
+                'message': 'Se requiere fecha_album y numero_album'
+            }, 400)
+
+        # 1-5 si acertó, 6 si falló
+        try:
+            intentos_guardar = intentos_a_guardar(acierto, intentos_usuario)
+        except (TypeError, ValueError) as e:
+            return respuesta_json({
+                'success': False,
+                'message': f'Intentos no válidos: {str(e)}'
+            }, 400)
+
+        es_primera_vez, veces_jugado, stats = await run_in_threadpool(
+            _registrar_intento, user_id, fecha_album, int(numero_album), acierto, intentos_guardar
+        )
+
+        return respuesta_json({
+            'success': True,
+            'message': 'Intento registrado',
+            'es_primera_vez': es_primera_vez,
+            'veces_jugado': veces_jugado,
+            'estadisticas': formatear_estadisticas(stats)
+        })
+
+    except Exception as e:
+        log.exception("Error registrar intento álbum")
+        return respuesta_json({
+            'success': False,
+            'message': f'Error: {str(e)}'
+        }, 500)
+
+
+@contextlib.asynccontextmanager
+async def ciclo_de_vida(_):
+    await abrir_pool()
+    try:
+        yield
+    finally:
+        await cerrar_pool()
+
+
+app = Starlette(
+    routes=[
+        Route('/api/imagenes-del-dia', medido('/api/imagenes-del-dia', imagenes_del_dia), methods=['GET']),
+        # Misma etiqueta de ruta que la regla de Flask
+        Route('/api/album/{fecha}', medido('/api/album/<fecha>', album_por_fecha), methods=['GET']),
+        Route('/api/estadisticas-album', medido('/api/estadisticas-album', estadisticas_album), methods=['GET']),
+        Route('/api/mi-intento-album', medido('/api/mi-intento-album', mi_intento_album), methods=['GET']),
+        Route('/api/mis-intentos', medido('/api/mis-intentos', mis_intentos), methods=['GET']),
+        Route('/api/bootstrap', medido('/api/bootstrap', bootstrap), methods=['GET']),
+        Route(
+            '/api/registrar-intento-album', medido('/api/registrar-intento-album', registrar_intento_album),
+            methods=['POST']
+        ),
+        Mount('/', app=wsgi),
+    ],
+    middleware=[
+        Middleware(
+            CORSMiddleware,
+            allow_origins=ORIGENES_CORS,
+            allow_methods=['GET', 'POST', 'OPTIONS'],
+            allow_headers=['Content-Type', 'Authorization']
+        ),
+    ],
+    lifespan=ciclo_de_vida
+)
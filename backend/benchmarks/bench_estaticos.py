@@ -0,0 +1,71 @@
+"""Compara el servido de estáticos antes (send_from_directory por defecto) y después (estaticos.py).
+
+Uso: python benchmarks/bench_estaticos.py [--peticiones N]
+
+Lanza las peticiones en proceso con el cliente de pruebas de Flask, así que
+mide el coste en Python de cada ruta (sin red). Conviene ejecutar antes
+comprimir_estaticos.py para que haya .gz/.br que servir.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from flask import send_from_directory  # noqa: E402
+from app import app, FRONTEND_FOLDER  # noqa: E402
+
+ARCHIVOS = [('css', 'style.css'), ('js', 'script.js'), ('js', 'historial.js')]
+
+
+def ruta_antes(carpeta, filename):
+    return send_from_directory(os.path.join(FRONTEND_FOLDER, carpeta), filename)
+
+
+app.add_url_rule('/_bench_antes/<carpeta>/<path:filename>', 'bench_antes', ruta_antes)
+
+
+def medir(cliente, urls, peticiones, cabeceras):
+    bytes_totales = 0
+    etags = {}
+    inicio = time.perf_counter()
+    for i in range(peticiones):
+        url = urls[i % len(urls)]
+        extra = dict(cabeceras)
+        if extra.pop('revalidar', False) and url in etags:
+            extra['If-None-Match'] = etags[url]
+        respuesta = cliente.get(url, headers=extra)
+        cuerpo = respuesta.get_data()
+        bytes_totales += len(cuerpo)
+        if respuesta.headers.get('ETag'):
+            etags[url] = respuesta.headers['ETag']
+        respuesta.close()
+    duracion = time.perf_counter() - inicio
+    return peticiones / duracion, bytes_totales / peticiones
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--peticiones', type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    cliente = app.test_client()
+    antes = [f'/_bench_antes/{c}/{f}' for c, f in ARCHIVOS]
+    despues = [f'/{c}/{f}' for c, f in ARCHIVOS]
+    escenarios = [
+        ('completa', {'Accept-Encoding': 'gzip, br'}),
+        ('revalidación (If-None-Match)', {'Accept-Encoding': 'gzip, br', 'revalidar': True}),
+    ]
+
+    print(f"{'escenario':32} {'ruta':8} {'pet/s':>10} {'bytes/pet':>10}")
+    for nombre, cabeceras in escenarios:
+        for etiqueta, urls in (('antes', antes), ('después', despues)):
+            medir(cliente, urls, 50, cabeceras)  # calentamiento
+            por_segundo, bytes_medios = medir(cliente, urls, args.peticiones, cabeceras)
+            print(f"{nombre:32} {etiqueta:8} {por_segundo:10.0f} {bytes_medios:10.0f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
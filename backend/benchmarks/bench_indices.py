@@ -0,0 +1,139 @@
+"""Compara plan y latencia de las consultas calientes sin y con los índices de las migraciones 4, 5 y 7.
+
+Uso: python benchmarks/bench_indices.py [--repeticiones N] [--claves N]
+
+Necesita la base de datos con las migraciones aplicadas (python migraciones.py)
+y algo de datos: toma fechas, jugadores y álbumes reales de las tablas. La
+versión "antes" es la misma consulta forzando a MySQL a no usar el índice
+nuevo (IGNORE INDEX) y, para intentos_usuario_album, buscando por el hash en
+hexadecimal (user_id_hash) como hacía el código anterior.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from database import Database  # noqa: E402
+from models import CONSULTA_IMAGENES_POR_FECHA, CONSULTA_MI_INTENTO  # noqa: E402
+
+
+def indices_de(cursor, tabla):
+    cursor.execute(
+        "SELECT DISTINCT index_name FROM information_schema.statistics "
+        "WHERE table_schema = DATABASE() AND table_name = %s", (tabla,)
+    )
+    return {fila[0] for fila in cursor.fetchall()}
+
+
+def sin_indice(tabla, indice, existentes):
+    """Pista para no usar `indice` (vacía si no existe: la migración no está aplicada)"""
+    return f"{tabla} IGNORE INDEX ({indice})" if indice in existentes.get(tabla, ()) else tabla
+
+
+def explicar(cursor, consulta, params):
+    cursor.execute('EXPLAIN ' + consulta, params)
+    columnas = [d[0] for d in cursor.description]
+    filas = [dict(zip(columnas, fila)) for fila in cursor.fetchall()]
+    return '; '.join(
+        f"type={f.get('type')} key={f.get('key')} rows={f.get('rows')} {f.get('Extra') or ''}".strip()
+        for f in filas
+    )
+
+
+def medir(cursor, consulta, claves, repeticiones):
+    tiempos = []
+    for i in range(repeticiones):
+        inicio = time.perf_counter()
+        cursor.execute(consulta, claves[i % len(claves)])
+        cursor.fetchall()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    tiempos.sort()
+    return statistics.fmean(tiempos), tiempos[len(tiempos) // 2], tiempos[int(len(tiempos) * 0.95)]
+
+
+def escenarios(cursor, existentes, n):
+    cursor.execute(
+        "SELECT DISTINCT fecha_programada FROM imagenes WHERE activa = TRUE AND fecha_programada IS NOT NULL "
+        "ORDER BY fecha_programada DESC LIMIT %s", (n,)
+    )
+    fechas = [(fila[0],) for fila in cursor.fetchall()]
+    if fechas:
+        yield (
+            'álbum por fecha',
+            CONSULTA_IMAGENES_POR_FECHA.replace(
+                'FROM imagenes', 'FROM ' + sin_indice('imagenes', 'idx_imagenes_activa_fecha_orden', existentes)
+            ),
+            CONSULTA_IMAGENES_POR_FECHA,
+            fechas, fechas
+        )
+
+    historial = """
+        SELECT fecha_programada, COUNT(*) AS total_imagenes FROM {tabla}
+        WHERE activa = TRUE AND fecha_programada IS NOT NULL
+        GROUP BY fecha_programada ORDER BY fecha_programada DESC
+    """
+    yield (
+        'historial agrupado',
+        historial.format(tabla=sin_indice('imagenes', 'idx_imagenes_activa_fecha_orden', existentes)),
+        historial.format(tabla='imagenes'),
+        [()], [()]
+    )
+
+    cursor.execute(
+        "SELECT user_id_hash, user_id_hash_bin, fecha_album, numero_album FROM intentos_usuario_album "
+        "WHERE user_id_hash_bin IS NOT NULL LIMIT %s", (n,)
+    )
+    jugadores = cursor.fetchall()
+    # La migración 7 cambia idx_intentos_hash_album por uno único
+    indice_intentos = (
+        'uq_intentos_hash_album' if 'uq_intentos_hash_album' in existentes.get('intentos_usuario_album', ())
+        else 'idx_intentos_hash_album'
+    )
+    if jugadores:
+        yield (
+            'intento de un jugador',
+            CONSULTA_MI_INTENTO.replace('user_id_hash_bin = %s', 'user_id_hash = %s').replace(
+                'FROM intentos_usuario_album',
+                'FROM ' + sin_indice('intentos_usuario_album', indice_intentos, existentes)
+            ),
+            CONSULTA_MI_INTENTO,
+            [(hexa, fecha, numero) for hexa, _, fecha, numero in jugadores],
+            [(bytes(binario), fecha, numero) for _, binario, fecha, numero in jugadores]
+        )
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeticiones', type=int, default=500)
+    parser.add_argument('--claves', type=int, default=50, help='fechas/jugadores distintos a consultar')
+    args = parser.parse_args(argv)
+
+    db = Database()
+    conexion = db.connect()
+    if conexion is None:
+        print("No hay conexión con la base de datos")
+        return 1
+    cursor = conexion.cursor()
+    try:
+        existentes = {tabla: indices_de(cursor, tabla) for tabla in ('imagenes', 'intentos_usuario_album')}
+        if 'idx_imagenes_activa_fecha_orden' not in existentes['imagenes']:
+            print("Aviso: faltan los índices de la migración 4/5; 'antes' y 'después' serán iguales")
+
+        print(f"{'consulta':24} {'versión':8} {'media ms':>9} {'p50 ms':>8} {'p95 ms':>8}  plan")
+        for nombre, antes, despues, claves_antes, claves_despues in escenarios(cursor, existentes, args.claves):
+            for etiqueta, consulta, claves in (('antes', antes, claves_antes), ('después', despues, claves_despues)):
+                plan = explicar(cursor, consulta, claves[0])
+                medir(cursor, consulta, claves, 20)  # calentamiento
+                media, p50, p95 = medir(cursor, consulta, claves, args.repeticiones)
+                print(f"{nombre:24} {etiqueta:8} {media:9.3f} {p50:8.3f} {p95:8.3f}  {plan}")
+    finally:
+        cursor.close()
+        db.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,413 @@
+"""Prueba de carga reproducible de la API del juego, con comparación contra una línea base.
+
+Uso: DB_NAME=muzikdle_bench python benchmarks/carga.py [--url http://localhost:5000]
+         [--hilos N] [--peticiones N] [--rafaga N] [--semilla N]
+         [--salida resultado.json] [--base base.json] [--tolerancia 0.10]
+
+Primero hay que sembrar la base con benchmarks/sembrar.py, con la misma
+--semilla, --albumes y --jugadores: de ellos salen los títulos y jugadores
+de las peticiones. Sin --url las peticiones van a la app Flask en este
+mismo proceso (cliente de pruebas, sin red), así que se mide el código y
+MySQL; con --url van por HTTP a un servidor ya arrancado (servidor.py,
+uvicorn...).
+
+Hay dos fases:
+  ráfaga   el cambio de día: la caché de álbumes vacía (solo sin --url) y
+           --rafaga peticiones a /api/imagenes-del-dia lanzadas a la vez
+  mezcla   --peticiones repartidas entre las rutas según MEZCLA: álbum,
+           autocompletado, partidas terminadas, estadísticas...
+
+Por ruta se informa de p50/p95/p99, peticiones por segundo, errores y
+sentencias a MySQL por petición; estas salen de /metrics antes y después de
+cada fase (no incluyen las escrituras en segundo plano de registro_intentos
+ni las consultas de los hilos de /api/bootstrap). Con --salida se guarda el
+resultado en JSON; con --base se compara con uno guardado antes y el
+programa termina con 1 si alguna ruta empeora más que --tolerancia.
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+from datetime import date, datetime
+from urllib.parse import urlencode, urlsplit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from sembrar import mundo_sintetico  # noqa: E402
+
+# Peso de cada ruta en la fase de mezcla (aproxima el tráfico de un día normal)
+MEZCLA = {
+    '/api/imagenes-del-dia': 30,
+    '/api/buscar-titulos': 30,
+    '/api/registrar-intento-album': 10,
+    '/api/estadisticas-album': 10,
+    '/api/bootstrap': 8,
+    '/api/mi-intento-album': 5,
+    '/api/historial-completo': 4,
+    '/api/todos-titulos-y-descripciones': 2,
+    '/api/mis-intentos': 1,
+}
+PERCENTILES = (50, 95, 99)
+# Diferencias de latencia por debajo de esto son ruido, aunque en porcentaje parezcan mucho
+RUIDO_MS = 1.0
+PATRON_METRICA = re.compile(r'^(?P<nombre>[a-zA-Z_:][\w:]*)(?:\{(?P<etiquetas>[^}]*)\})? (?P<valor>\S+)$')
+
+
+# -- Clientes -----------------------------------------------------------------
+
+class ClienteLocal:
+    """Peticiones a la app Flask de este proceso (un cliente de pruebas por hilo)"""
+
+    def __init__(self):
+        from app import app
+        self._app = app
+        self._hilo = threading.local()
+
+    def _cliente(self):
+        if not hasattr(self._hilo, 'cliente'):
+            self._hilo.cliente = self._app.test_client()
+        return self._hilo.cliente
+
+    def pedir(self, metodo, ruta, cabeceras=None, cuerpo=None):
+        respuesta = self._cliente().open(ruta, method=metodo, headers=cabeceras or {}, json=cuerpo)
+        datos = respuesta.get_data()
+        return respuesta.status_code, datos
+
+    def vaciar_cache_albumes(self):
+        from app import cache_albumes
+        cache_albumes.invalidar()
+        return True
+
+    def terminar(self):
+        # Escribir lo que quede en la cola de partidas antes de salir
+        from app import registro_intentos
+        registro_intentos.detener()
+
+
+class ClienteHttp:
+    """Peticiones HTTP a un servidor arrancado (una conexión keep-alive por hilo)"""
+
+    def __init__(self, url):
+        partes = urlsplit(url)
+        self._clase = http.client.HTTPSConnection if partes.scheme == 'https' else http.client.HTTPConnection
+        self._destino = partes.netloc
+        self._hilo = threading.local()
+
+    def _conexion(self):
+        if not hasattr(self._hilo, 'conexion'):
+            self._hilo.conexion = self._clase(self._destino, timeout=30)
+        return self._hilo.conexion
+
+    def pedir(self, metodo, ruta, cabeceras=None, cuerpo=None):
+        cabeceras = dict(cabeceras or {})
+        datos = None
+        if cuerpo is not None:
+            datos = json.dumps(cuerpo).encode('utf-8')
+            cabeceras['Content-Type'] = 'application/json'
+        for intento in range(2):
+            conexion = self._conexion()
+            try:
+                conexion.request(metodo, ruta, body=datos, headers=cabeceras)
+                respuesta = conexion.getresponse()
+                return respuesta.status, respuesta.read()
+            except (http.client.HTTPException, ConnectionError):
+                # El servidor cerró la conexión keep-alive: abrir otra y repetir una vez
+                conexion.close()
+                del self._hilo.conexion
+                if intento:
+                    raise
+
+    def vaciar_cache_albumes(self):
+        return False  # la caché es de cada worker del servidor: no se puede vaciar desde fuera
+
+    def terminar(self):
+        pass
+
+
+# -- Peticiones ---------------------------------------------------------------
+
+class Generador:
+    """Construye peticiones realistas a partir del mundo sintético de sembrar.py"""
+
+    def __init__(self, albumes, usuarios, semilla):
+        hoy = date.today()
+        self.jugables = [album for album in albumes if album[0] <= hoy]
+        self.hoy = next(album for album in self.jugables if album[0] == hoy)
+        self.titulos = [titulo for _, _, titulo in albumes]
+        self.usuarios = usuarios
+        self.azar = random.Random(semilla)
+
+    def album(self):
+        # La mayoría juega el álbum del día; el resto, alguno del historial
+        return self.hoy if self.azar.random() < 0.7 else self.azar.choice(self.jugables)
+
+    def peticion(self, ruta):
+        """(método, URL, cabeceras, cuerpo) para `ruta`"""
+        azar = self.azar
+        usuario = {'X-User-ID': azar.choice(self.usuarios)}
+        fecha, numero, _ = self.album()
+        if ruta == '/api/buscar-titulos':
+            # Lo que lleva escrito el jugador: un prefijo de un título
+            titulo = azar.choice(self.titulos)
+            texto = titulo[:azar.randint(2, min(8, len(titulo)))]
+            return 'GET', f"{ruta}?{urlencode({'q': texto, 'limite': 10})}", {}, None
+        if ruta == '/api/registrar-intento-album':
+            acierto = azar.random() < 0.6
+            cuerpo = {
+                'fecha_album': fecha.isoformat(), 'numero_album': numero,
+                'acierto': acierto, 'intentos': azar.randint(1, 5) if acierto else 5,
+            }
+            return 'POST', ruta, usuario, cuerpo
+        if ruta in ('/api/estadisticas-album', '/api/mi-intento-album'):
+            return 'GET', f"{ruta}?{urlencode({'fecha': fecha.isoformat(), 'numero': numero})}", usuario, None
+        if ruta == '/api/bootstrap':
+            hoy, numero_hoy, _ = self.hoy
+            return 'GET', f"{ruta}?{urlencode({'fecha': hoy.isoformat(), 'numero': numero_hoy})}", usuario, None
+        if ruta == '/api/historial-completo':
+            return 'GET', f"{ruta}?limite=120", {}, None
+        if ruta == '/api/mis-intentos':
+            return 'GET', ruta, usuario, None
+        return 'GET', ruta, {}, None
+
+
+# -- Métricas del servidor ----------------------------------------------------
+
+def leer_metricas(cliente):
+    """{(nombre, etiquetas): valor} de /metrics (vacío si no está disponible)"""
+    try:
+        estado, cuerpo = cliente.pedir('GET', '/metrics')
+    except Exception:
+        return {}
+    if estado != 200:
+        return {}
+    muestras = {}
+    for linea in cuerpo.decode('utf-8').splitlines():
+        coincidencia = PATRON_METRICA.match(linea)
+        if coincidencia and not linea.startswith('#'):
+            muestras[(coincidencia['nombre'], coincidencia['etiquetas'] or '')] = float(coincidencia['valor'])
+    return muestras
+
+
+def consultas_por_ruta(antes, despues):
+    """{ruta: sentencias a MySQL por petición} a partir de dos lecturas de /metrics"""
+    resultado = {}
+    for (nombre, etiquetas), valor in despues.items():
+        if nombre != 'muzikdle_db_consultas_por_peticion_sum':
+            continue
+        ruta = re.search(r'ruta="([^"]*)"', etiquetas)
+        if not ruta:
+            continue
+        peticiones = (despues.get(('muzikdle_db_consultas_por_peticion_count', etiquetas), 0)
+                      - antes.get(('muzikdle_db_consultas_por_peticion_count', etiquetas), 0))
+        if peticiones > 0:
+            resultado[ruta.group(1)] = round((valor - antes.get((nombre, etiquetas), 0)) / peticiones, 2)
+    return resultado
+
+
+# -- Ejecución ----------------------------------------------------------------
+
+def percentil(ordenados, p):
+    if not ordenados:
+        return None
+    return ordenados[min(len(ordenados) - 1, max(0, math.ceil(p / 100 * len(ordenados)) - 1))]
+
+
+def ejecutar_fase(cliente, trabajos, hilos):
+    """Lanza `trabajos` [(etiqueta, método, url, cabeceras, cuerpo)] con `hilos` hilos a la vez"""
+    tiempos = {}
+    errores = {}
+    lock = threading.Lock()
+    siguiente = iter(trabajos)
+    salida = threading.Barrier(hilos)
+
+    def trabajar():
+        propios, fallos = {}, {}
+        salida.wait()  # todos empiezan a la vez (la ráfaga de medianoche)
+        while True:
+            with lock:
+                trabajo = next(siguiente, None)
+            if trabajo is None:
+                break
+            etiqueta, metodo, url, cabeceras, cuerpo = trabajo
+            inicio = time.perf_counter()
+            try:
+                estado, _ = cliente.pedir(metodo, url, cabeceras, cuerpo)
+            except Exception:
+                estado = None
+            propios.setdefault(etiqueta, []).append((time.perf_counter() - inicio) * 1000)
+            if estado is None or estado >= 500:
+                fallos[etiqueta] = fallos.get(etiqueta, 0) + 1
+        with lock:
+            for etiqueta, lista in propios.items():
+                tiempos.setdefault(etiqueta, []).extend(lista)
+            for etiqueta, cantidad in fallos.items():
+                errores[etiqueta] = errores.get(etiqueta, 0) + cantidad
+
+    antes = leer_metricas(cliente)
+    inicio = time.perf_counter()
+    lanzados = [threading.Thread(target=trabajar) for _ in range(hilos)]
+    for hilo in lanzados:
+        hilo.start()
+    for hilo in lanzados:
+        hilo.join()
+    duracion = time.perf_counter() - inicio
+    consultas = consultas_por_ruta(antes, leer_metricas(cliente))
+
+    rutas = {}
+    for etiqueta, lista in sorted(tiempos.items()):
+        lista.sort()
+        rutas[etiqueta] = {
+            'peticiones': len(lista),
+            'errores': errores.get(etiqueta, 0),
+            'rps': round(len(lista) / duracion, 1),
+            **{f'p{p}_ms': round(percentil(lista, p), 2) for p in PERCENTILES},
+            'consultas_db': consultas.get(etiqueta),
+        }
+    total = sum(len(lista) for lista in tiempos.values())
+    return {
+        'duracion_s': round(duracion, 3),
+        'peticiones': total,
+        'rps': round(total / duracion, 1) if duracion else None,
+        'rutas': rutas,
+    }
+
+
+def trabajos_rafaga(generador, cantidad):
+    return [('/api/imagenes-del-dia',) + generador.peticion('/api/imagenes-del-dia') for _ in range(cantidad)]
+
+
+def trabajos_mezcla(generador, cantidad):
+    rutas = list(MEZCLA)
+    pesos = list(MEZCLA.values())
+    return [
+        (ruta,) + generador.peticion(ruta)
+        for ruta in generador.azar.choices(rutas, pesos, k=cantidad)
+    ]
+
+
+def correr(args):
+    cliente = ClienteHttp(args.url) if args.url else ClienteLocal()
+    albumes, usuarios = mundo_sintetico(args.semilla, args.albumes, args.jugadores)
+    generador = Generador(albumes, usuarios, args.semilla)
+
+    # Calentamiento (no se mide): conexiones del pool, índice de títulos, corpus...
+    ejecutar_fase(cliente, trabajos_mezcla(generador, args.calentamiento), args.hilos)
+
+    fases = {}
+    cache_vacia = cliente.vaciar_cache_albumes()
+    fases['rafaga'] = ejecutar_fase(cliente, trabajos_rafaga(generador, args.rafaga), args.hilos)
+    fases['rafaga']['cache_vacia'] = cache_vacia
+    fases['mezcla'] = ejecutar_fase(cliente, trabajos_mezcla(generador, args.peticiones), args.hilos)
+    cliente.terminar()
+
+    return {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'destino': args.url or 'local',
+        'parametros': {
+            'hilos': args.hilos, 'peticiones': args.peticiones, 'rafaga': args.rafaga,
+            'semilla': args.semilla, 'albumes': args.albumes, 'jugadores': args.jugadores,
+        },
+        'fases': fases,
+    }
+
+
+# -- Informe y comparación ----------------------------------------------------
+
+def imprimir(resultado):
+    for fase, datos in resultado['fases'].items():
+        print(f"\n== {fase}: {datos['peticiones']} peticiones en {datos['duracion_s']} s ({datos['rps']} req/s)")
+        print(f"{'ruta':38} {'n':>6} {'err':>4} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'sql/pet':>8}")
+        for ruta, r in datos['rutas'].items():
+            sql = '-' if r['consultas_db'] is None else f"{r['consultas_db']:.2f}"
+            print(f"{ruta:38} {r['peticiones']:6d} {r['errores']:4d} {r['rps']:8.1f} "
+                  f"{r['p50_ms']:8.2f} {r['p95_ms']:8.2f} {r['p99_ms']:8.2f} {sql:>8}")
+
+
+def empeora(antes, ahora, tolerancia, peor_si_sube=True, ruido=0.0):
+    if antes is None or ahora is None or abs(ahora - antes) <= ruido:
+        return False
+    if not antes:
+        return peor_si_sube and ahora > 0
+    cambio = (ahora - antes) / antes
+    return cambio > tolerancia if peor_si_sube else cambio < -tolerancia
+
+
+def comparar(resultado, base, tolerancia):
+    """Imprime las diferencias con `base` y devuelve las regresiones [(fase, ruta, métrica, antes, ahora)]"""
+    if base.get('parametros') != resultado['parametros']:
+        print("\nAviso: la línea base se tomó con otros parámetros; la comparación es orientativa")
+    regresiones = []
+
+    def anotar(fase, ruta, metrica, antes, ahora, peor):
+        if peor:
+            regresiones.append((fase, ruta, metrica, antes, ahora))
+        return f"{metrica} {antes}→{ahora}{' ✗' if peor else ''}"
+
+    for fase, datos in resultado['fases'].items():
+        fase_base = base.get('fases', {}).get(fase, {})
+        print(f"\n== {fase} frente a la línea base ({base.get('fecha')}): "
+              + anotar(fase, '*', 'rps', fase_base.get('rps'), datos['rps'],
+                       empeora(fase_base.get('rps'), datos['rps'], tolerancia, peor_si_sube=False)))
+        for ruta, r in datos['rutas'].items():
+            b = fase_base.get('rutas', {}).get(ruta)
+            if not b:
+                print(f"  {ruta}: sin datos en la base")
+                continue
+            cambios = [
+                anotar(fase, ruta, f'p{p}_ms', b[f'p{p}_ms'], r[f'p{p}_ms'],
+                       empeora(b[f'p{p}_ms'], r[f'p{p}_ms'], tolerancia, ruido=RUIDO_MS))
+                for p in PERCENTILES
+            ]
+            # Una sentencia más por petición o un error nuevo no son ruido: cualquier aumento cuenta
+            cambios.append(anotar(fase, ruta, 'consultas_db', b.get('consultas_db'), r['consultas_db'],
+                                  empeora(b.get('consultas_db'), r['consultas_db'], 0.0)))
+            tasa_antes = b['errores'] / b['peticiones'] if b['peticiones'] else 0.0
+            tasa_ahora = r['errores'] / r['peticiones'] if r['peticiones'] else 0.0
+            cambios.append(anotar(fase, ruta, 'errores', b['errores'], r['errores'],
+                                  empeora(tasa_antes, tasa_ahora, 0.0)))
+            print(f"  {ruta}: " + ', '.join(cambios))
+    return regresiones
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='servidor arrancado (por defecto, la app en este proceso)')
+    parser.add_argument('--hilos', type=int, default=16, help='clientes simultáneos')
+    parser.add_argument('--peticiones', type=int, default=5000, help='peticiones de la fase de mezcla')
+    parser.add_argument('--rafaga', type=int, default=1000, help='peticiones de la ráfaga de medianoche')
+    parser.add_argument('--calentamiento', type=int, default=200)
+    parser.add_argument('--semilla', type=int, default=1, help='la misma que en sembrar.py')
+    parser.add_argument('--albumes', type=int, default=400, help='el mismo que en sembrar.py')
+    parser.add_argument('--jugadores', type=int, default=20000, help='el mismo que en sembrar.py')
+    parser.add_argument('--salida', help='guardar el resultado en este JSON (p. ej. para usarlo como base)')
+    parser.add_argument('--base', help='JSON de una ejecución anterior con el que comparar')
+    parser.add_argument('--tolerancia', type=float, default=0.10, help='empeoramiento admitido (0.10 = 10%%)')
+    args = parser.parse_args(argv)
+
+    resultado = correr(args)
+    imprimir(resultado)
+
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, ensure_ascii=False, indent=2)
+        print(f"\nResultado guardado en {args.salida}")
+
+    if args.base:
+        with open(args.base, encoding='utf-8') as f:
+            base = json.load(f)
+        regresiones = comparar(resultado, base, args.tolerancia)
+        if regresiones:
+            print(f"\n{len(regresiones)} regresión(es) por encima del {args.tolerancia:.0%}")
+            return 1
+        print("\nSin regresiones")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
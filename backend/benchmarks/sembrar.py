@@ -0,0 +1,239 @@
+"""Llena una base de datos de pruebas con álbumes, jugadores y partidas sintéticos.
+
+Uso: DB_NAME=muzikdle_bench python benchmarks/sembrar.py [--albumes N] [--jugadores N]
+         [--partidas N] [--semilla N] [--forzar]
+
+Crea las tablas base si no existen (imagenes, intentos_usuario_album,
+estadisticas_album), aplica las migraciones y las vacía antes de sembrar.
+Por eso se niega a tocar una base cuyo nombre no termine en _bench salvo
+con --forzar. Con la misma semilla y escala los datos son siempre los
+mismos; carga.py reconstruye a partir de ellas los títulos y jugadores que
+usa en las peticiones (mundo_sintetico).
+
+Los álbumes ocupan los días hasta hoy incluido y unos pocos más por delante
+(programados, como en producción). Las partidas se reparten con más peso en
+los álbumes recientes, y estadisticas_album se calcula a partir de ellas,
+así que los contadores cuadran con las filas de intentos_usuario_album.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from collections import Counter
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from config import Config  # noqa: E402
+from database import Database  # noqa: E402
+from migraciones import aplicar_pendientes  # noqa: E402
+from models import ImagenModel, hash_usuario  # noqa: E402
+from registro_intentos import COLUMNAS_ESTADISTICAS, deltas_estadisticas  # noqa: E402
+
+# Mismo valor que FECHA_INICIO en script.js: numero_album = días desde ese día + 1
+FECHA_INICIO = date(2026, 1, 26)
+DIAS_POR_DELANTE = 7
+LOTE = 5000
+
+PALABRAS = (
+    'Noche', 'Fuego', 'Luna', 'Ciudad', 'Tormenta', 'Cristal', 'Sombra', 'Verano', 'Eterno', 'Perdido',
+    'Salvaje', 'Dorado', 'Silencio', 'Ritmo', 'Norte', 'Marea', 'Neón', 'Invierno', 'Rebelde', 'Latido',
+)
+
+# Esquema de las tablas base antes de las migraciones (solo para bases de pruebas vacías)
+TABLAS_BASE = [
+    """
+    CREATE TABLE IF NOT EXISTS imagenes (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        nombre_archivo VARCHAR(255) NOT NULL,
+        ruta_archivo VARCHAR(500) NOT NULL,
+        titulo VARCHAR(255) NULL,
+        descripcion TEXT NULL,
+        fecha_programada DATE NULL,
+        orden_dia INT NOT NULL DEFAULT 1,
+        activa BOOLEAN NOT NULL DEFAULT TRUE,
+        fecha_subida TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS intentos_usuario_album (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        user_id_hash CHAR(32) NOT NULL,
+        fecha_album DATE NOT NULL,
+        numero_album INT NOT NULL,
+        acierto BOOLEAN NOT NULL DEFAULT FALSE,
+        intentos_necesarios INT NOT NULL,
+        veces_jugado INT NOT NULL DEFAULT 1,
+        es_primera_vez BOOLEAN NOT NULL DEFAULT TRUE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        UNIQUE KEY uq_intento_usuario_album (user_id_hash, fecha_album, numero_album)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS estadisticas_album (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        fecha_album DATE NOT NULL,
+        numero_album INT NOT NULL,
+        """ + ',\n        '.join(f'{columna} INT NOT NULL DEFAULT 0' for columna in COLUMNAS_ESTADISTICAS) + """,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    )
+    """,
+]
+
+
+def numero_album(fecha):
+    return max(1, (fecha - FECHA_INICIO).days + 1)
+
+
+def mundo_sintetico(semilla, albumes, jugadores, hoy=None):
+    """Álbumes [(fecha, numero, titulo)] y user_ids que genera una semilla (los mismos en sembrar y carga)"""
+    azar = random.Random(semilla)
+    hoy = hoy or date.today()
+    primera = hoy - timedelta(days=albumes - DIAS_POR_DELANTE - 1)
+    lista = []
+    for i in range(albumes):
+        fecha = primera + timedelta(days=i)
+        titulo = f"{azar.choice(PALABRAS)} {azar.choice(PALABRAS)} {i + 1}"
+        lista.append((fecha, numero_album(fecha), titulo))
+    usuarios = [f"bench_{semilla}_{i}" for i in range(jugadores)]
+    return lista, usuarios
+
+
+def filas_imagenes(albumes):
+    for fecha, _, titulo in albumes:
+        for orden in range(1, Config.ALBUM_IMAGENES + 1):
+            nombre = f"bench_{fecha.isoformat()}_{orden}.jpg"
+            yield (nombre, nombre, titulo, f"Pista {orden} de {titulo}", fecha, orden, True)
+
+
+def partidas(azar, albumes, usuarios, por_jugador, hoy):
+    """Partidas (user_id, fecha, numero, acierto, intentos, veces) con más peso en los álbumes recientes"""
+    jugables = [album for album in albumes if album[0] <= hoy]
+    # Peso decreciente con la antigüedad: el álbum de hoy es el más jugado
+    pesos = [1 / (1 + (hoy - fecha).days) ** 0.7 for fecha, _, _ in jugables]
+    for user_id in usuarios:
+        cantidad = min(max(1, len(jugables) // 2), max(1, int(azar.expovariate(1 / por_jugador))))
+        elegidos = {}
+        while len(elegidos) < cantidad:
+            album = azar.choices(jugables, pesos)[0]
+            elegidos[album[0]] = album
+        for fecha, numero, _ in elegidos.values():
+            acierto = azar.random() < 0.62
+            intentos = min(5, 1 + int(azar.expovariate(0.8))) if acierto else 6
+            veces = 1 + int(azar.expovariate(3))
+            yield user_id, fecha, numero, acierto, intentos, veces
+
+
+def insertar_por_lotes(conexion, sentencia, filas, descripcion):
+    cursor = conexion.cursor()
+    total = 0
+    lote = []
+    try:
+        for fila in filas:
+            lote.append(fila)
+            if len(lote) >= LOTE:
+                cursor.executemany(sentencia, lote)
+                conexion.commit()
+                total += len(lote)
+                lote = []
+        if lote:
+            cursor.executemany(sentencia, lote)
+            conexion.commit()
+            total += len(lote)
+    finally:
+        cursor.close()
+    print(f"  {descripcion}: {total} filas")
+    return total
+
+
+def sembrar(albumes, jugadores, por_jugador, semilla):
+    hoy = date.today()
+    lista_albumes, usuarios = mundo_sintetico(semilla, albumes, jugadores, hoy)
+    azar = random.Random(semilla + 1)
+
+    db = Database()
+    conexion = db.connect()
+    if conexion is None:
+        raise RuntimeError('No hay conexión con la base de datos')
+    cursor = conexion.cursor()
+    try:
+        for sentencia in TABLAS_BASE:
+            cursor.execute(sentencia)
+        aplicar_pendientes()
+        for tabla in ('imagenes', 'intentos_usuario_album', 'estadisticas_album', 'resumen_albumes'):
+            cursor.execute(f"TRUNCATE TABLE {tabla}")
+    finally:
+        cursor.close()
+
+    try:
+        insertar_por_lotes(
+            conexion,
+            """
+            INSERT INTO imagenes (nombre_archivo, ruta_archivo, titulo, descripcion, fecha_programada, orden_dia, activa)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            """,
+            filas_imagenes(lista_albumes), 'imagenes'
+        )
+
+        estadisticas = {}
+
+        def filas_intentos():
+            for user_id, fecha, numero, acierto, intentos, veces in partidas(
+                    azar, lista_albumes, usuarios, por_jugador, hoy):
+                estadisticas.setdefault((fecha, numero), Counter()).update(deltas_estadisticas(acierto, intentos))
+                binario = hash_usuario(user_id)
+                yield binario, binario.hex(), fecha, numero, acierto, intentos, veces
+
+        insertar_por_lotes(
+            conexion,
+            """
+            INSERT INTO intentos_usuario_album (user_id_hash_bin, user_id_hash, fecha_album, numero_album, acierto,
+                                                intentos_necesarios, veces_jugado)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            """,
+            filas_intentos(), 'intentos_usuario_album'
+        )
+
+        columnas = ('fecha_album', 'numero_album') + COLUMNAS_ESTADISTICAS
+        insertar_por_lotes(
+            conexion,
+            f"INSERT INTO estadisticas_album ({', '.join(columnas)}) VALUES ({', '.join(['%s'] * len(columnas))})",
+            (
+                (fecha, numero) + tuple(deltas[columna] for columna in COLUMNAS_ESTADISTICAS)
+                for (fecha, numero), deltas in sorted(estadisticas.items())
+            ),
+            'estadisticas_album'
+        )
+    finally:
+        db.close()
+
+    ImagenModel().actualizar_resumen(fecha for fecha, _, _ in lista_albumes)
+    print(f"  resumen_albumes: {len(lista_albumes)} días")
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--albumes', type=int, default=400, help='días con álbum (incluye una semana por delante)')
+    parser.add_argument('--jugadores', type=int, default=20000)
+    parser.add_argument('--partidas', type=float, default=8, help='álbumes jugados por jugador, de media')
+    parser.add_argument('--semilla', type=int, default=1)
+    parser.add_argument('--forzar', action='store_true', help='sembrar aunque la base no termine en _bench')
+    args = parser.parse_args(argv)
+
+    if not Config.DB_NAME.endswith('_bench') and not args.forzar:
+        print(f"La base '{Config.DB_NAME}' no parece de pruebas (se vacía entera): usa DB_NAME=..._bench o --forzar")
+        return 1
+    if args.albumes <= DIAS_POR_DELANTE:
+        parser.error(f'--albumes tiene que ser mayor que {DIAS_POR_DELANTE}')
+
+    inicio = time.perf_counter()
+    print(f"Sembrando {Config.DB_NAME}: {args.albumes} álbumes, {args.jugadores} jugadores (semilla {args.semilla})")
+    sembrar(args.albumes, args.jugadores, args.partidas, args.semilla)
+    print(f"Listo en {time.perf_counter() - inicio:.1f} s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
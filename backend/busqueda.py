@@ -0,0 +1,221 @@
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+
+_NO_ALFANUMERICO = re.compile(r'[^a-z0-9]+')
+_SOLO_NUMEROS = re.compile(r'^[0-9]+$')
+_EXTENSIONES_IMAGEN = ('.jpg', '.png', '.jpeg', '.gif')
+
+
+def normalizar(texto):
+    """Minúsculas, sin acentos ni signos de puntuación: 'Él, ¿Qué?' -> 'el que'"""
+    if not texto:
+        return ''
+    texto = unicodedata.normalize('NFKD', texto)
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return _NO_ALFANUMERICO.sub(' ', texto.lower()).strip()
+
+
+def trigramas(texto_normalizado):
+    """Trigramas de cada palabra, con relleno para que cuenten los inicios"""
+    resultado = set()
+    for palabra in texto_normalizado.split():
+        palabra = f"  {palabra} "
+        for i in range(len(palabra) - 2):
+            resultado.add(palabra[i:i + 3])
+    return resultado
+
+
+def descripcion_valida(descripcion):
+    """Mismos filtros que /api/todos-titulos-y-descripciones (sin URLs ni nombres de archivo)"""
+    if not descripcion:
+        return False
+    descripcion = descripcion.strip()
+    if len(descripcion) <= 1 or _SOLO_NUMEROS.match(descripcion):
+        return False
+    minusculas = descripcion.lower()
+    return 'http' not in minusculas and not any(ext in minusculas for ext in _EXTENSIONES_IMAGEN)
+
+
+class IndiceTitulos:
+    """Índice en memoria de títulos (y sus descripciones) para el autocompletado.
+
+    Combina un índice de prefijos (lista ordenada de palabras, búsqueda con
+    bisect) con un índice de trigramas para tolerar erratas. Cada título
+    aparece una sola vez aunque lo compartan varias imágenes del álbum.
+
+    Como SnapshotCorpus, con `huella` se reconstruye entero cuando cambia la
+    huella de `imagenes` (comprobada como mucho cada `intervalo_verificacion`
+    segundos): así ve lo que escriben otros workers y deja de ofrecer los
+    títulos desactivados o renombrados. `agregar()` solo adelanta lo de este
+    proceso.
+    """
+
+    def __init__(self, cargar, huella=None, intervalo_verificacion=60):
+        self._cargar = cargar
+        self._huella = huella
+        self._intervalo = intervalo_verificacion
+        self._lock = threading.RLock()
+        # Una sola comprobación de la huella a la vez; mientras, se busca en el índice actual
+        self._verificando = threading.Lock()
+        self._cargado = False
+        self._huella_actual = None
+        self._proxima_verificacion = 0
+        self._reiniciar()
+
+    def _reiniciar(self):
+        self._titulos = []             # id -> título original
+        self._normalizados = []        # id -> título normalizado
+        self._descripciones = []       # id -> set de descripciones normalizadas
+        self._por_clave = {}           # título normalizado -> id
+        self._palabras = []            # lista ordenada de (palabra, id, es_titulo)
+        self._trigramas = {}           # trigrama -> set de ids
+
+    def reconstruir(self):
+        """Recarga el índice completo desde la base de datos"""
+        return self._reconstruir(self._huella() if self._huella else None)
+
+    def _reconstruir(self, huella):
+        # La huella se toma antes de cargar: un cambio a medias se ve en la siguiente comprobación
+        filas = self._cargar()
+        if filas is None:
+            return False
+        with self._lock:
+            self._reiniciar()
+            for fila in filas:
+                self._agregar(fila.get('titulo'), fila.get('descripcion'))
+            self._cargado = True
+            self._huella_actual = huella
+            self._proxima_verificacion = time.monotonic() + self._intervalo
+        return True
+
+    def _verificar(self):
+        """Carga el índice la primera vez y lo reconstruye si cambió la huella"""
+        if self._cargado and (self._huella is None or time.monotonic() < self._proxima_verificacion):
+            return
+        # Ya cargado: si otro hilo está comprobando, no esperar
+        if not self._verificando.acquire(blocking=not self._cargado):
+            return
+        try:
+            if not self._cargado:
+                self.reconstruir()
+                return
+            if time.monotonic() < self._proxima_verificacion:
+                return
+            huella = self._huella()
+            if huella is None or huella != self._huella_actual:
+                self._reconstruir(huella)
+            # Aunque falle la recarga: no reintentar en cada búsqueda
+            self._proxima_verificacion = time.monotonic() + self._intervalo
+        finally:
+            self._verificando.release()
+
+    def agregar(self, titulo, descripcion=None):
+        """Añade un título nuevo (p. ej. al subir una imagen) sin reconstruir"""
+        with self._lock:
+            if self._cargado:
+                self._agregar(titulo, descripcion)
+
+    def _agregar(self, titulo, descripcion):
+        if not titulo or len(titulo.strip()) <= 1:
+            return
+        titulo = titulo.strip()
+        clave = normalizar(titulo)
+        if not clave:
+            return
+
+        id_titulo = self._por_clave.get(clave)
+        if id_titulo is None:
+            id_titulo = len(self._titulos)
+            self._por_clave[clave] = id_titulo
+            self._titulos.append(titulo)
+            self._normalizados.append(clave)
+            self._descripciones.append(set())
+            self._indexar(clave, id_titulo, True)
+
+        if descripcion_valida(descripcion):
+            descripcion = normalizar(descripcion)
+            if descripcion and descripcion not in self._descripciones[id_titulo]:
+                self._descripciones[id_titulo].add(descripcion)
+                self._indexar(descripcion, id_titulo, False)
+
+    def _indexar(self, texto, id_titulo, es_titulo):
+        for palabra in set(texto.split()):
+            insort(self._palabras, (palabra, id_titulo, es_titulo))
+        for trigrama in trigramas(texto):
+            self._trigramas.setdefault(trigrama, set()).add(id_titulo)
+
+    def _por_prefijo(self, prefijo):
+        """Ids cuyo título o descripción tiene alguna palabra que empieza por prefijo"""
+        encontrados = {}
+        i = bisect_left(self._palabras, (prefijo,))
+        while i < len(self._palabras) and self._palabras[i][0].startswith(prefijo):
+            _, id_titulo, es_titulo = self._palabras[i]
+            encontrados[id_titulo] = encontrados.get(id_titulo, False) or es_titulo
+            i += 1
+        return encontrados
+
+    def buscar(self, texto, limite=10):
+        """Devuelve hasta `limite` títulos ordenados por relevancia"""
+        self._verificar()
+
+        consulta = normalizar(texto)
+        if not consulta:
+            return []
+        palabras = consulta.split()
+
+        with self._lock:
+            # Candidatos: todas las palabras de la consulta deben casar por prefijo...
+            candidatos = None
+            for palabra in palabras:
+                ids = set(self._por_prefijo(palabra))
+                candidatos = ids if candidatos is None else candidatos & ids
+
+            # ...o, para tolerar erratas, compartir trigramas con la consulta
+            trigramas_consulta = trigramas(consulta)
+            coincidencias = {}
+            for trigrama in trigramas_consulta:
+                for id_titulo in self._trigramas.get(trigrama, ()):
+                    coincidencias[id_titulo] = coincidencias.get(id_titulo, 0) + 1
+
+            puntuados = []
+            for id_titulo in candidatos | set(coincidencias):
+                puntuacion, coincide_en = self._puntuar(
+                    id_titulo, consulta, palabras, id_titulo in candidatos,
+                    coincidencias.get(id_titulo, 0) / max(len(trigramas_consulta), 1)
+                )
+                if puntuacion > 0:
+                    puntuados.append((-puntuacion, len(self._titulos[id_titulo]),
+                                      self._normalizados[id_titulo], id_titulo, coincide_en))
+
+            puntuados.sort()
+            return [
+                {'titulo': self._titulos[id_titulo], 'coincide_en': coincide_en}
+                for _, _, _, id_titulo, coincide_en in puntuados[:limite]
+            ]
+
+    def _puntuar(self, id_titulo, consulta, palabras, por_prefijo, similitud):
+        titulo = self._normalizados[id_titulo]
+        descripciones = self._descripciones[id_titulo]
+
+        if titulo == consulta:
+            return 100, 'titulo'
+        if titulo.startswith(consulta):
+            return 90, 'titulo'
+        if any(d.startswith(consulta) for d in descripciones):
+            return 80, 'descripcion'
+        if por_prefijo:
+            palabras_titulo = titulo.split()
+            if all(any(p.startswith(palabra) for p in palabras_titulo) for palabra in palabras):
+                return 70, 'titulo'
+            return 60, 'descripcion'
+        if consulta in titulo:
+            return 50, 'titulo'
+        if any(consulta in d for d in descripciones):
+            return 45, 'descripcion'
+        # Coincidencia aproximada: solo si comparte buena parte de los trigramas
+        if len(consulta) >= 3 and similitud >= 0.5:
+            return 40 * similitud, 'titulo'
+        return 0, None
@@ -0,0 +1,99 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+
+
+def segundos_hasta_medianoche(ahora=None):
+    """Segundos que faltan para el cambio de día (hora local)"""
+    ahora = ahora or datetime.now()
+    medianoche = datetime.combine(ahora.date() + timedelta(days=1), datetime.min.time())
+    return max(1, int((medianoche - ahora).total_seconds()))
+
+
+def calcular_etag(datos):
+    """ETag fuerte a partir del contenido serializado"""
+    contenido = json.dumps(datos, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha1(contenido.encode('utf-8')).hexdigest()
+
+
+class CacheAlbumes:
+    """Caché en memoria de los álbumes, con la fecha (YYYY-MM-DD) como clave.
+
+    Como la clave es la fecha, el álbum del día cambia solo a medianoche:
+    al día siguiente se pide otra clave. Las entradas caducan a los `ttl`
+    segundos para acotar lo desactualizado que puede quedar un worker que
+    no recibió la invalidación (cada proceso tiene su propia caché).
+    """
+
+    def __init__(self, cargar, ttl=300, max_entradas=64):
+        self._cargar = cargar
+        self._ttl = ttl
+        self._max_entradas = max_entradas
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        self._generacion = 0
+        self.aciertos = 0
+        self.fallos = 0
+
+    @staticmethod
+    def clave(fecha):
+        return fecha.isoformat() if isinstance(fecha, date) else str(fecha)
+
+    def obtener(self, fecha):
+        """Devuelve {'imagenes', 'etag'} para la fecha, cargándola si hace falta"""
+        clave = self.clave(fecha)
+        entrada, generacion = self.consultar(clave)
+        if entrada is not None:
+            return entrada
+
+        imagenes = self._cargar(clave)
+        if imagenes is None:
+            # Error de base de datos: no se guarda en caché
+            return None
+        return self.guardar(clave, imagenes, generacion)
+
+    def consultar(self, fecha):
+        """(entrada vigente o None, generación) sin cargar nada.
+
+        Para quien carga el álbum por su cuenta (p. ej. con un driver
+        asíncrono) y luego lo entrega con guardar() y esta generación.
+        """
+        clave = self.clave(fecha)
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada and entrada['caduca'] > time.monotonic():
+                self._entradas.move_to_end(clave)
+                self.aciertos += 1
+                return entrada, self._generacion
+            self.fallos += 1
+            return None, self._generacion
+
+    def guardar(self, fecha, imagenes, generacion):
+        """Guarda el álbum cargado y devuelve su entrada"""
+        clave = self.clave(fecha)
+        entrada = {
+            'imagenes': imagenes,
+            'etag': calcular_etag(imagenes),
+            'caduca': time.monotonic() + self._ttl,
+        }
+        with self._lock:
+            # Si se invalidó mientras se cargaba, no guardar datos viejos
+            if generacion != self._generacion:
+                return entrada
+            self._entradas[clave] = entrada
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self._max_entradas:
+                self._entradas.popitem(last=False)
+        return entrada
+
+    def invalidar(self, fecha=None):
+        """Invalida una fecha concreta o, sin argumentos, toda la caché"""
+        with self._lock:
+            self._generacion += 1
+            if fecha is None:
+                self._entradas.clear()
+            else:
+                self._entradas.pop(self.clave(fecha), None)
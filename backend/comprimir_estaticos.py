@@ -0,0 +1,52 @@
+"""Genera los hermanos .gz (y .br si está instalado brotli) de los estáticos de texto.
+
+Uso: python comprimir_estaticos.py [carpeta ...]   (por defecto ../frontend)
+
+Hay que volver a lanzarlo después de editar CSS/JS/HTML; mientras tanto el
+servidor ignora los precomprimidos más antiguos que su original.
+"""
+import gzip
+import os
+import sys
+from estaticos import EXTENSIONES_TEXTO
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def comprimir_carpeta(carpeta):
+    total_original = total_gzip = archivos = 0
+    for raiz, _, nombres in os.walk(carpeta):
+        for nombre in nombres:
+            if os.path.splitext(nombre)[1].lower() not in EXTENSIONES_TEXTO:
+                continue
+            ruta = os.path.join(raiz, nombre)
+            with open(ruta, 'rb') as f:
+                contenido = f.read()
+
+            comprimido = gzip.compress(contenido, compresslevel=9, mtime=0)
+            with open(ruta + '.gz', 'wb') as f:
+                f.write(comprimido)
+            if brotli:
+                with open(ruta + '.br', 'wb') as f:
+                    f.write(brotli.compress(contenido, quality=11))
+
+            archivos += 1
+            total_original += len(contenido)
+            total_gzip += len(comprimido)
+    return archivos, total_original, total_gzip
+
+
+def main(argv):
+    carpetas = argv or [os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'frontend')]
+    for carpeta in carpetas:
+        archivos, original, comprimido = comprimir_carpeta(carpeta)
+        print(f"{carpeta}: {archivos} archivos, {original / 1024:.0f} KB -> {comprimido / 1024:.0f} KB gzip"
+              + ("" if brotli else " (brotli no instalado: solo .gz)"))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -10,6 +10,16 @@ class Config:
     DB_PASSWORD = os.getenv('DB_PASSWORD', '')
     DB_NAME = os.getenv('DB_NAME', 'galeria_diaria')
     DB_PORT = os.getenv('DB_PORT', '3306')
+
+    # Pool de conexiones (mysql-connector admite como máximo 32)
+    DB_POOL_NAME = os.getenv('DB_POOL_NAME', 'muzikdle')
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '5'))  # segundos esperando conexión libre
+    DB_POOL_PING = os.getenv('DB_POOL_PING', 'true').lower() == 'true'
+    # Pool asíncrono del servidor ASGI (asgi.py), por proceso
+    DB_POOL_ASYNC_MIN = int(os.getenv('DB_POOL_ASYNC_MIN', '2'))
+    DB_POOL_ASYNC_MAX = int(os.getenv('DB_POOL_ASYNC_MAX', '20'))
+    DB_POOL_ASYNC_RECICLAR = int(os.getenv('DB_POOL_ASYNC_RECICLAR', '3600'))  # segundos
     
     # Configuración de la aplicación
     SECRET_KEY = os.getenv('SECRET_KEY', 'clave_secreta_para_desarrollo')
@@ -18,4 +28,90 @@ class Config:
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max
     
     # URL base para acceder a las imágenes
-    BASE_URL = os.getenv('BASE_URL', 'http://localhost:5000')
\ No newline at end of file
+    BASE_URL = os.getenv('BASE_URL', 'http://localhost:5000')
+
+    # Caché de álbumes por fecha
+    CACHE_ALBUM_TTL = int(os.getenv('CACHE_ALBUM_TTL', '300'))  # segundos en memoria
+    CACHE_ALBUM_MAX_ENTRADAS = int(os.getenv('CACHE_ALBUM_MAX_ENTRADAS', '64'))
+    CACHE_ALBUM_MAX_AGE = int(os.getenv('CACHE_ALBUM_MAX_AGE', '60'))  # Cache-Control para navegador/CDN
+
+    # Historial (/api/historial-completo): álbumes por página por defecto y máximo
+    HISTORIAL_LIMITE = int(os.getenv('HISTORIAL_LIMITE', '120'))
+    HISTORIAL_LIMITE_MAX = int(os.getenv('HISTORIAL_LIMITE_MAX', '500'))
+    # /api/bootstrap: hilos para pedir sus partes a la vez y espera máxima por parte (segundos)
+    BOOTSTRAP_HILOS = int(os.getenv('BOOTSTRAP_HILOS', '8'))
+    BOOTSTRAP_TIMEOUT = float(os.getenv('BOOTSTRAP_TIMEOUT', '5'))
+    # Días como mucho por petición a /api/mis-intentos
+    MIS_INTENTOS_MAX_DIAS = int(os.getenv('MIS_INTENTOS_MAX_DIAS', '366'))
+
+    # Si hoy no hay álbum, servir uno pasado elegido al azar (el mismo para todos ese día)
+    ALBUM_RESPALDO = os.getenv('ALBUM_RESPALDO', 'true').lower() == 'true'
+    # Caché corta para el respaldo: en cuanto se programe el álbum de hoy tiene que verse
+    ALBUM_RESPALDO_MAX_AGE = int(os.getenv('ALBUM_RESPALDO_MAX_AGE', '60'))
+    # Día del álbum número 1 (el mismo que FECHA_INICIO en script.js e historial.js)
+    FECHA_INICIO = os.getenv('FECHA_INICIO', '2026-01-26')
+    ALBUM_IMAGENES = int(os.getenv('ALBUM_IMAGENES', '6'))  # imágenes de un álbum completo
+    ALBUMES_ALEATORIOS_RECARGA = int(os.getenv('ALBUMES_ALEATORIOS_RECARGA', '300'))  # segundos
+
+    # Programación masiva (/api/programar-imagenes) y automática (planificador.py)
+    PROGRAMACION_LOTE = int(os.getenv('PROGRAMACION_LOTE', '500'))  # imágenes por UPDATE
+    PROGRAMACION_MAX = int(os.getenv('PROGRAMACION_MAX', '5000'))  # imágenes por petición
+    # Días por delante que cada noche se rellenan con álbumes sin programar (0 = desactivado)
+    PLANIFICADOR_DIAS = int(os.getenv('PLANIFICADOR_DIAS', '0'))
+    PLANIFICADOR_CALENTAR = int(os.getenv('PLANIFICADOR_CALENTAR', '7'))  # de esos, cuántos se precargan
+
+    # Cada cuánto se comprueba si cambió `imagenes` para regenerar el corpus de títulos y el índice de búsqueda
+    CORPUS_VERIFICACION_SEGUNDOS = int(os.getenv('CORPUS_VERIFICACION_SEGUNDOS', '60'))
+
+    # Registro write-behind de partidas (registrar-intento-album)
+    INTENTOS_WRITE_BEHIND = os.getenv('INTENTOS_WRITE_BEHIND', 'true').lower() == 'true'
+    INTENTOS_COLA_MAX = int(os.getenv('INTENTOS_COLA_MAX', '10000'))
+    INTENTOS_LOTE_MAX = int(os.getenv('INTENTOS_LOTE_MAX', '500'))
+    INTENTOS_INTERVALO_ESCRITURA = float(os.getenv('INTENTOS_INTERVALO_ESCRITURA', '0.5'))  # segundos
+
+    # Contadores de estadísticas en memoria
+    ESTADISTICAS_MAX_ALBUMES = int(os.getenv('ESTADISTICAS_MAX_ALBUMES', '64'))
+    ESTADISTICAS_RECONCILIACION_SEGUNDOS = int(os.getenv('ESTADISTICAS_RECONCILIACION_SEGUNDOS', '10'))
+
+    # Variantes optimizadas que se generan al subir cada imagen
+    VARIANTES_ANCHOS = [int(a) for a in os.getenv('VARIANTES_ANCHOS', '320,640,1080').split(',')]
+    VARIANTES_AVIF = os.getenv('VARIANTES_AVIF', 'false').lower() == 'true'
+    VARIANTES_CALIDAD = int(os.getenv('VARIANTES_CALIDAD', '80'))
+
+    # Cache-Control de los estáticos (0 = revalidar siempre)
+    CACHE_HTML_MAX_AGE = int(os.getenv('CACHE_HTML_MAX_AGE', '0'))
+    CACHE_CSS_JS_MAX_AGE = int(os.getenv('CACHE_CSS_JS_MAX_AGE', '3600'))
+    CACHE_UPLOADS_MAX_AGE = int(os.getenv('CACHE_UPLOADS_MAX_AGE', '86400'))  # nombres antiguos (sin hash)
+    # Delegar el envío de archivos en nginx/Apache (X-Sendfile)
+    USE_X_SENDFILE = os.getenv('USE_X_SENDFILE', 'false').lower() == 'true'
+
+    # Logging estructurado (logs.py): nivel, formato (json/texto) y fracción de
+    # mensajes por debajo de WARNING que se conservan
+    LOG_NIVEL = os.getenv('LOG_NIVEL', 'INFO')
+    LOG_FORMATO = os.getenv('LOG_FORMATO', 'json')
+    LOG_MUESTREO = float(os.getenv('LOG_MUESTREO', '1'))
+
+    # Perfilador de consultas (perfilador.py, GET /api/debug/perfil)
+    PERFILADOR_ACTIVO = os.getenv('PERFILADOR_ACTIVO', 'false').lower() == 'true'
+    PERFILADOR_TOKEN = os.getenv('PERFILADOR_TOKEN', '')  # sin token, el informe no se publica
+    PERFILADOR_LENTAS = int(os.getenv('PERFILADOR_LENTAS', '20'))  # ejecuciones lentas que se guardan
+    PERFILADOR_UMBRAL_LENTA_MS = float(os.getenv('PERFILADOR_UMBRAL_LENTA_MS', '100'))
+    PERFILADOR_UMBRAL_N_MAS_1 = int(os.getenv('PERFILADOR_UMBRAL_N_MAS_1', '5'))  # repeticiones en una petición
+    PERFILADOR_EXPLAIN = os.getenv('PERFILADOR_EXPLAIN', 'false').lower() == 'true'
+    PERFILADOR_UMBRAL_EXPLAIN_MS = float(os.getenv('PERFILADOR_UMBRAL_EXPLAIN_MS', '250'))
+
+    # Atributo sizes del <img> del juego (debe coincidir con IMAGEN_SIZES en script.js)
+    IMAGEN_SIZES = os.getenv('IMAGEN_SIZES', '(max-width: 800px) 100vw, 740px')
+
+    # Servidor de producción (servidor.py, gunicorn)
+    SERVIDOR_BIND = os.getenv('SERVIDOR_BIND', '0.0.0.0:5000')
+    SERVIDOR_WORKERS = int(os.getenv('SERVIDOR_WORKERS', str(2 * (os.cpu_count() or 1) + 1)))
+    SERVIDOR_THREADS = int(os.getenv('SERVIDOR_THREADS', '4'))  # hilos por worker (gthread)
+    SERVIDOR_TIMEOUT = int(os.getenv('SERVIDOR_TIMEOUT', '30'))
+    # Segundos antes de medianoche en que cada worker carga el álbum de mañana
+    # (menos que CACHE_ALBUM_TTL para que siga en caché al cambiar el día)
+    PRECALENTAR_ANTES_MEDIANOCHE = int(os.getenv('PRECALENTAR_ANTES_MEDIANOCHE', '120'))
+
+    # Importación masiva de álbumes (ZIP/TAR)
+    IMPORTACION_MAX_BYTES = int(os.getenv('IMPORTACION_MAX_BYTES', str(1024 * 1024 * 1024)))  # archivo subido
+    IMPORTACION_MAX_BYTES_IMAGEN = int(os.getenv('IMPORTACION_MAX_BYTES_IMAGEN', str(16 * 1024 * 1024)))
\ No newline at end of file
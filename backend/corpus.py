@@ -0,0 +1,82 @@
+import gzip
+import hashlib
+import json
+import threading
+import time
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional: sin él solo se sirve gzip
+    brotli = None
+
+
+class SnapshotCorpus:
+    """Instantánea versionada del corpus de títulos y descripciones.
+
+    Guarda el JSON ya serializado y sus versiones gzip/brotli, de modo que
+    servirlo no cuesta ni consultas ni serialización. La versión es un hash
+    del contenido y se usa como ETag. Solo se regenera cuando cambia la tabla
+    `imagenes`: al invalidarla tras una escritura en este proceso, o cuando la
+    huella (número de imágenes activas, último id y suma de control de títulos
+    y descripciones) deja de coincidir, lo que se comprueba como mucho cada
+    `intervalo_verificacion` segundos.
+    """
+
+    def __init__(self, cargar, huella, intervalo_verificacion=60):
+        self._cargar = cargar
+        self._huella = huella
+        self._intervalo = intervalo_verificacion
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._huella_actual = None
+        self._proxima_verificacion = 0
+
+    def obtener(self):
+        """Devuelve el snapshot vigente ({'version', 'json', 'gzip', 'br'})"""
+        ahora = time.monotonic()
+        snapshot = self._snapshot
+        if snapshot is not None and ahora < self._proxima_verificacion:
+            return snapshot
+
+        with self._lock:
+            if self._snapshot is not None and ahora < self._proxima_verificacion:
+                return self._snapshot
+
+            huella = self._huella()
+            if self._snapshot is None or huella is None or huella != self._huella_actual:
+                nuevo = self._generar()
+                if nuevo is not None:
+                    self._snapshot = nuevo
+                    self._huella_actual = huella
+            if self._snapshot is not None:
+                self._proxima_verificacion = ahora + self._intervalo
+            return self._snapshot
+
+    def invalidar(self):
+        """Fuerza a comprobar la huella en la próxima petición"""
+        self._proxima_verificacion = 0
+
+    @property
+    def version(self):
+        snapshot = self.obtener()
+        return snapshot['version'] if snapshot else None
+
+    def _generar(self):
+        datos = self._cargar()
+        if datos is None:
+            return None
+
+        contenido = json.dumps(datos, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+        version = hashlib.sha256(contenido.encode('utf-8')).hexdigest()[:16]
+
+        cuerpo = json.dumps(
+            dict(datos, success=True, version=version),
+            ensure_ascii=False, separators=(',', ':')
+        ).encode('utf-8')
+
+        return {
+            'version': version,
+            'json': cuerpo,
+            'gzip': gzip.compress(cuerpo, compresslevel=9, mtime=0),
+            'br': brotli.compress(cuerpo, quality=11) if brotli else None,
+        }
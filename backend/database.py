@@ -1,49 +1,323 @@
-import mysql.connector
-from mysql.connector import Error
+import logging
+import threading
+import time
+from mysql.connector import Error, pooling
+from flask import g, has_app_context
 from config import Config
 
+log = logging.getLogger(__name__)
+
+# Pool compartido por todo el proceso (se crea en la primera petición)
+_pool = None
+_pool_lock = threading.Lock()
+
+# Métricas del pool: checkouts, esperas y agotamientos
+_metricas_pool = {
+    'checkouts': 0,
+    'en_uso': 0,
+    'max_en_uso': 0,
+    'agotamientos': 0,
+    'timeouts': 0,
+    'reconexiones': 0,
+    'espera_total_ms': 0.0,
+}
+_metricas_lock = threading.Lock()
+
+# Funciones f(sentencia, segundos, params, filas) a las que se avisa de cada sentencia ejecutada
+_observadores_consulta = []
+
+
+def _config_conexion():
+    return {
+        'host': Config.DB_HOST,
+        'database': Config.DB_NAME,
+        'user': Config.DB_USER,
+        'password': Config.DB_PASSWORD,
+        'port': Config.DB_PORT
+    }
+
+
+def get_pool():
+    """Devuelve el pool de conexiones del proceso, creándolo si no existe"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = pooling.MySQLConnectionPool(
+                    pool_name=Config.DB_POOL_NAME,
+                    pool_size=Config.DB_POOL_SIZE,
+                    pool_reset_session=True,
+                    **_config_conexion()
+                )
+    return _pool
+
+
+def reiniciar_pool():
+    """Descarta el pool actual (p. ej. tras un fork) para que se cree de nuevo"""
+    global _pool
+    with _pool_lock:
+        _pool = None
+
+
+def cerrar_pool():
+    """Cierra las conexiones libres del pool y lo descarta.
+
+    Para el proceso maestro de gunicorn antes de hacer fork: así los
+    workers no heredan sockets abiertos con MySQL. Solo usa la API pública
+    del pool: saca conexiones hasta que se agota (PoolError) y desconecta
+    cada una sin devolverla (close() la volvería a poner en la cola).
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            while True:
+                try:
+                    conexion = _pool.get_connection()
+                except Error:
+                    # PoolError: no quedan libres (o una no pudo reconectar: el pool se descarta igual)
+                    break
+                try:
+                    conexion.disconnect()
+                except Error:
+                    pass
+        _pool = None
+
+
+def observar_consultas(funcion):
+    """Registra un observador de sentencias (metricas.py, perfilador.py)"""
+    if funcion not in _observadores_consulta:
+        _observadores_consulta.append(funcion)
+
+
+def notificar_consulta(sentencia, segundos, params=None, filas=None):
+    """Avisa a los observadores; `filas` es None si no se conoce (p. ej. si falló)"""
+    for observador in _observadores_consulta:
+        try:
+            observador(sentencia, segundos, params, filas)
+        except Exception:
+            # Un observador roto no debe tumbar la consulta
+            log.exception("Error en un observador de consultas")
+
+
+class CursorMedido:
+    """Cursor que mide cada sentencia y avisa a los observadores.
+
+    El aviso se da al leer el resultado (fetchall/fetchone), con el tiempo
+    de ejecución más el de lectura y el número de filas, o al ejecutar la
+    siguiente sentencia o cerrar el cursor si no se lee nada (INSERT,
+    UPDATE...), con las filas afectadas.
+    """
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._pendiente = None  # [sentencia, params, segundos]
+
+    def _ejecutar(self, metodo, sentencia, params, args, kwargs):
+        self._avisar()
+        inicio = time.perf_counter()
+        try:
+            resultado = metodo(sentencia, params, *args, **kwargs)
+        except Exception:
+            notificar_consulta(sentencia, time.perf_counter() - inicio, params)
+            raise
+        self._pendiente = [sentencia, params, time.perf_counter() - inicio]
+        return resultado
+
+    def _avisar(self, filas=None, segundos_lectura=0.0):
+        pendiente, self._pendiente = self._pendiente, None
+        if pendiente is not None:
+            if filas is None and self._cursor.rowcount >= 0:
+                filas = self._cursor.rowcount
+            notificar_consulta(pendiente[0], pendiente[2] + segundos_lectura, pendiente[1], filas)
+
+    def execute(self, sentencia, params=(), *args, **kwargs):
+        return self._ejecutar(self._cursor.execute, sentencia, params, args, kwargs)
+
+    def executemany(self, sentencia, params, *args, **kwargs):
+        return self._ejecutar(self._cursor.executemany, sentencia, params, args, kwargs)
+
+    def fetchall(self):
+        inicio = time.perf_counter()
+        filas = self._cursor.fetchall()
+        self._avisar(len(filas), time.perf_counter() - inicio)
+        return filas
+
+    def fetchone(self):
+        inicio = time.perf_counter()
+        fila = self._cursor.fetchone()
+        self._avisar(0 if fila is None else 1, time.perf_counter() - inicio)
+        return fila
+
+    def close(self):
+        self._avisar()
+        return self._cursor.close()
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __getattr__(self, nombre):
+        return getattr(self._cursor, nombre)
+
+
+class ConexionMedida:
+    """Conexión del pool cuyos cursores están medidos (ver observar_consultas)"""
+
+    def __init__(self, conexion):
+        self._conexion = conexion
+
+    def cursor(self, *args, **kwargs):
+        return CursorMedido(self._conexion.cursor(*args, **kwargs))
+
+    def __getattr__(self, nombre):
+        return getattr(self._conexion, nombre)
+
+
+def _sumar_metrica(nombre, valor=1):
+    with _metricas_lock:
+        _metricas_pool[nombre] += valor
+
+
+def obtener_conexion():
+    """Saca una conexión del pool esperando hasta DB_POOL_TIMEOUT si está agotado"""
+    pool = get_pool()
+    inicio = time.monotonic()
+    limite = inicio + Config.DB_POOL_TIMEOUT
+    agotado = False
+
+    while True:
+        try:
+            conexion = pool.get_connection()
+            break
+        except pooling.PoolError:
+            if not agotado:
+                agotado = True
+                _sumar_metrica('agotamientos')
+                log.warning("Pool de conexiones agotado, esperando", extra={'tamano': Config.DB_POOL_SIZE})
+            if time.monotonic() >= limite:
+                _sumar_metrica('timeouts')
+                raise
+            time.sleep(0.01)
+
+    espera_ms = (time.monotonic() - inicio) * 1000
+    with _metricas_lock:
+        _metricas_pool['checkouts'] += 1
+        _metricas_pool['en_uso'] += 1
+        _metricas_pool['max_en_uso'] = max(_metricas_pool['max_en_uso'], _metricas_pool['en_uso'])
+        _metricas_pool['espera_total_ms'] += espera_ms
+
+    # Health check: reconectar si MySQL cerró la conexión mientras estaba ociosa
+    if Config.DB_POOL_PING:
+        try:
+            conexion.ping(reconnect=False)
+        except Error:
+            _sumar_metrica('reconexiones')
+            try:
+                conexion.ping(reconnect=True, attempts=2, delay=0)
+            except Error:
+                # Devolverla siempre: si no, el pool pierde el hueco para siempre
+                try:
+                    devolver_conexion(conexion)
+                except Error:
+                    pass  # reset_session falla con la conexión caída, pero ya está de vuelta en el pool
+                raise
+
+    # Sin observadores no se añade ningún envoltorio
+    return ConexionMedida(conexion) if _observadores_consulta else conexion
+
+
+def devolver_conexion(conexion):
+    """Devuelve una conexión al pool"""
+    try:
+        conexion.close()
+    finally:
+        _sumar_metrica('en_uso', -1)
+
+
+def conexion_de_peticion():
+    """Conexión compartida por todo el código que se ejecuta dentro de una petición"""
+    if '_db_conexion' not in g:
+        g._db_conexion = obtener_conexion()
+    return g._db_conexion
+
+
+def liberar_conexion_de_peticion(exception=None):
+    """Se registra como teardown de Flask: devuelve al pool la conexión de la petición"""
+    conexion = g.pop('_db_conexion', None)
+    if conexion is None:
+        return
+    try:
+        if exception is not None:
+            conexion.rollback()
+    except Error:
+        pass
+    devolver_conexion(conexion)
+
+
+def estadisticas_pool():
+    """Copia de las métricas del pool para diagnóstico"""
+    with _metricas_lock:
+        metricas = dict(_metricas_pool)
+    metricas['tamano'] = Config.DB_POOL_SIZE
+    metricas['espera_media_ms'] = round(
+        metricas['espera_total_ms'] / metricas['checkouts'], 3
+    ) if metricas['checkouts'] else 0
+    metricas['espera_total_ms'] = round(metricas['espera_total_ms'], 3)
+    return metricas
+
+
 class Database:
     def __init__(self):
-        self.config = {
-            'host': Config.DB_HOST,
-            'database': Config.DB_NAME,
-            'user': Config.DB_USER,
-            'password': Config.DB_PASSWORD,
-            'port': Config.DB_PORT
-        }
+        self.config = _config_conexion()
         self.connection = None
-    
+        self._de_peticion = False
+
     def connect(self):
         try:
-            self.connection = mysql.connector.connect(**self.config)
+            # Dentro de una petición todos comparten la misma conexión del pool
+            if has_app_context():
+                self.connection = conexion_de_peticion()
+                self._de_peticion = True
+            else:
+                self.connection = obtener_conexion()
+                self._de_peticion = False
             return self.connection
         except Error as e:
-            print(f"Error conectando a MySQL: {e}")
+            log.error("Error conectando a MySQL: %s", e)
             return None
-    
+
     def close(self):
-        if self.connection and self.connection.is_connected():
-            self.connection.close()
-    
+        # La conexión de la petición se devuelve al pool en el teardown
+        if self.connection and not self._de_peticion:
+            devolver_conexion(self.connection)
+        self.connection = None
+
     def execute_query(self, query, params=None, fetch=False):
-        connection = self.connect()
+        # No se usa self.connection: los modelos comparten esta instancia entre hilos
+        db = Database()
+        connection = db.connect()
         cursor = None
         try:
             if connection:
                 cursor = connection.cursor(dictionary=True)
                 cursor.execute(query, params or ())
-                
+
                 if fetch:
                     result = cursor.fetchall()
                 else:
                     connection.commit()
                     result = cursor.lastrowid
-                
+
                 return result
         except Error as e:
-            print(f"Error ejecutando query: {e}")
+            log.error("Error ejecutando query: %s", e)
             return None
         finally:
             if cursor:
                 cursor.close()
-            self.close()
\ No newline at end of file
+            db.close()
@@ -0,0 +1,74 @@
+"""Pool de conexiones MySQL asíncrono (aiomysql) para el servidor ASGI.
+
+Es el equivalente de database.py para asgi.py: mientras MySQL responde, el
+bucle de eventos sigue atendiendo otras peticiones en lugar de bloquear un
+hilo por consulta. Solo se importa desde asgi.py (dependencias opcionales
+en requirements-asgi.txt).
+"""
+import logging
+import time
+import aiomysql
+from config import Config
+from database import notificar_consulta
+
+log = logging.getLogger(__name__)
+
+_pool = None
+
+
+async def abrir_pool():
+    """Crea el pool (debe llamarse dentro del bucle de eventos, p. ej. en el arranque)"""
+    global _pool
+    if _pool is None:
+        _pool = await aiomysql.create_pool(
+            host=Config.DB_HOST,
+            user=Config.DB_USER,
+            password=Config.DB_PASSWORD,
+            db=Config.DB_NAME,
+            port=int(Config.DB_PORT),
+            minsize=Config.DB_POOL_ASYNC_MIN,
+            maxsize=Config.DB_POOL_ASYNC_MAX,
+            pool_recycle=Config.DB_POOL_ASYNC_RECICLAR,
+            autocommit=True,
+            charset='utf8mb4'
+        )
+    return _pool
+
+
+async def cerrar_pool():
+    global _pool
+    if _pool is not None:
+        _pool.close()
+        await _pool.wait_closed()
+        _pool = None
+
+
+def estadisticas_pool_async():
+    """Conexiones del pool asíncrono (para diagnóstico)"""
+    if _pool is None:
+        return {'abierto': False}
+    return {
+        'abierto': True,
+        'tamano': _pool.size,
+        'libres': _pool.freesize,
+        'maximo': _pool.maxsize,
+    }
+
+
+async def consultar(query, params=None):
+    """Ejecuta un SELECT y devuelve las filas como dicts (None si falla, como execute_query)"""
+    pool = await abrir_pool()
+    try:
+        async with pool.acquire() as conexion:
+            async with conexion.cursor(aiomysql.DictCursor) as cursor:
+                inicio = time.perf_counter()
+                filas = None
+                try:
+                    await cursor.execute(query, params or ())
+                    filas = await cursor.fetchall()
+                finally:
+                    notificar_consulta(query, time.perf_counter() - inicio, params, None if filas is None else len(filas))
+                return filas
+    except aiomysql.Error as e:
+        log.error("Error ejecutando query asíncrona: %s", e)
+        return None
@@ -0,0 +1,53 @@
+import time
+from collections import OrderedDict
+
+
+class EstadisticasEnVivo:
+    """Contadores en memoria de los álbumes más consultados (LRU).
+
+    Cada entrada guarda las columnas de estadisticas_album de un álbum y el
+    momento en que se reconcilió con MySQL. Las partidas de este proceso se
+    suman al instante; las de otros procesos aparecen en la siguiente
+    reconciliación, como mucho `intervalo` segundos después.
+
+    No es thread-safe por sí sola: quien la usa debe tener su propio lock
+    (RegistroIntentos la protege con el mismo lock que las partidas
+    pendientes, para que ambas cosas cambien a la vez).
+    """
+
+    def __init__(self, max_albumes=64, intervalo=10):
+        self._max_albumes = max_albumes
+        self._intervalo = intervalo
+        self._albumes = OrderedDict()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def obtener(self, album):
+        """Copia de los contadores, o None si no está o toca reconciliar"""
+        entrada = self._albumes.get(album)
+        if entrada is None or time.monotonic() - entrada['reconciliado'] > self._intervalo:
+            self.fallos += 1
+            return None
+        self._albumes.move_to_end(album)
+        self.aciertos += 1
+        return dict(entrada['contadores'])
+
+    def guardar(self, album, contadores):
+        self._albumes[album] = {
+            'contadores': dict(contadores),
+            'reconciliado': time.monotonic(),
+        }
+        self._albumes.move_to_end(album)
+        while len(self._albumes) > self._max_albumes:
+            self._albumes.popitem(last=False)
+
+    def sumar(self, album, deltas):
+        """Aplica los incrementos de una partida si el álbum está en memoria"""
+        entrada = self._albumes.get(album)
+        if entrada is not None:
+            contadores = entrada['contadores']
+            for columna, valor in deltas.items():
+                contadores[columna] = contadores.get(columna, 0) + valor
+
+    def __len__(self):
+        return len(self._albumes)
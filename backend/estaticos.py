@@ -0,0 +1,101 @@
+import mimetypes
+import os
+import stat
+from flask import abort, current_app, request, send_file
+from werkzeug.security import safe_join
+
+# Tipos que merece la pena comprimir (las imágenes ya van comprimidas)
+EXTENSIONES_TEXTO = {'.css', '.js', '.html', '.htm', '.svg', '.json', '.xml', '.txt', '.map'}
+
+# Sufijo del archivo precomprimido, por orden de preferencia
+PRECOMPRIMIDOS = (('br', '.br'), ('gzip', '.gz'))
+
+
+# (ruta, mtime del original) -> {codificación: ruta del precomprimido}
+_hermanos = {}
+
+
+def _hermanos_precomprimidos(ruta, mtime_original):
+    clave = (ruta, mtime_original)
+    hermanos = _hermanos.get(clave)
+    if hermanos is None:
+        hermanos = {}
+        for codificacion, sufijo in PRECOMPRIMIDOS:
+            candidato = ruta + sufijo
+            # Ignorar los precomprimidos que se quedaron atrás al editar el original
+            if os.path.isfile(candidato) and os.stat(candidato).st_mtime_ns >= mtime_original:
+                hermanos[codificacion] = candidato
+        if len(_hermanos) > 1024:
+            _hermanos.clear()
+        _hermanos[clave] = hermanos
+    return hermanos
+
+
+def _precomprimido(ruta, mtime_original):
+    """Devuelve (ruta, codificación) del hermano .br/.gz aceptado por el cliente, si existe"""
+    hermanos = _hermanos_precomprimidos(ruta, mtime_original)
+    for codificacion, _ in PRECOMPRIMIDOS:
+        if codificacion in hermanos and request.accept_encodings[codificacion]:
+            return hermanos[codificacion], codificacion
+    return None, None
+
+
+def servir_estatico(directorio, filename, max_age=0, immutable=False, etag=True):
+    """Sirve un archivo estático con política de caché y precompresión.
+
+    - Para texto (CSS/JS/HTML...) usa el hermano .br o .gz si existe y el
+      cliente lo acepta, con Vary: Accept-Encoding.
+    - send_file resuelve Range, If-None-Match e If-Modified-Since, y usa el
+      file_wrapper del servidor (sendfile en gunicorn) o X-Sendfile si
+      USE_X_SENDFILE está activo, así que el contenido no pasa por Python.
+    - max_age=0 equivale a no-cache: el navegador revalida siempre (304).
+    - Cache-Control se escribe de una vez como texto: cada acceso a
+      respuesta.cache_control vuelve a parsear la cabecera.
+    """
+    ruta = safe_join(os.path.abspath(directorio), filename)
+    try:
+        estado = os.stat(ruta) if ruta else None
+    except OSError:
+        estado = None
+    if estado is None or not stat.S_ISREG(estado.st_mode):
+        abort(404)
+
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    es_texto = os.path.splitext(filename)[1].lower() in EXTENSIONES_TEXTO
+
+    codificacion = None
+    if es_texto:
+        comprimido, codificacion = _precomprimido(ruta, estado.st_mtime_ns)
+        if comprimido:
+            ruta = comprimido
+            estado = os.stat(ruta)
+
+    # ETag barato (mtime y tamaño del archivo que se envía) salvo que nos den uno
+    if not isinstance(etag, str):
+        etag = f"{estado.st_mtime_ns:x}-{estado.st_size:x}"
+
+    if request.if_none_match.contains_weak(etag):
+        # Revalidación: responder 304 sin abrir el archivo
+        respuesta = current_app.response_class(status=304)
+        respuesta.set_etag(etag)
+    else:
+        respuesta = send_file(
+            ruta,
+            mimetype=mimetype,
+            conditional=True,
+            etag=etag,
+            last_modified=estado.st_mtime
+        )
+        # send_file añade "inline; filename=..." siempre que recibe una ruta: sobra para servir estáticos
+        respuesta.headers.pop('Content-Disposition', None)
+
+    if codificacion:
+        respuesta.headers['Content-Encoding'] = codificacion
+    if es_texto:
+        respuesta.vary.add('Accept-Encoding')
+
+    if max_age:
+        respuesta.headers['Cache-Control'] = f"public, max-age={max_age}{', immutable' if immutable else ''}"
+    else:
+        respuesta.headers['Cache-Control'] = 'no-cache'
+    return respuesta
@@ -0,0 +1,167 @@
+import base64
+import io
+import os
+import threading
+import time
+from PIL import Image, ImageOps, features
+
+CARPETA_VARIANTES = 'variantes'
+
+# Lado mayor de la previsualización que se manda dentro del JSON
+LADO_PREVIA = 24
+
+# Tipo MIME y extensión de cada formato derivado, por orden de preferencia
+FORMATOS = {
+    'avif': ('image/avif', 'avif'),
+    'webp': ('image/webp', 'webp'),
+}
+
+
+def formatos_disponibles(avif=False):
+    """Formatos que se pueden generar con el Pillow instalado"""
+    formatos = ['webp']
+    if avif and features.check('avif'):
+        formatos.insert(0, 'avif')
+    return formatos
+
+
+def nombre_variante(ruta_archivo, ancho, formato):
+    """'20260101_foo.jpg', 640, 'webp' -> 'variantes/20260101_foo-640.webp'"""
+    base = os.path.splitext(os.path.basename(ruta_archivo))[0]
+    return f"{CARPETA_VARIANTES}/{base}-{ancho}.{FORMATOS[formato][1]}"
+
+
+def generar_variantes(ruta_original, carpeta_uploads, anchos, formatos, calidad=80):
+    """Genera las versiones reducidas de una imagen, sin metadatos.
+
+    Devuelve una lista de dicts {'formato', 'ancho', 'alto', 'archivo', 'bytes'}
+    con `archivo` relativo a la carpeta de uploads. Nunca se amplía la imagen:
+    los anchos mayores que el original se sustituyen por el ancho original.
+    """
+    os.makedirs(os.path.join(carpeta_uploads, CARPETA_VARIANTES), exist_ok=True)
+
+    with Image.open(ruta_original) as original:
+        # Aplicar la orientación EXIF antes de descartar los metadatos
+        imagen = ImageOps.exif_transpose(original)
+        modo = 'RGBA' if 'A' in imagen.getbands() or 'transparency' in imagen.info else 'RGB'
+        imagen = imagen.convert(modo)
+
+    ancho_original, alto_original = imagen.size
+    bytes_original = os.path.getsize(ruta_original)
+    anchos_finales = sorted({min(ancho, ancho_original) for ancho in anchos})
+
+    variantes = []
+    for ancho in anchos_finales:
+        alto = max(1, round(alto_original * ancho / ancho_original))
+        reducida = imagen if ancho == ancho_original else imagen.resize((ancho, alto), Image.LANCZOS)
+
+        for formato in formatos:
+            archivo = nombre_variante(ruta_original, ancho, formato)
+            destino = os.path.join(carpeta_uploads, archivo)
+            temporal = f"{destino}.tmp"
+            # Sin exif ni icc_profile: Pillow solo los escribe si se le pasan
+            if formato == 'webp':
+                reducida.save(temporal, 'WEBP', quality=calidad, method=6)
+            else:
+                reducida.save(temporal, 'AVIF', quality=calidad - 20)
+            # Si la variante no ahorra nada frente al original, no sirve de nada
+            if ancho == ancho_original and os.path.getsize(temporal) >= bytes_original:
+                os.remove(temporal)
+                continue
+            os.replace(temporal, destino)
+
+            variantes.append({
+                'formato': formato,
+                'ancho': ancho,
+                'alto': alto,
+                'archivo': archivo,
+                'bytes': os.path.getsize(destino),
+            })
+
+    return variantes
+
+
+def calcular_previa(ruta_original, lado=LADO_PREVIA, calidad=40):
+    """Dimensiones y previsualización diminuta de una imagen.
+
+    Devuelve {'ancho', 'alto', 'previa'}, con `previa` como data URI WebP de
+    unos cientos de bytes que el frontend pinta desenfocada mientras llega
+    la imagen real. Las dimensiones son las ya orientadas según el EXIF.
+    """
+    with Image.open(ruta_original) as original:
+        ancho, alto = original.size
+        # Orientaciones EXIF que giran la imagen 90°
+        if original.getexif().get(0x0112, 1) in (5, 6, 7, 8):
+            ancho, alto = alto, ancho
+        # En JPEG, decodificar directamente a un tamaño reducido
+        original.draft('RGB', (lado * 4, lado * 4))
+        imagen = ImageOps.exif_transpose(original).convert('RGB')
+
+    imagen.thumbnail((lado, lado))
+    buffer = io.BytesIO()
+    imagen.save(buffer, 'WEBP', quality=calidad)
+    return {
+        'ancho': ancho,
+        'alto': alto,
+        'previa': 'data:image/webp;base64,' + base64.b64encode(buffer.getvalue()).decode('ascii'),
+    }
+
+
+def elegir_variante(variantes, formatos_aceptados, ancho_pedido=None):
+    """Elige la variante más adecuada para el cliente (o None para servir el original).
+
+    Prefiere el formato más eficiente que acepte el cliente y, dentro de él,
+    la variante más pequeña que cubra `ancho_pedido` (o la mayor si no hay
+    ancho pedido o ninguna lo cubre).
+    """
+    for formato in FORMATOS:
+        if formato not in formatos_aceptados:
+            continue
+        candidatas = sorted(
+            (v for v in variantes if v['formato'] == formato),
+            key=lambda v: v['ancho']
+        )
+        if not candidatas:
+            continue
+        if ancho_pedido:
+            for variante in candidatas:
+                if variante['ancho'] >= ancho_pedido:
+                    return variante
+        return candidatas[-1]
+    return None
+
+
+class IndiceVariantes:
+    """Variantes de cada archivo de uploads, cargadas de la BD bajo demanda.
+
+    Evita una consulta por cada imagen servida: solo la primera petición de
+    cada archivo (por proceso y cada `ttl` segundos) va a la base de datos.
+    """
+
+    def __init__(self, cargar, ttl=300, max_entradas=4096):
+        self._cargar = cargar
+        self._ttl = ttl
+        self._max_entradas = max_entradas
+        self._entradas = {}
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def obtener(self, ruta_archivo):
+        ahora = time.monotonic()
+        entrada = self._entradas.get(ruta_archivo)
+        if entrada is not None and entrada[1] > ahora:
+            self.aciertos += 1
+            return entrada[0]
+        self.fallos += 1
+        variantes = self._cargar(ruta_archivo) or []
+        self.guardar(ruta_archivo, variantes)
+        return variantes
+
+    def guardar(self, ruta_archivo, variantes):
+        with self._lock:
+            if len(self._entradas) >= self._max_entradas:
+                # Descartar la mitad más antigua en lugar de llevar un LRU exacto
+                for clave in list(self._entradas)[:self._max_entradas // 2]:
+                    del self._entradas[clave]
+            self._entradas[ruta_archivo] = (variantes or [], time.monotonic() + self._ttl)
@@ -0,0 +1,331 @@
+"""Importación masiva de álbumes desde un ZIP o un TAR.
+
+Uso: python importacion.py ARCHIVO [--manifiesto manifest.json] [--dry-run]
+
+Cada álbum son seis imágenes `Título(1).jpg` ... `Título(6).jpg`; el número
+entre paréntesis es su orden_dia. Los metadatos van en un manifest.json
+(dentro del archivo o aparte), con el nombre base de los archivos como clave:
+
+    {"albumes": [{"nombre": "Título", "titulo": "Título real",
+                  "descripcion": "...", "fecha": "2026-11-01"}]}
+
+Los álbumes sin entrada en el manifiesto usan el nombre base como título y
+quedan sin programar. Las imágenes se leen del archivo por bloques y se
+guardan por contenido (almacen.py), sin cargar el archivo en memoria; todas
+las filas se insertan con un único executemany en una transacción. Las
+variantes WebP/AVIF se generan después con recodificar_uploads.py.
+
+Las imágenes se guardan según se leen (el manifiesto puede venir al final
+del archivo), así que la validación es posterior: los archivos nuevos de
+los álbumes descartados que ninguna fila usa se borran al terminar. Se
+descartan también los álbumes cuya fecha ya tiene otro álbum programado.
+Con --dry-run todo se extrae a una carpeta temporal y no queda nada escrito.
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+import tarfile
+import tempfile
+import zipfile
+from collections import defaultdict
+from datetime import date
+from almacen import guardar_por_contenido
+from config import Config
+from imagenes_derivadas import calcular_previa
+
+log = logging.getLogger(__name__)
+
+# 'Título(3).jpg' -> ('Título', 3)
+PATRON_ARCHIVO_ALBUM = re.compile(r'^(?P<nombre>.+?)\s*\((?P<orden>\d+)\)\.(?P<extension>[A-Za-z0-9]+)$')
+NOMBRE_MANIFIESTO = 'manifest.json'
+IMAGENES_POR_ALBUM = 6
+
+
+class ErrorImportacion(Exception):
+    pass
+
+
+class _LectorLimitado:
+    """Envuelve un archivo del ZIP/TAR y corta si descomprime más de `limite` bytes"""
+
+    def __init__(self, origen, limite, nombre):
+        self._origen = origen
+        self._restante = limite
+        self._nombre = nombre
+
+    def read(self, tamano=-1):
+        bloque = self._origen.read(tamano)
+        self._restante -= len(bloque)
+        if self._restante < 0:
+            raise ErrorImportacion(f"{self._nombre} supera el tamaño máximo por imagen")
+        return bloque
+
+
+def _entradas_zip(origen):
+    with zipfile.ZipFile(origen) as archivo:
+        for info in archivo.infolist():
+            if info.is_dir():
+                continue
+            with archivo.open(info) as contenido:
+                yield info.filename, contenido
+
+
+def _entradas_tar(origen):
+    # 'r|*': lectura secuencial, sirve también para flujos que no admiten seek
+    with tarfile.open(fileobj=origen, mode='r|*') as archivo:
+        for miembro in archivo:
+            # Ignorar directorios, enlaces y dispositivos
+            if not miembro.isfile():
+                continue
+            contenido = archivo.extractfile(miembro)
+            if contenido is not None:
+                yield miembro.name, contenido
+
+
+def entradas_archivo(origen, nombre):
+    """(nombre, flujo) de cada archivo regular de un ZIP o TAR (.tar, .tar.gz, .tgz...)"""
+    if nombre.lower().endswith('.zip'):
+        return _entradas_zip(origen)
+    return _entradas_tar(origen)
+
+
+def leer_manifiesto(datos):
+    """Manifiesto (bytes, str o dict) -> {nombre base: metadatos}"""
+    if isinstance(datos, (bytes, bytearray)):
+        datos = datos.decode('utf-8-sig')
+    if isinstance(datos, str):
+        datos = json.loads(datos) if datos.strip() else {}
+    albumes = datos.get('albumes', []) if isinstance(datos, dict) else datos
+    manifiesto = {}
+    for album in albumes:
+        if not album.get('nombre'):
+            raise ErrorImportacion("Cada álbum del manifiesto necesita 'nombre'")
+        if album.get('fecha'):
+            date.fromisoformat(album['fecha'])  # valida YYYY-MM-DD
+        manifiesto[album['nombre']] = album
+    return manifiesto
+
+
+def extraer(origen, nombre_archivo, carpeta, max_bytes_imagen):
+    """Guarda las imágenes del archivo en la carpeta y las agrupa por álbum.
+
+    Devuelve (albumes, manifiesto_incluido, omitidos), con albumes como
+    {nombre base: {orden: {'nombre_archivo', 'ruta_archivo', 'hash', 'previa', 'nuevo'}}}
+    ('nuevo': el archivo no estaba ya en la carpeta).
+    """
+    albumes = defaultdict(dict)
+    manifiesto = None
+    omitidos = []
+
+    for ruta, contenido in entradas_archivo(origen, nombre_archivo):
+        # Solo el nombre: las rutas del archivo nunca se usan para escribir
+        nombre = os.path.basename(ruta.replace('\\', '/'))
+        if not nombre or nombre.startswith('.'):
+            continue
+        if nombre == NOMBRE_MANIFIESTO:
+            manifiesto = contenido.read(1024 * 1024)
+            continue
+
+        coincidencia = PATRON_ARCHIVO_ALBUM.match(nombre)
+        if not coincidencia or coincidencia.group('extension').lower() not in Config.ALLOWED_EXTENSIONS:
+            omitidos.append(nombre)
+            continue
+
+        nombre_album, orden = coincidencia.group('nombre'), int(coincidencia.group('orden'))
+        ruta_archivo, sha256, ya_existia = guardar_por_contenido(
+            _LectorLimitado(contenido, max_bytes_imagen, nombre), nombre, carpeta
+        )
+        try:
+            previa = calcular_previa(os.path.join(carpeta, ruta_archivo))
+        except Exception as e:
+            log.warning("No se pudo calcular la previsualización de %s: %s", nombre, e)
+            previa = None
+        albumes[nombre_album][orden] = {
+            'nombre_archivo': nombre,
+            'ruta_archivo': ruta_archivo,
+            'hash': sha256,
+            'previa': previa,
+            'nuevo': not ya_existia,
+        }
+
+    return albumes, manifiesto, omitidos
+
+
+def filas_de_albumes(albumes, manifiesto, ocupadas=()):
+    """Filas para ImagenModel.insertar_imagenes y errores de los álbumes descartados.
+
+    `ocupadas`: fechas 'YYYY-MM-DD' que ya tienen otro álbum programado.
+    """
+    filas, errores = [], []
+    fechas = {}
+    for nombre in sorted(albumes):
+        imagenes = albumes[nombre]
+        if sorted(imagenes) != list(range(1, IMAGENES_POR_ALBUM + 1)):
+            errores.append(f"{nombre}: se esperaban las imágenes (1) a ({IMAGENES_POR_ALBUM}), "
+                           f"hay {sorted(imagenes)}")
+            continue
+
+        datos = manifiesto.get(nombre, {})
+        fecha = datos.get('fecha')
+        if fecha and fecha in fechas:
+            errores.append(f"{nombre}: la fecha {fecha} ya es de {fechas[fecha]}")
+            continue
+        if fecha and fecha in ocupadas:
+            errores.append(f"{nombre}: la fecha {fecha} ya tiene un álbum programado")
+            continue
+        if fecha:
+            fechas[fecha] = nombre
+
+        for orden, imagen in sorted(imagenes.items()):
+            previa = imagen['previa'] or {}
+            filas.append({
+                'nombre_archivo': imagen['nombre_archivo'],
+                'ruta_archivo': imagen['ruta_archivo'],
+                'titulo': datos.get('titulo') or nombre,
+                'descripcion': datos.get('descripcion', ''),
+                'fecha_programada': fecha,
+                'orden_dia': orden,
+                'hash_contenido': imagen['hash'],
+                'ancho': previa.get('ancho'),
+                'alto': previa.get('alto'),
+                'previa': previa.get('previa'),
+            })
+    return filas, errores
+
+
+def borrar_descartados(albumes, filas, carpeta, modelo):
+    """Borra los archivos que trajo esta importación y que no usa ninguna fila; devuelve cuántos"""
+    usados = {fila['ruta_archivo'] for fila in filas}
+    candidatos = {
+        imagen['ruta_archivo']
+        for imagenes in albumes.values() for imagen in imagenes.values()
+        if imagen['nuevo'] and imagen['ruta_archivo'] not in usados
+    }
+    # Otra subida con el mismo contenido puede haberlo registrado mientras tanto
+    candidatos -= {ruta for ruta, _, _ in modelo.get_imagenes_existentes(candidatos)}
+    for ruta_archivo in candidatos:
+        try:
+            os.remove(os.path.join(carpeta, ruta_archivo))
+        except FileNotFoundError:
+            pass
+    return len(candidatos)
+
+
+def fechas_ocupadas(albumes, metadatos, existentes, modelo):
+    """Fechas del manifiesto que ya tienen imágenes que no son las de este mismo álbum"""
+    fechas = {}
+    for nombre, imagenes in albumes.items():
+        fecha = metadatos.get(nombre, {}).get('fecha')
+        if fecha:
+            fechas.setdefault(fecha, []).append(imagenes)
+    if not fechas:
+        return set()
+    totales = modelo.get_totales_albumes(fechas)
+    if totales is None:
+        raise ErrorImportacion("No se pudieron comprobar las fechas del manifiesto")
+
+    ocupadas = set()
+    for fecha, total in totales.items():
+        fecha = str(fecha)
+        # Reimportar: las imágenes de esa fecha son justo las de este álbum
+        reimportado = any(
+            total == len(imagenes)
+            and all((imagen['ruta_archivo'], fecha, orden) in existentes for orden, imagen in imagenes.items())
+            for imagenes in fechas.get(fecha, ())
+        )
+        if total and not reimportado:
+            ocupadas.add(fecha)
+    return ocupadas
+
+
+def importar(origen, nombre_archivo, manifiesto=None, carpeta=None, max_bytes_imagen=None, guardar=True):
+    """Importa un ZIP/TAR de álbumes; devuelve un resumen con lo insertado y lo descartado.
+
+    Con guardar=False es una simulación: las imágenes se extraen a una
+    carpeta temporal que se borra al terminar.
+    """
+    if not guardar:
+        with tempfile.TemporaryDirectory(prefix='importacion-') as temporal:
+            return _importar(origen, nombre_archivo, manifiesto, temporal, max_bytes_imagen, guardar=False)
+    return _importar(origen, nombre_archivo, manifiesto, carpeta, max_bytes_imagen, guardar=True)
+
+
+def _importar(origen, nombre_archivo, manifiesto, carpeta, max_bytes_imagen, guardar):
+    from models import ImagenModel
+
+    carpeta = carpeta or Config.UPLOAD_FOLDER
+    max_bytes_imagen = max_bytes_imagen or Config.IMPORTACION_MAX_BYTES_IMAGEN
+    albumes, manifiesto_incluido, omitidos = extraer(origen, nombre_archivo, carpeta, max_bytes_imagen)
+
+    # El manifiesto pasado aparte tiene prioridad sobre el que venga dentro
+    metadatos = leer_manifiesto(manifiesto_incluido) if manifiesto_incluido else {}
+    if manifiesto:
+        metadatos.update(leer_manifiesto(manifiesto))
+
+    modelo = ImagenModel()
+    # Reimportar el mismo archivo no duplica filas
+    existentes = modelo.get_imagenes_existentes(
+        imagen['ruta_archivo'] for imagenes in albumes.values() for imagen in imagenes.values()
+    )
+    ocupadas = fechas_ocupadas(albumes, metadatos, existentes, modelo)
+    filas, errores = filas_de_albumes(albumes, metadatos, ocupadas)
+
+    nuevas = [
+        fila for fila in filas
+        if (fila['ruta_archivo'], fila['fecha_programada'], fila['orden_dia']) not in existentes
+    ]
+    if guardar and nuevas:
+        modelo.insertar_imagenes(nuevas)
+        try:
+            modelo.actualizar_resumen(fila['fecha_programada'] for fila in nuevas)
+        except Exception as e:
+            log.warning("No se pudo actualizar el resumen del historial: %s", e)
+    if errores and guardar:
+        try:
+            borrados = borrar_descartados(albumes, filas, carpeta, modelo)
+            log.info("Archivos de álbumes descartados borrados", extra={'archivos': borrados})
+        except Exception as e:
+            log.warning("No se pudieron borrar los archivos de los álbumes descartados: %s", e)
+
+    return {
+        'albumes': len({fila['titulo'] for fila in nuevas}),
+        'imagenes': len(nuevas),
+        'ya_importadas': len(filas) - len(nuevas),
+        'fechas': sorted({fila['fecha_programada'] for fila in nuevas if fila['fecha_programada']}),
+        'titulos': sorted({(fila['titulo'], fila['descripcion']) for fila in nuevas}),
+        'omitidos': omitidos,
+        'errores': errores,
+    }
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('archivo', help='ZIP o TAR (.tar, .tar.gz, .tgz...) con los álbumes')
+    parser.add_argument('--manifiesto', help='manifest.json con títulos, descripciones y fechas')
+    parser.add_argument('--dry-run', action='store_true', help='comprobar el archivo sin guardar nada')
+    args = parser.parse_args(argv)
+
+    manifiesto = None
+    if args.manifiesto:
+        with open(args.manifiesto, 'rb') as f:
+            manifiesto = f.read()
+
+    with open(args.archivo, 'rb') as origen:
+        resumen = importar(origen, args.archivo, manifiesto, guardar=not args.dry_run)
+
+    print(f"{resumen['imagenes']} imágenes de {resumen['albumes']} álbumes importadas"
+          f" ({resumen['ya_importadas']} ya estaban)")
+    for nombre in resumen['omitidos']:
+        print(f"  - omitido: {nombre}")
+    for error in resumen['errores']:
+        print(f"  ✗ {error}")
+    if resumen['imagenes']:
+        print("Genera las variantes con: python recodificar_uploads.py")
+    return 1 if resumen['errores'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,73 @@
+"""Logging estructurado del servidor.
+
+Cada registro sale como una línea JSON (o texto, con LOG_FORMATO=texto) con
+el nivel, el logger, el mensaje y los campos pasados en `extra`:
+
+    log.info('Álbum importado', extra={'fecha': fecha, 'imagenes': 6})
+
+Los niveles por debajo de WARNING se muestrean (LOG_MUESTREO): con tráfico
+alto basta una fracción de los mensajes de depuración para ver qué pasa.
+Con el nivel desactivado no se construye nada: `logging` descarta la
+llamada antes de formatear, y el código caliente comprueba
+`log.isEnabledFor(logging.DEBUG)` antes de preparar los campos.
+"""
+import json
+import logging
+import random
+import sys
+from datetime import datetime, timezone
+from config import Config
+
+# Atributos propios de LogRecord: el resto son campos de `extra`
+_CAMPOS_ESTANDAR = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+
+class FormatoJSON(logging.Formatter):
+    def format(self, registro):
+        datos = {
+            'ts': datetime.fromtimestamp(registro.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'nivel': registro.levelname,
+            'logger': registro.name,
+            'mensaje': registro.getMessage(),
+        }
+        for campo, valor in vars(registro).items():
+            if campo not in _CAMPOS_ESTANDAR:
+                datos[campo] = valor
+        if registro.exc_info:
+            datos['excepcion'] = self.formatException(registro.exc_info)
+        return json.dumps(datos, ensure_ascii=False, default=str)
+
+
+class FiltroMuestreo(logging.Filter):
+    """Deja pasar todos los WARNING o superiores y una fracción `proporcion` del resto"""
+
+    def __init__(self, proporcion=1.0):
+        super().__init__()
+        self.proporcion = proporcion
+
+    def filter(self, registro):
+        return registro.levelno >= logging.WARNING or random.random() < self.proporcion
+
+
+_configurado = False
+
+
+def configurar_logs(nivel=None, formato=None, muestreo=None):
+    """Instala el manejador en el logger raíz (una sola vez por proceso)"""
+    global _configurado
+    if _configurado:
+        return
+    _configurado = True
+
+    manejador = logging.StreamHandler(sys.stderr)
+    if (formato or Config.LOG_FORMATO) == 'json':
+        manejador.setFormatter(FormatoJSON())
+    else:
+        manejador.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    proporcion = Config.LOG_MUESTREO if muestreo is None else muestreo
+    if proporcion < 1:
+        manejador.addFilter(FiltroMuestreo(proporcion))
+
+    raiz = logging.getLogger()
+    raiz.addHandler(manejador)
+    raiz.setLevel((nivel or Config.LOG_NIVEL).upper())
@@ -0,0 +1,221 @@
+"""Métricas del servidor en formato de texto de Prometheus (GET /metrics).
+
+Por cada ruta se miden la latencia (histograma), las respuestas por código
+de estado, las peticiones en curso y cuántas consultas hizo a MySQL y
+cuánto tardaron. Los aciertos de las cachés y el estado del pool se leen
+al exportar, con recolectores que consultan los contadores que ya llevan
+esos objetos.
+
+Las métricas son por proceso: con varios workers de gunicorn cada scrape
+ve uno de ellos, así que conviene raspar cada worker por separado (o
+arrancar uno solo detrás de un balanceador con varios puertos).
+"""
+import bisect
+import math
+import threading
+import time
+from flask import Response, g, has_app_context, request
+
+DURACIONES = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+CONSULTAS_POR_PETICION = (0, 1, 2, 3, 5, 10, 20, 50)
+TIPO_EXPOSICION = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _etiquetas(nombres, valores):
+    if not nombres:
+        return ''
+    pares = (f'{nombre}="{_escapar(valor)}"' for nombre, valor in zip(nombres, valores))
+    return '{' + ','.join(pares) + '}'
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _numero(valor):
+    if valor == math.inf:
+        return '+Inf'
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Contador:
+    """Contador (o indicador, con tipo='gauge') con etiquetas"""
+
+    def __init__(self, nombre, ayuda, etiquetas=(), tipo='counter'):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.tipo = tipo
+        self._nombres = tuple(etiquetas)
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def sumar(self, *etiquetas, valor=1):
+        with self._lock:
+            self._valores[etiquetas] = self._valores.get(etiquetas, 0) + valor
+
+    def exportar(self):
+        with self._lock:
+            valores = sorted(self._valores.items())
+        for etiquetas, valor in valores:
+            yield f'{self.nombre}{_etiquetas(self._nombres, etiquetas)} {_numero(valor)}'
+
+
+class Histograma:
+    """Histograma acumulativo con límites fijos, como los de Prometheus"""
+
+    tipo = 'histogram'
+
+    def __init__(self, nombre, ayuda, etiquetas=(), limites=DURACIONES):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self._nombres = tuple(etiquetas)
+        self._limites = tuple(limites)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observar(self, valor, *etiquetas):
+        with self._lock:
+            serie = self._series.get(etiquetas)
+            if serie is None:
+                # [cubetas..., +Inf], suma
+                serie = self._series[etiquetas] = [[0] * (len(self._limites) + 1), 0.0]
+            serie[0][bisect.bisect_left(self._limites, valor)] += 1
+            serie[1] += valor
+
+    def exportar(self):
+        with self._lock:
+            series = sorted((etiquetas, list(cubetas), suma) for etiquetas, (cubetas, suma) in self._series.items())
+        nombres = self._nombres + ('le',)
+        for etiquetas, cubetas, suma in series:
+            acumulado = 0
+            for limite, cantidad in zip(self._limites + (math.inf,), cubetas):
+                acumulado += cantidad
+                yield f'{self.nombre}_bucket{_etiquetas(nombres, etiquetas + (_numero(limite),))} {acumulado}'
+            yield f'{self.nombre}_sum{_etiquetas(self._nombres, etiquetas)} {_numero(round(suma, 6))}'
+            yield f'{self.nombre}_count{_etiquetas(self._nombres, etiquetas)} {acumulado}'
+
+
+class Metricas:
+    """Registro de métricas del proceso"""
+
+    def __init__(self):
+        self._metricas = []
+        self._recolectores = []
+
+    def contador(self, nombre, ayuda, etiquetas=()):
+        return self._registrar(Contador(nombre, ayuda, etiquetas))
+
+    def indicador(self, nombre, ayuda, etiquetas=()):
+        return self._registrar(Contador(nombre, ayuda, etiquetas, tipo='gauge'))
+
+    def histograma(self, nombre, ayuda, etiquetas=(), limites=DURACIONES):
+        return self._registrar(Histograma(nombre, ayuda, etiquetas, limites))
+
+    def recolector(self, funcion):
+        """Registra funcion() -> [(nombre, tipo, ayuda, {etiqueta: valor} o None, valor)], leída al exportar"""
+        self._recolectores.append(funcion)
+        return funcion
+
+    def _registrar(self, metrica):
+        self._metricas.append(metrica)
+        return metrica
+
+    def exportar(self):
+        lineas = []
+        for metrica in self._metricas:
+            lineas.append(f'# HELP {metrica.nombre} {metrica.ayuda}')
+            lineas.append(f'# TYPE {metrica.nombre} {metrica.tipo}')
+            lineas.extend(metrica.exportar())
+
+        vistas = set()
+        for recolector in self._recolectores:
+            try:
+                muestras = list(recolector())
+            except Exception:
+                continue  # un recolector roto no debe dejar sin métricas
+            for nombre, tipo, ayuda, etiquetas, valor in muestras:
+                if nombre not in vistas:
+                    vistas.add(nombre)
+                    lineas.append(f'# HELP {nombre} {ayuda}')
+                    lineas.append(f'# TYPE {nombre} {tipo}')
+                etiquetas = etiquetas or {}
+                lineas.append(f'{nombre}{_etiquetas(tuple(etiquetas), tuple(etiquetas.values()))} {_numero(valor)}')
+        return '\n'.join(lineas) + '\n'
+
+
+metricas = Metricas()
+
+peticiones = metricas.contador(
+    'muzikdle_peticiones_total', 'Respuestas por ruta, método y código de estado', ('ruta', 'metodo', 'estado'))
+duracion_peticion = metricas.histograma(
+    'muzikdle_peticion_duracion_segundos', 'Latencia de las peticiones por ruta', ('ruta', 'metodo'))
+en_curso = metricas.indicador('muzikdle_peticiones_en_curso', 'Peticiones atendiéndose ahora mismo')
+consultas_db = metricas.contador(
+    'muzikdle_db_consultas_total', 'Sentencias ejecutadas en MySQL', ('operacion',))
+duracion_consulta_db = metricas.histograma(
+    'muzikdle_db_consulta_duracion_segundos', 'Latencia de cada sentencia en MySQL', ('operacion',))
+consultas_por_peticion = metricas.histograma(
+    'muzikdle_db_consultas_por_peticion', 'Sentencias a MySQL en cada petición', ('ruta',),
+    limites=CONSULTAS_POR_PETICION)
+tiempo_db_por_peticion = metricas.histograma(
+    'muzikdle_db_segundos_por_peticion', 'Tiempo total en MySQL de cada petición', ('ruta',))
+
+
+def ruta_de_peticion():
+    """Plantilla de la ruta (no la URL, para no disparar el número de series)"""
+    return request.url_rule.rule if request.url_rule is not None else 'sin_ruta'
+
+
+def observar_consulta(sentencia, segundos, params=None, filas=None):
+    """Observador de database.py: cada sentencia ejecutada en MySQL"""
+    operacion = sentencia.lstrip()[:6].upper() if isinstance(sentencia, str) else 'OTRA'
+    consultas_db.sumar(operacion)
+    duracion_consulta_db.observar(segundos, operacion)
+    if has_app_context() and '_metricas_inicio' in g:
+        g._metricas_consultas += 1
+        g._metricas_segundos_db += segundos
+
+
+def observar_peticion(ruta, metodo, estado, segundos):
+    peticiones.sumar(ruta, metodo, str(estado))
+    duracion_peticion.observar(segundos, ruta, metodo)
+
+
+def _antes_de_peticion():
+    g._metricas_inicio = time.perf_counter()
+    g._metricas_consultas = 0
+    g._metricas_segundos_db = 0.0
+    en_curso.sumar()
+
+
+def _despues_de_peticion(respuesta):
+    g._metricas_estado = respuesta.status_code
+    return respuesta
+
+
+def _al_terminar_peticion(exception=None):
+    inicio = g.pop('_metricas_inicio', None)
+    if inicio is None:
+        return
+    en_curso.sumar(valor=-1)
+    ruta = ruta_de_peticion()
+    # Sin after_request (excepción no capturada) la respuesta fue un 500
+    observar_peticion(ruta, request.method, g.pop('_metricas_estado', 500), time.perf_counter() - inicio)
+    consultas_por_peticion.observar(g.pop('_metricas_consultas', 0), ruta)
+    tiempo_db_por_peticion.observar(g.pop('_metricas_segundos_db', 0.0), ruta)
+
+
+def instrumentar(app, ruta='/metrics'):
+    """Mide todas las peticiones de `app` y publica las métricas en `ruta`"""
+    from database import observar_consultas
+
+    app.before_request(_antes_de_peticion)
+    app.after_request(_despues_de_peticion)
+    app.teardown_request(_al_terminar_peticion)
+    observar_consultas(observar_consulta)
+
+    @app.route(ruta, methods=['GET'])
+    def exportar_metricas():
+        return Response(metricas.exportar(), mimetype=TIPO_EXPOSICION)
+
+    return metricas
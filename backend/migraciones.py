@@ -0,0 +1,245 @@
+"""Migraciones de esquema versionadas.
+
+Uso: python migraciones.py            aplica las migraciones pendientes
+     python migraciones.py --estado   muestra qué versiones están aplicadas
+
+Los índices se crean con LOCK=NONE (la tabla sigue admitiendo escrituras) y
+los rellenos de columnas nuevas se hacen por lotes pequeños con un commit
+en cada uno, para no bloquear filas ni inflar el undo log con el servidor
+en marcha.
+"""
+import sys
+import time
+from mysql.connector import Error
+from database import Database
+
+RELLENO_LOTE = 5000
+RELLENO_PAUSA = 0.05  # segundos entre lotes, para dejar paso al tráfico normal
+
+
+def crear_indice(tabla, nombre, columnas, unico=False):
+    """Crea el índice si no hay ya uno (con cualquier nombre) sobre esas mismas columnas"""
+    def aplicar(conexion, salida):
+        cursor = conexion.cursor()
+        try:
+            cursor.execute("""
+                SELECT index_name, GROUP_CONCAT(column_name ORDER BY seq_in_index) AS columnas
+                FROM information_schema.statistics
+                WHERE table_schema = DATABASE() AND table_name = %s
+                GROUP BY index_name
+            """, (tabla,))
+            existentes = {nombre_indice: columnas_indice for nombre_indice, columnas_indice in cursor.fetchall()}
+            if ','.join(columnas) in existentes.values():
+                salida(f"  {tabla}: ya hay un índice sobre ({', '.join(columnas)})")
+                return
+            cursor.execute(
+                f"CREATE {'UNIQUE ' if unico else ''}INDEX {nombre} ON {tabla} ({', '.join(columnas)}) "
+                "ALGORITHM=INPLACE LOCK=NONE"
+            )
+        finally:
+            cursor.close()
+    return aplicar
+
+
+def volver_unico(tabla, nombre, columnas):
+    """Cambia los índices no únicos sobre esas columnas por uno UNIQUE llamado `nombre`"""
+    def aplicar(conexion, salida):
+        cursor = conexion.cursor()
+        try:
+            cursor.execute("""
+                SELECT index_name, MIN(non_unique), GROUP_CONCAT(column_name ORDER BY seq_in_index)
+                FROM information_schema.statistics
+                WHERE table_schema = DATABASE() AND table_name = %s
+                GROUP BY index_name
+            """, (tabla,))
+            iguales = {
+                nombre_indice: not no_unico
+                for nombre_indice, no_unico, columnas_indice in cursor.fetchall()
+                if columnas_indice == ','.join(columnas)
+            }
+            if not any(iguales.values()):
+                # Si hay filas repetidas falla aquí, antes de tocar nada
+                cursor.execute(
+                    f"CREATE UNIQUE INDEX {nombre} ON {tabla} ({', '.join(columnas)}) ALGORITHM=INPLACE LOCK=NONE"
+                )
+            for nombre_indice, unico in iguales.items():
+                if not unico:
+                    cursor.execute(f"DROP INDEX {nombre_indice} ON {tabla} ALGORITHM=INPLACE LOCK=NONE")
+                    salida(f"  {tabla}: {nombre_indice} sustituido por un índice único")
+        finally:
+            cursor.close()
+    return aplicar
+
+
+def rellenar_por_lotes(sentencia, descripcion):
+    """Repite `sentencia` (un UPDATE ... LIMIT %s) con commit en cada lote hasta que no toque filas"""
+    def aplicar(conexion, salida):
+        cursor = conexion.cursor()
+        total = 0
+        try:
+            while True:
+                cursor.execute(sentencia, (RELLENO_LOTE,))
+                filas = cursor.rowcount
+                conexion.commit()
+                total += filas
+                if filas < RELLENO_LOTE:
+                    break
+                salida(f"  {descripcion}: {total} filas")
+                time.sleep(RELLENO_PAUSA)
+        finally:
+            cursor.close()
+        salida(f"  {descripcion}: {total} filas en total")
+    return aplicar
+
+
+# (versión, descripción, sentencias). Nunca editar una migración ya
+# publicada: añadir otra con la siguiente versión.
+MIGRACIONES = [
+    (1, 'Variantes optimizadas (WebP/AVIF) de cada imagen', [
+        "ALTER TABLE imagenes ADD COLUMN variantes TEXT NULL",
+        "CREATE INDEX idx_imagenes_ruta_archivo ON imagenes (ruta_archivo(191))",
+    ]),
+    (2, 'Hash SHA-256 del contenido de cada imagen', [
+        "ALTER TABLE imagenes ADD COLUMN hash_contenido CHAR(64) NULL",
+        "CREATE INDEX idx_imagenes_hash_contenido ON imagenes (hash_contenido)",
+    ]),
+    (3, 'Dimensiones y previsualización (LQIP) de cada imagen', [
+        "ALTER TABLE imagenes ADD COLUMN ancho INT NULL, ADD COLUMN alto INT NULL, ADD COLUMN previa TEXT NULL",
+    ]),
+    (4, 'Índices para las consultas de álbum y estadísticas', [
+        # Álbum de una fecha ordenado (sin filesort) e historial agrupado por fecha (índice cubriente)
+        crear_indice('imagenes', 'idx_imagenes_activa_fecha_orden', ('activa', 'fecha_programada', 'orden_dia')),
+        # El upsert de estadísticas necesita la clave única (fecha_album, numero_album)
+        crear_indice('estadisticas_album', 'uq_estadisticas_album', ('fecha_album', 'numero_album'), unico=True),
+    ]),
+    (5, 'user_id_hash binario (BINARY(16)) e índice de intentos por jugador y álbum', [
+        "ALTER TABLE intentos_usuario_album ADD COLUMN user_id_hash_bin BINARY(16) NULL",
+        # Antes del relleno: así cada lote encuentra por índice las filas que faltan
+        crear_indice(
+            'intentos_usuario_album', 'idx_intentos_hash_album', ('user_id_hash_bin', 'fecha_album', 'numero_album')
+        ),
+        rellenar_por_lotes(
+            """
+            UPDATE intentos_usuario_album
+            SET user_id_hash_bin = UNHEX(user_id_hash)
+            WHERE user_id_hash_bin IS NULL AND UNHEX(user_id_hash) IS NOT NULL
+            LIMIT %s
+            """,
+            'user_id_hash_bin'
+        ),
+    ]),
+    (6, 'Resumen de álbumes por día para el historial', [
+        """
+        CREATE TABLE IF NOT EXISTS resumen_albumes (
+            fecha DATE PRIMARY KEY,
+            total_imagenes INT NOT NULL,
+            primer_titulo VARCHAR(255) NULL,
+            actualizado_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        INSERT INTO resumen_albumes (fecha, total_imagenes, primer_titulo)
+        SELECT fecha_programada, COUNT(*),
+               SUBSTRING_INDEX(GROUP_CONCAT(titulo ORDER BY orden_dia SEPARATOR '\\n'), '\\n', 1)
+        FROM imagenes
+        WHERE activa = TRUE AND fecha_programada IS NOT NULL
+        GROUP BY fecha_programada
+        ON DUPLICATE KEY UPDATE total_imagenes = VALUES(total_imagenes), primer_titulo = VALUES(primer_titulo)
+        """,
+    ]),
+    (7, 'user_id_hash_bin siempre relleno (trigger) y único por jugador y álbum', [
+        # Los workers que aún no tienen el código nuevo insertan solo el hash en
+        # hexadecimal: sin esto sus filas quedarían con user_id_hash_bin a NULL
+        "DROP TRIGGER IF EXISTS trg_intentos_hash_bin",
+        """
+        CREATE TRIGGER trg_intentos_hash_bin BEFORE INSERT ON intentos_usuario_album
+        FOR EACH ROW SET NEW.user_id_hash_bin = COALESCE(NEW.user_id_hash_bin, UNHEX(NEW.user_id_hash))
+        """,
+        # Las filas que se insertaron entre la migración 5 y el trigger
+        rellenar_por_lotes(
+            """
+            UPDATE intentos_usuario_album
+            SET user_id_hash_bin = UNHEX(user_id_hash)
+            WHERE user_id_hash_bin IS NULL AND UNHEX(user_id_hash) IS NOT NULL
+            LIMIT %s
+            """,
+            'user_id_hash_bin (tras la migración 5)'
+        ),
+        # Un duplicado tiene que fallar en la clave que usan las consultas
+        volver_unico(
+            'intentos_usuario_album', 'uq_intentos_hash_album', ('user_id_hash_bin', 'fecha_album', 'numero_album')
+        ),
+    ]),
+]
+
+
+def _asegurar_tabla(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migraciones (
+            version INT PRIMARY KEY,
+            descripcion VARCHAR(255) NOT NULL,
+            aplicada_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def versiones_aplicadas(cursor):
+    _asegurar_tabla(cursor)
+    cursor.execute("SELECT version FROM schema_migraciones ORDER BY version")
+    return {fila[0] for fila in cursor.fetchall()}
+
+
+def aplicar_pendientes(salida=print):
+    """Aplica en orden las migraciones que faltan; devuelve las versiones aplicadas"""
+    db = Database()
+    conexion = db.connect()
+    if conexion is None:
+        raise Error('No hay conexión con la base de datos')
+    cursor = conexion.cursor()
+    aplicadas = []
+    try:
+        ya_aplicadas = versiones_aplicadas(cursor)
+        for version, descripcion, sentencias in MIGRACIONES:
+            if version in ya_aplicadas:
+                continue
+            salida(f"Aplicando migración {version}: {descripcion}")
+            # Los DDL de MySQL hacen commit implícito: cada sentencia es atómica
+            for sentencia in sentencias:
+                if callable(sentencia):
+                    sentencia(conexion, salida)
+                else:
+                    cursor.execute(sentencia)
+            cursor.execute(
+                "INSERT INTO schema_migraciones (version, descripcion) VALUES (%s, %s)",
+                (version, descripcion)
+            )
+            conexion.commit()
+            aplicadas.append(version)
+    finally:
+        cursor.close()
+        db.close()
+    return aplicadas
+
+
+def main(argv):
+    if '--estado' in argv:
+        db = Database()
+        conexion = db.connect()
+        cursor = conexion.cursor()
+        try:
+            ya_aplicadas = versiones_aplicadas(cursor)
+        finally:
+            cursor.close()
+            db.close()
+        for version, descripcion, _ in MIGRACIONES:
+            marca = 'x' if version in ya_aplicadas else ' '
+            print(f"[{marca}] {version:3d}  {descripcion}")
+        return 0
+
+    aplicadas = aplicar_pendientes()
+    print(f"{len(aplicadas)} migración(es) aplicada(s)" if aplicadas else "El esquema está al día")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -1,6 +1,64 @@
+import hashlib
+import json
+from mysql.connector import Error
 from database import Database
 from datetime import datetime, date
 
+def hash_usuario(user_id):
+    """MD5 del user_id en binario (16 bytes), como se guarda en user_id_hash_bin.
+
+    En hexadecimal (.hex()) es el valor de la columna antigua user_id_hash,
+    el mismo que daría MD5() en MySQL.
+    """
+    return hashlib.md5(str(user_id).encode('utf-8')).digest()
+
+# Imágenes de un álbum en su orden (la comparten el modelo y el servidor ASGI)
+CONSULTA_IMAGENES_POR_FECHA = """
+        SELECT * FROM imagenes 
+        WHERE fecha_programada = %s AND activa = TRUE
+        ORDER BY orden_dia
+        """
+
+# Resultado de un jugador en un álbum (/api/mi-intento-album)
+CONSULTA_MI_INTENTO = '''
+            SELECT 
+                acierto,
+                intentos_necesarios,
+                veces_jugado,
+                es_primera_vez,
+                created_at,
+                updated_at
+            FROM intentos_usuario_album 
+            WHERE user_id_hash_bin = %s
+              AND fecha_album = %s 
+              AND numero_album = %s
+        '''
+
+# Resultados de un jugador en un rango de fechas (/api/mis-intentos): un rango sobre idx_intentos_hash_album
+CONSULTA_MIS_INTENTOS = '''
+            SELECT fecha_album, numero_album, acierto, intentos_necesarios, veces_jugado
+            FROM intentos_usuario_album
+            WHERE user_id_hash_bin = %s
+              AND fecha_album BETWEEN %s AND %s
+            ORDER BY fecha_album, numero_album
+        '''
+
+# Filas de resumen_albumes a partir de imagenes (se completa con el filtro de fechas y el GROUP BY)
+CONSULTA_RESUMEN_ALBUMES = '''
+            INSERT INTO resumen_albumes (fecha, total_imagenes, primer_titulo)
+            SELECT fecha_programada, COUNT(*),
+                   SUBSTRING_INDEX(GROUP_CONCAT(titulo ORDER BY orden_dia SEPARATOR '\\n'), '\\n', 1)
+            FROM imagenes
+            WHERE activa = TRUE
+        '''
+
+def decodificar_variantes(filas):
+    """La columna variantes se guarda como JSON en texto: devolverla como lista"""
+    for fila in filas or []:
+        if isinstance(fila.get('variantes'), (str, bytes, bytearray)):
+            fila['variantes'] = json.loads(fila['variantes'])
+    return filas
+
 class ImagenModel:
     def __init__(self):
         self.db = Database()
@@ -9,15 +67,13 @@ class ImagenModel:
         """Obtiene las 5 imágenes programadas para hoy"""
         hoy = date.today().isoformat()
         
-        query = """
-        SELECT * FROM imagenes 
-        WHERE fecha_programada = %s AND activa = TRUE
-        ORDER BY orden_dia
-        """
-        
-        result = self.db.execute_query(query, (hoy,), fetch=True)
+        result = self.get_imagenes_por_fecha(hoy)
         return result if result else []
     
+    def get_imagenes_por_fecha(self, fecha):
+        """Obtiene las imágenes de un álbum (None si falla la consulta)"""
+        return decodificar_variantes(self.db.execute_query(CONSULTA_IMAGENES_POR_FECHA, (fecha,), fetch=True))
+    
     def get_total_imagenes_hoy(self):
         """Cuántas imágenes hay para hoy"""
         hoy = date.today().isoformat()
@@ -30,17 +86,18 @@ class ImagenModel:
         result = self.db.execute_query(query, (hoy,), fetch=True)
         return result[0]['total'] if result else 0
     
-    def get_imagen_aleatoria(self):
-        """Obtiene una imagen aleatoria si no hay programada para hoy"""
-        query = """
-        SELECT * FROM imagenes 
-        WHERE activa = TRUE 
-        ORDER BY RAND() 
-        LIMIT 1
-        """
-        
-        result = self.db.execute_query(query, fetch=True)
-        return result[0] if result else None
+    def get_fechas_albumes_completos(self, minimo_imagenes):
+        """Fechas de los álbumes con al menos `minimo_imagenes` imágenes activas (None si falla)"""
+        query = "SELECT fecha FROM resumen_albumes WHERE total_imagenes >= %s ORDER BY fecha"
+        result = self.db.execute_query(query, (minimo_imagenes,), fetch=True)
+        return None if result is None else [fila['fecha'] for fila in result]
+    
+    def get_totales_albumes(self, fechas):
+        """{fecha: imágenes activas} de esas fechas según resumen_albumes (None si falla)"""
+        fechas = sorted({str(fecha)[:10] for fecha in fechas})
+        query = f"SELECT fecha, total_imagenes FROM resumen_albumes WHERE fecha IN ({', '.join(['%s'] * len(fechas))})"
+        result = self.db.execute_query(query, tuple(fechas), fetch=True)
+        return None if result is None else {fila['fecha']: fila['total_imagenes'] for fila in result}
     
     def registrar_visualizacion(self, imagen_id):
         """Registra cuándo se mostró una imagen"""
@@ -52,20 +109,326 @@ class ImagenModel:
         hoy = date.today().isoformat()
         self.db.execute_query(query, (imagen_id, hoy))
     
-    def subir_imagen(self, nombre_archivo, ruta_archivo, titulo, descripcion, fecha_programada=None):
+    def subir_imagen(self, nombre_archivo, ruta_archivo, titulo, descripcion, fecha_programada=None,
+                     variantes=None, hash_contenido=None, previa=None):
         """Sube una nueva imagen a la base de datos"""
         query = """
-        INSERT INTO imagenes (nombre_archivo, ruta_archivo, titulo, descripcion, fecha_programada)
-        VALUES (%s, %s, %s, %s, %s)
+        INSERT INTO imagenes (nombre_archivo, ruta_archivo, titulo, descripcion, fecha_programada, variantes, hash_contenido,
+                              ancho, alto, previa)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
         """
         
-        params = (nombre_archivo, ruta_archivo, titulo, descripcion, fecha_programada)
+        previa = previa or {}
+        params = (nombre_archivo, ruta_archivo, titulo, descripcion, fecha_programada,
+                  json.dumps(variantes) if variantes else None, hash_contenido,
+                  previa.get('ancho'), previa.get('alto'), previa.get('previa'))
         return self.db.execute_query(query, params)
     
+    def get_variantes(self, ruta_archivo):
+        """Variantes optimizadas registradas para un archivo de uploads"""
+        query = "SELECT variantes FROM imagenes WHERE ruta_archivo = %s AND variantes IS NOT NULL LIMIT 1"
+        result = decodificar_variantes(self.db.execute_query(query, (ruta_archivo,), fetch=True))
+        return result[0]['variantes'] if result else None
+    
+    def guardar_variantes(self, ruta_archivo, variantes):
+        """Registra las variantes de un archivo (en todas las filas que lo usan)"""
+        query = "UPDATE imagenes SET variantes = %s WHERE ruta_archivo = %s"
+        return self.db.execute_query(query, (json.dumps(variantes), ruta_archivo))
+    
+    def get_previa(self, ruta_archivo):
+        """Dimensiones y previsualización ya calculadas para un archivo (None si no hay)"""
+        query = """
+        SELECT ancho, alto, previa FROM imagenes
+        WHERE ruta_archivo = %s AND previa IS NOT NULL LIMIT 1
+        """
+        result = self.db.execute_query(query, (ruta_archivo,), fetch=True)
+        return result[0] if result else None
+    
+    def guardar_previa(self, ruta_archivo, previa):
+        """Registra ancho, alto y previsualización de un archivo (en todas las filas que lo usan)"""
+        query = "UPDATE imagenes SET ancho = %s, alto = %s, previa = %s WHERE ruta_archivo = %s"
+        return self.db.execute_query(query, (previa['ancho'], previa['alto'], previa['previa'], ruta_archivo))
+    
+    def get_imagenes_existentes(self, rutas_archivo):
+        """(ruta_archivo, fecha 'YYYY-MM-DD' o None, orden_dia) de las filas que ya usan esos archivos"""
+        rutas = sorted(set(rutas_archivo))
+        if not rutas:
+            return set()
+        query = f"""
+        SELECT ruta_archivo, fecha_programada, orden_dia FROM imagenes
+        WHERE ruta_archivo IN ({', '.join(['%s'] * len(rutas))})
+        """
+        result = self.db.execute_query(query, tuple(rutas), fetch=True)
+        if result is None:
+            raise Error('No se pudieron consultar las imágenes existentes')
+        return {
+            (fila['ruta_archivo'], fila['fecha_programada'].isoformat() if fila['fecha_programada'] else None,
+             fila['orden_dia'])
+            for fila in result
+        }
+    
+    def insertar_imagenes(self, filas):
+        """Inserta muchas imágenes con un único executemany en una transacción"""
+        query = """
+        INSERT INTO imagenes (nombre_archivo, ruta_archivo, titulo, descripcion, fecha_programada, orden_dia,
+                              hash_contenido, ancho, alto, previa)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """
+        params = [
+            (fila['nombre_archivo'], fila['ruta_archivo'], fila['titulo'], fila['descripcion'],
+             fila['fecha_programada'], fila['orden_dia'], fila['hash_contenido'],
+             fila['ancho'], fila['alto'], fila['previa'])
+            for fila in filas
+        ]
+
+        db = Database()
+        conexion = db.connect()
+        if conexion is None:
+            raise Error('No hay conexión con la base de datos')
+        cursor = conexion.cursor()
+        try:
+            # mysql-connector reescribe el executemany de un INSERT como un único INSERT multi-fila
+            cursor.executemany(query, params)
+            conexion.commit()
+            return cursor.rowcount
+        except Exception:
+            conexion.rollback()
+            raise
+        finally:
+            cursor.close()
+            db.close()
+    
+    def get_titulos_y_descripciones(self):
+        """Pares (título, descripción) de las imágenes activas para el buscador"""
+        query = """
+        SELECT DISTINCT titulo, descripcion FROM imagenes
+        WHERE activa = TRUE AND titulo IS NOT NULL AND titulo != ''
+        """
+        return self.db.execute_query(query, fetch=True)
+    
+    def get_corpus_titulos(self):
+        """Títulos únicos y pares descripción → título para el buscador (None si falla)"""
+        query_titulos = """
+        SELECT DISTINCT titulo 
+        FROM imagenes 
+        WHERE activa = TRUE 
+          AND titulo IS NOT NULL 
+          AND titulo != ''
+          AND LENGTH(titulo) > 1
+        ORDER BY titulo
+        """
+        
+        # Pares (descripción → título) para búsqueda
+        query_descripciones = """
+        SELECT DISTINCT 
+            descripcion,
+            titulo
+        FROM imagenes 
+        WHERE activa = TRUE 
+          AND descripcion IS NOT NULL 
+          AND descripcion != '' 
+          AND LENGTH(descripcion) > 1
+          AND descripcion NOT LIKE '%http%'
+          AND descripcion NOT LIKE '%.jpg%'
+          AND descripcion NOT LIKE '%.png%'
+          AND descripcion NOT LIKE '%.jpeg%'
+          AND descripcion NOT LIKE '%.gif%'
+          AND descripcion NOT REGEXP '^[0-9]+$'
+        ORDER BY descripcion
+        """
+        
+        titulos_result = self.db.execute_query(query_titulos, fetch=True)
+        descripciones_result = self.db.execute_query(query_descripciones, fetch=True)
+        if titulos_result is None or descripciones_result is None:
+            return None
+        
+        # Eliminar duplicados en títulos
+        titulos_unicos = []
+        titulos_vistos = set()
+        for row in titulos_result:
+            if not row['titulo']:
+                continue
+            titulo = row['titulo'].strip()
+            if titulo.lower() not in titulos_vistos:
+                titulos_vistos.add(titulo.lower())
+                titulos_unicos.append(titulo)
+        
+        descripciones_titulos = [
+            {'descripcion': row['descripcion'].strip(), 'titulo': row['titulo'].strip()}
+            for row in descripciones_result
+            if row['descripcion'] and row['titulo']
+        ]
+        
+        return {
+            'titulos': titulos_unicos,
+            'descripciones_titulos': descripciones_titulos,
+            'total_titulos': len(titulos_unicos),
+            'total_descripciones': len(descripciones_titulos)
+        }
+    
+    def get_huella_imagenes(self):
+        """Huella barata de la tabla para saber si hay que regenerar cachés derivadas.
+
+        Además del número de filas y el último id lleva una suma de control
+        del contenido: así también cambia al editar un título o descripción
+        o al desactivar una imagen y activar otra.
+        """
+        query = """
+            SELECT COUNT(*) AS total, MAX(id) AS max_id,
+                   BIT_XOR(CRC32(CONCAT_WS('\\0', id, titulo, descripcion))) AS suma_control
+            FROM imagenes
+            WHERE activa = TRUE
+        """
+        result = self.db.execute_query(query, fetch=True)
+        return (result[0]['total'], result[0]['max_id'], result[0]['suma_control']) if result else None
+    
     def get_todas_imagenes(self):
         """Obtiene todas las imágenes"""
         query = "SELECT * FROM imagenes WHERE activa = TRUE ORDER BY fecha_programada DESC"
-        return self.db.execute_query(query, fetch=True)
+        return decodificar_variantes(self.db.execute_query(query, fetch=True))
+    
+    def get_fecha_programada(self, imagen_id):
+        """Fecha a la que está programada una imagen (None si no tiene o no existe)"""
+        query = "SELECT fecha_programada FROM imagenes WHERE id = %s"
+        result = self.db.execute_query(query, (imagen_id,), fetch=True)
+        return result[0]['fecha_programada'] if result else None
+    
+    def actualizar_resumen(self, fechas):
+        """Recalcula en resumen_albumes las filas de esas fechas (tras subir, programar o importar)"""
+        fechas = sorted({str(fecha)[:10] for fecha in fechas if fecha})
+        if not fechas:
+            return
+        marcadores = ', '.join(['%s'] * len(fechas))
+
+        db = Database()
+        conexion = db.connect()
+        if conexion is None:
+            raise Error('No hay conexión con la base de datos')
+        cursor = conexion.cursor()
+        try:
+            # Borrar y volver a calcular: así también desaparecen los días que se quedan sin imágenes
+            cursor.execute(f"DELETE FROM resumen_albumes WHERE fecha IN ({marcadores})", fechas)
+            cursor.execute(
+                CONSULTA_RESUMEN_ALBUMES + f" AND fecha_programada IN ({marcadores}) GROUP BY fecha_programada",
+                fechas
+            )
+            conexion.commit()
+        except Exception:
+            conexion.rollback()
+            raise
+        finally:
+            cursor.close()
+            db.close()
+    
+    def get_resumen_albumes(self, antes, limite):
+        """Días con álbum anteriores a `antes`, del más reciente al más antiguo (None si falla)"""
+        query = """
+        SELECT fecha, total_imagenes, primer_titulo FROM resumen_albumes
+        WHERE fecha < %s
+        ORDER BY fecha DESC
+        LIMIT %s
+        """
+        return self.db.execute_query(query, (antes, limite), fetch=True)
+    
+    def programar_imagenes(self, asignaciones, imagenes_por_album=None, lote=500):
+        """Programa muchas imágenes en una transacción: [{'imagen_id', 'fecha', 'orden_dia' opcional}].
+
+        Un UPDATE ... CASE por cada `lote` imágenes. Con `imagenes_por_album`,
+        antes de confirmar comprueba que cada fecha asignada queda con exactamente
+        ese número de imágenes activas, una por orden_dia, y que las fechas que
+        pierden imágenes quedan igual de completas o vacías; si no, deshace todo
+        y lanza ValueError. Devuelve las fechas afectadas (las nuevas y las que
+        tenían antes), para invalidar cachés y el resumen del historial.
+        """
+        ids = [asignacion['imagen_id'] for asignacion in asignaciones]
+        if not ids:
+            return set()
+
+        db = Database()
+        conexion = db.connect()
+        if conexion is None:
+            raise Error('No hay conexión con la base de datos')
+        cursor = conexion.cursor()
+        try:
+            # Bloquear las filas: dos programaciones a la vez no se pisan a medias
+            cursor.execute(
+                f"SELECT id, fecha_programada FROM imagenes WHERE id IN ({', '.join(['%s'] * len(ids))}) FOR UPDATE",
+                ids
+            )
+            anteriores = dict(cursor.fetchall())
+            faltan = [imagen_id for imagen_id in ids if imagen_id not in anteriores]
+            if faltan:
+                raise ValueError(f'No existen las imágenes {faltan}')
+
+            for inicio in range(0, len(asignaciones), lote):
+                bloque = asignaciones[inicio:inicio + lote]
+                casos_fecha = ' '.join(['WHEN %s THEN %s'] * len(bloque))
+                casos_orden = ' '.join(['WHEN %s THEN COALESCE(%s, orden_dia)'] * len(bloque))
+                params = [valor for a in bloque for valor in (a['imagen_id'], a['fecha'])]
+                params += [valor for a in bloque for valor in (a['imagen_id'], a.get('orden_dia'))]
+                params += [a['imagen_id'] for a in bloque]
+                cursor.execute(f"""
+                UPDATE imagenes
+                SET fecha_programada = CASE id {casos_fecha} END,
+                    orden_dia = CASE id {casos_orden} END
+                WHERE id IN ({', '.join(['%s'] * len(bloque))})
+                """, params)
+
+            nuevas = sorted({str(a['fecha'])[:10] for a in asignaciones})
+            vaciadas = sorted({str(fecha) for fecha in anteriores.values() if fecha} - set(nuevas))
+            if imagenes_por_album:
+                fechas = nuevas + vaciadas
+                cursor.execute(f"""
+                SELECT fecha_programada, COUNT(*), COUNT(DISTINCT orden_dia), MIN(orden_dia), MAX(orden_dia)
+                FROM imagenes
+                WHERE activa = TRUE AND fecha_programada IN ({', '.join(['%s'] * len(fechas))})
+                GROUP BY fecha_programada
+                """, fechas)
+                esperado = (imagenes_por_album, imagenes_por_album, 1, imagenes_por_album)
+                resultado = {str(fila[0]): tuple(fila[1:]) for fila in cursor.fetchall()}
+                # Sin fila: la fecha no tiene ninguna imagen activa. Vale para las
+                # que se vacían (el álbum entero se movió), no para las asignadas
+                incompletas = sorted(
+                    [fecha for fecha in nuevas if resultado.get(fecha) != esperado]
+                    + [fecha for fecha in vaciadas if fecha in resultado and resultado[fecha] != esperado]
+                )
+                if incompletas:
+                    raise ValueError(
+                        f'Estas fechas no quedarían con {imagenes_por_album} imágenes (orden_dia 1 a '
+                        f'{imagenes_por_album}): {", ".join(incompletas)}'
+                    )
+
+            conexion.commit()
+            return set(nuevas) | set(vaciadas)
+        except Exception:
+            conexion.rollback()
+            raise
+        finally:
+            cursor.close()
+            db.close()
+    
+    def get_albumes_sin_programar(self, imagenes_por_album, limite):
+        """Álbumes completos sin fecha (imágenes activas agrupadas por título), los más antiguos primero"""
+        query = """
+        SELECT titulo, GROUP_CONCAT(id ORDER BY orden_dia) AS ids FROM imagenes
+        WHERE activa = TRUE AND fecha_programada IS NULL
+        GROUP BY titulo
+        HAVING COUNT(*) = %s AND COUNT(DISTINCT orden_dia) = %s AND MIN(orden_dia) = 1 AND MAX(orden_dia) = %s
+        ORDER BY MIN(id)
+        LIMIT %s
+        """
+        result = self.db.execute_query(
+            query, (imagenes_por_album, imagenes_por_album, imagenes_por_album, limite), fetch=True
+        )
+        if result is None:
+            raise Error('No se pudieron consultar los álbumes sin programar')
+        albumes = []
+        for fila in result:
+            ids = fila['ids']
+            if isinstance(ids, (bytes, bytearray)):
+                ids = ids.decode('ascii')
+            albumes.append({'titulo': fila['titulo'], 'ids': [int(imagen_id) for imagen_id in ids.split(',')]})
+        return albumes
     
     def programar_imagen(self, imagen_id, fecha):
         """Programa una imagen para una fecha específica"""
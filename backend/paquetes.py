@@ -0,0 +1,69 @@
+"""Paquete con todas las imágenes de un álbum en una sola respuesta.
+
+Formato del cuerpo (application/octet-stream):
+  4 bytes   longitud N del índice (entero sin signo, big-endian)
+  N bytes   índice JSON: [{"id", "tipo", "bytes"}, ...] en el orden del álbum
+  resto     el contenido de cada imagen, una detrás de otra
+
+El cliente corta el cuerpo con los tamaños del índice y crea un Blob por
+imagen, así que descubrir una pista ya no cuesta otra petición.
+"""
+import hashlib
+import json
+import mimetypes
+import os
+import struct
+
+TAMANO_BLOQUE = 64 * 1024
+TIPO_PAQUETE = 'application/octet-stream'
+
+
+def partes_del_paquete(carpeta, archivos):
+    """Ruta, tipo MIME, tamaño y mtime de cada archivo (relativo a la carpeta)"""
+    partes = []
+    for archivo in archivos:
+        ruta = os.path.join(carpeta, archivo)
+        estado = os.stat(ruta)
+        partes.append({
+            'archivo': archivo,
+            'ruta': ruta,
+            'tipo': mimetypes.guess_type(archivo)[0] or 'application/octet-stream',
+            'bytes': estado.st_size,
+            'mtime': estado.st_mtime_ns,
+        })
+    return partes
+
+
+def etag_paquete(etag_album, partes):
+    """ETag del paquete sin leer las imágenes: álbum + archivos elegidos tal y como están en disco"""
+    huella = hashlib.sha1(etag_album.encode('utf-8'))
+    for parte in partes:
+        huella.update(f"|{parte['archivo']}:{parte['bytes']}:{parte['mtime']}".encode('utf-8'))
+    return huella.hexdigest()
+
+
+def cabecera_paquete(ids, partes):
+    indice = json.dumps(
+        [{'id': id_imagen, 'tipo': parte['tipo'], 'bytes': parte['bytes']} for id_imagen, parte in zip(ids, partes)],
+        separators=(',', ':')
+    ).encode('utf-8')
+    return struct.pack('>I', len(indice)) + indice
+
+
+def tamano_paquete(cabecera, partes):
+    return len(cabecera) + sum(parte['bytes'] for parte in partes)
+
+
+def generar_paquete(cabecera, partes):
+    """Genera el cuerpo por bloques, sin cargar las imágenes enteras en memoria"""
+    yield cabecera
+    for parte in partes:
+        # Leer exactamente los bytes anunciados en el índice
+        restante = parte['bytes']
+        with open(parte['ruta'], 'rb') as f:
+            while restante > 0:
+                bloque = f.read(min(TAMANO_BLOQUE, restante))
+                if not bloque:
+                    raise IOError(f"{parte['archivo']} cambió mientras se enviaba el paquete")
+                restante -= len(bloque)
+                yield bloque
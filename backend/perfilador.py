@@ -0,0 +1,301 @@
+"""Perfilador de consultas SQL.
+
+Se engancha a database.observar_consultas, así que ve todas las sentencias:
+las de Database.execute_query y las de los cursores que se abren a mano.
+Por cada sentencia normalizada (literales y listas de parámetros
+sustituidos por `?`) acumula veces, tiempo total y máximo, y filas; guarda
+las N ejecuciones más lentas, con la forma de los parámetros (nunca sus
+valores) y la ruta que las lanzó; y, opcionalmente, el EXPLAIN de los
+SELECT que superan un umbral, ejecutado en segundo plano una vez por
+sentencia. Al terminar cada petición marca como posible N+1 el SELECT que
+se repitió PERFILADOR_UMBRAL_N_MAS_1 veces o más.
+
+Se activa con PERFILADOR_ACTIVO=true. El informe se consulta en
+GET /api/debug/perfil (DELETE lo reinicia), con la cabecera X-Debug-Token
+igual a PERFILADOR_TOKEN; sin token la ruta no se publica (detrás de un
+proxy local todas las peticiones llegan desde 127.0.0.1). También con:
+
+    python perfilador.py [--url http://localhost:5000] [--token ...] [--reiniciar]
+"""
+import argparse
+import heapq
+import hmac
+import json
+import logging
+import re
+import sys
+import threading
+from collections import Counter, deque
+from datetime import datetime
+from config import Config
+
+log = logging.getLogger(__name__)
+
+_ESPACIOS = re.compile(r'\s+')
+_CADENAS = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"")
+_NUMEROS = re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?\b')
+_MARCADORES = re.compile(r'%\(\w+\)s|%s')
+_LISTAS = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_VALORES = re.compile(r'(VALUES\s*\(\.\.\.\))(?:\s*,\s*\(\.\.\.\))+', re.IGNORECASE)
+
+
+def normalizar(sentencia):
+    """Forma canónica de una sentencia: misma cadena para la misma consulta con otros valores"""
+    if isinstance(sentencia, (bytes, bytearray)):
+        sentencia = sentencia.decode('utf-8', 'replace')
+    sentencia = _ESPACIOS.sub(' ', str(sentencia)).strip()
+    sentencia = _CADENAS.sub('?', sentencia)
+    sentencia = _MARCADORES.sub('?', sentencia)
+    sentencia = _NUMEROS.sub('?', sentencia)
+    sentencia = _LISTAS.sub('(...)', sentencia)
+    return _VALORES.sub(r'\1', sentencia)
+
+
+def forma_parametros(params):
+    """Tipos de los parámetros, sin sus valores: ('str', 'int'), 500x('str', 'int')..."""
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {clave: type(valor).__name__ for clave, valor in params.items()}
+    if isinstance(params, list) and params and isinstance(params[0], (tuple, list, dict)):
+        # executemany: una forma por lote
+        return f"{len(params)}x{forma_parametros(params[0])}"
+    return '(' + ', '.join(type(valor).__name__ for valor in params) + ')'
+
+
+class Perfilador:
+    def __init__(self, max_lentas=20, umbral_lenta=0.1, umbral_n_mas_1=5, explain=False, umbral_explain=0.25):
+        self._max_lentas = max_lentas
+        self._umbral_lenta = umbral_lenta
+        self._umbral_n_mas_1 = umbral_n_mas_1
+        self._explain = explain
+        self._umbral_explain = umbral_explain
+        self._lock = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        with self._lock:
+            self._sentencias = {}     # normalizada -> acumulados
+            self._lentas = []         # min-heap (segundos, n, ejecución)
+            self._n_mas_1 = deque(maxlen=50)
+            self._explains = {}       # normalizada -> filas del EXPLAIN (o error)
+            self._secuencia = 0
+            self._desde = datetime.now().isoformat(timespec='seconds')
+
+    # -- Observación ---------------------------------------------------------
+
+    def observar(self, sentencia, segundos, params=None, filas=None, ruta=None):
+        normalizada = normalizar(sentencia)
+        if normalizada.upper().startswith('EXPLAIN'):
+            return normalizada
+
+        with self._lock:
+            datos = self._sentencias.get(normalizada)
+            if datos is None:
+                datos = self._sentencias[normalizada] = {
+                    'veces': 0, 'segundos': 0.0, 'max_segundos': 0.0, 'filas': 0, 'rutas': Counter()
+                }
+            datos['veces'] += 1
+            datos['segundos'] += segundos
+            datos['max_segundos'] = max(datos['max_segundos'], segundos)
+            datos['filas'] += filas or 0
+            if ruta:
+                datos['rutas'][ruta] += 1
+
+            if segundos >= self._umbral_lenta:
+                self._secuencia += 1
+                ejecucion = {
+                    'sentencia': normalizada,
+                    'segundos': round(segundos, 6),
+                    'parametros': forma_parametros(params),
+                    'filas': filas,
+                    'ruta': ruta,
+                    'momento': datetime.now().isoformat(timespec='seconds'),
+                }
+                elemento = (segundos, self._secuencia, ejecucion)
+                if len(self._lentas) < self._max_lentas:
+                    heapq.heappush(self._lentas, elemento)
+                elif segundos > self._lentas[0][0]:
+                    heapq.heapreplace(self._lentas, elemento)
+
+            lanzar_explain = (
+                self._explain and segundos >= self._umbral_explain
+                and normalizada.upper().startswith('SELECT') and normalizada not in self._explains
+            )
+            if lanzar_explain:
+                self._explains[normalizada] = None  # reservado: no lanzarlo dos veces
+
+        if lanzar_explain:
+            threading.Thread(
+                target=self._ejecutar_explain, args=(normalizada, sentencia, params),
+                name='perfilador-explain', daemon=True
+            ).start()
+        return normalizada
+
+    def fin_de_peticion(self, ruta, consultas):
+        """`consultas`: Counter normalizada -> veces en la petición. Marca los posibles N+1"""
+        for normalizada, veces in consultas.items():
+            if veces >= self._umbral_n_mas_1 and normalizada.upper().startswith('SELECT'):
+                aviso = {
+                    'ruta': ruta,
+                    'sentencia': normalizada,
+                    'veces': veces,
+                    'momento': datetime.now().isoformat(timespec='seconds'),
+                }
+                with self._lock:
+                    self._n_mas_1.append(aviso)
+                log.warning("Posible N+1: la misma consulta se repite en una petición", extra=aviso)
+
+    def _ejecutar_explain(self, normalizada, sentencia, params):
+        from database import obtener_conexion, devolver_conexion
+
+        try:
+            conexion = obtener_conexion()
+            try:
+                cursor = conexion.cursor(dictionary=True)
+                try:
+                    cursor.execute('EXPLAIN ' + sentencia, params or ())
+                    resultado = cursor.fetchall()
+                finally:
+                    cursor.close()
+            finally:
+                devolver_conexion(conexion)
+        except Exception as e:
+            resultado = {'error': str(e)}
+        with self._lock:
+            self._explains[normalizada] = resultado
+
+    # -- Informe -------------------------------------------------------------
+
+    def informe(self, limite=20):
+        with self._lock:
+            sentencias = [
+                {
+                    'sentencia': normalizada,
+                    'veces': datos['veces'],
+                    'segundos_total': round(datos['segundos'], 6),
+                    'media_ms': round(datos['segundos'] / datos['veces'] * 1000, 3),
+                    'max_ms': round(datos['max_segundos'] * 1000, 3),
+                    'filas_media': round(datos['filas'] / datos['veces'], 1),
+                    'rutas': dict(datos['rutas'].most_common(5)),
+                }
+                for normalizada, datos in self._sentencias.items()
+            ]
+            lentas = [ejecucion for _, _, ejecucion in sorted(self._lentas, reverse=True)]
+            n_mas_1 = list(self._n_mas_1)
+            explains = {normalizada: filas for normalizada, filas in self._explains.items() if filas is not None}
+            desde = self._desde
+
+        sentencias.sort(key=lambda datos: datos['segundos_total'], reverse=True)
+        return {
+            'desde': desde,
+            'umbral_lenta_ms': round(self._umbral_lenta * 1000, 3),
+            'sentencias': sentencias[:limite],
+            'total_sentencias': len(sentencias),
+            'lentas': lentas,
+            'n_mas_1': n_mas_1,
+            'explain': explains,
+        }
+
+
+perfilador = Perfilador(
+    max_lentas=Config.PERFILADOR_LENTAS,
+    umbral_lenta=Config.PERFILADOR_UMBRAL_LENTA_MS / 1000,
+    umbral_n_mas_1=Config.PERFILADOR_UMBRAL_N_MAS_1,
+    explain=Config.PERFILADOR_EXPLAIN,
+    umbral_explain=Config.PERFILADOR_UMBRAL_EXPLAIN_MS / 1000,
+)
+
+
+def instrumentar(app, ruta='/api/debug/perfil'):
+    """Perfila las consultas de `app` y publica el informe en `ruta`"""
+    from flask import abort, g, has_app_context, jsonify, request
+    from database import observar_consultas
+
+    def observar(sentencia, segundos, params=None, filas=None):
+        ruta_peticion = None
+        en_peticion = has_app_context() and '_perfil_consultas' in g
+        if en_peticion:
+            ruta_peticion = request.url_rule.rule if request.url_rule is not None else 'sin_ruta'
+        normalizada = perfilador.observar(sentencia, segundos, params, filas, ruta_peticion)
+        if en_peticion:
+            g._perfil_consultas[normalizada] += 1
+
+    def antes_de_peticion():
+        g._perfil_consultas = Counter()
+
+    def al_terminar_peticion(exception=None):
+        consultas = g.pop('_perfil_consultas', None)
+        if consultas:
+            perfilador.fin_de_peticion(
+                request.url_rule.rule if request.url_rule is not None else 'sin_ruta', consultas
+            )
+
+    app.before_request(antes_de_peticion)
+    app.teardown_request(al_terminar_peticion)
+    observar_consultas(observar)
+
+    if not Config.PERFILADOR_TOKEN:
+        log.warning("PERFILADOR_TOKEN vacío: se perfila pero %s no se publica", ruta)
+        return perfilador
+    token = Config.PERFILADOR_TOKEN.encode('utf-8')
+
+    @app.route(ruta, methods=['GET', 'DELETE'])
+    def informe_perfil():
+        # Comparación en tiempo constante: no dar pistas del token por la latencia
+        if not hmac.compare_digest(request.headers.get('X-Debug-Token', '').encode('utf-8'), token):
+            abort(403)
+
+        if request.method == 'DELETE':
+            perfilador.reiniciar()
+            return jsonify({'success': True, 'message': 'Perfil reiniciado'})
+        return jsonify({'success': True, 'perfil': perfilador.informe(request.args.get('limite', 20, type=int))})
+
+    return perfilador
+
+
+def imprimir_informe(perfil, salida=sys.stdout):
+    print(f"Consultas desde {perfil['desde']} ({perfil['total_sentencias']} sentencias distintas)", file=salida)
+    print("\nPor tiempo total:", file=salida)
+    for datos in perfil['sentencias']:
+        print(f"  {datos['segundos_total'] * 1000:9.1f} ms  {datos['veces']:6d}x  media {datos['media_ms']:.2f} ms"
+              f"  max {datos['max_ms']:.2f} ms  {datos['filas_media']} filas", file=salida)
+        print(f"      {datos['sentencia'][:160]}", file=salida)
+    print(f"\nMás lentas (>= {perfil['umbral_lenta_ms']} ms):", file=salida)
+    for ejecucion in perfil['lentas']:
+        print(f"  {ejecucion['segundos'] * 1000:9.1f} ms  {ejecucion['ruta'] or '-'}  {ejecucion['parametros']}"
+              f"  {ejecucion['sentencia'][:120]}", file=salida)
+    print("\nPosibles N+1:", file=salida)
+    for aviso in perfil['n_mas_1']:
+        print(f"  {aviso['veces']:4d}x  {aviso['ruta']}  {aviso['sentencia'][:120]}", file=salida)
+    for normalizada, filas in perfil['explain'].items():
+        print(f"\nEXPLAIN {normalizada[:120]}", file=salida)
+        print(json.dumps(filas, ensure_ascii=False, indent=2, default=str), file=salida)
+
+
+def main(argv):
+    from urllib.request import Request, urlopen
+
+    parser = argparse.ArgumentParser(description='Informe del perfilador de consultas de un servidor en marcha')
+    parser.add_argument('--url', default=Config.BASE_URL, help='URL base del servidor')
+    parser.add_argument('--token', default=Config.PERFILADOR_TOKEN, help='valor de X-Debug-Token')
+    parser.add_argument('--limite', type=int, default=20, help='sentencias a mostrar')
+    parser.add_argument('--reiniciar', action='store_true', help='vaciar el perfil después de mostrarlo')
+    parser.add_argument('--json', action='store_true', help='imprimir el informe en JSON')
+    args = parser.parse_args(argv)
+
+    cabeceras = {'X-Debug-Token': args.token} if args.token else {}
+    url = f"{args.url.rstrip('/')}/api/debug/perfil"
+    with urlopen(Request(f"{url}?limite={args.limite}", headers=cabeceras), timeout=10) as respuesta:
+        perfil = json.load(respuesta)['perfil']
+    if args.json:
+        print(json.dumps(perfil, ensure_ascii=False, indent=2))
+    else:
+        imprimir_informe(perfil)
+    if args.reiniciar:
+        urlopen(Request(url, headers=cabeceras, method='DELETE'), timeout=10).close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,109 @@
+"""Programación automática de los próximos días.
+
+Uso: python planificador.py [--dias N] [--desde YYYY-MM-DD] [--dry-run]
+
+Rellena cada día libre entre `desde` (hoy por defecto) y los N siguientes con
+un álbum completo sin programar: seis imágenes activas con el mismo título y
+orden_dia 1 a 6, como las deja importacion.py cuando el manifiesto no trae
+fecha. Los álbumes salen por orden de llegada. Todo se programa con
+ImagenModel.programar_imagenes, en una transacción que comprueba que cada
+día queda con exactamente seis pistas.
+
+Los días que ya tienen imágenes no se tocan; si no son un álbum completo
+salen en 'incompletos' para arreglarlos a mano. Volver a ejecutarlo con los
+mismos datos no cambia nada, así que varios workers pueden lanzarlo a la vez.
+"""
+import argparse
+import logging
+import sys
+from datetime import date, timedelta
+from config import Config
+
+log = logging.getLogger(__name__)
+
+
+def planificar(dias, desde=None, modelo=None, guardar=True, calentar=None, dias_calentar=None):
+    """Programa los días libres de [desde, desde + dias) y devuelve un resumen.
+
+    `calentar(fecha)` se llama con cada uno de los primeros `dias_calentar`
+    días que queda con álbum completo (los recién programados y los que ya lo
+    estaban), para cargarlo en caché sin desplazar lo que hay en ella.
+    """
+    if modelo is None:
+        from models import ImagenModel
+        modelo = ImagenModel()
+
+    imagenes_por_album = Config.ALBUM_IMAGENES
+    desde = desde or date.today()
+    fechas = [desde + timedelta(days=dia) for dia in range(dias)]
+    totales = modelo.get_totales_albumes(fechas) if fechas else {}
+    if totales is None:
+        raise RuntimeError('No se pudo leer qué días están programados')
+    totales = {str(fecha)[:10]: total for fecha, total in totales.items()}
+
+    libres = [fecha for fecha in fechas if not totales.get(fecha.isoformat())]
+    incompletos = [
+        fecha.isoformat() for fecha in fechas
+        if totales.get(fecha.isoformat()) and totales[fecha.isoformat()] != imagenes_por_album
+    ]
+    albumes = modelo.get_albumes_sin_programar(imagenes_por_album, len(libres)) if libres else []
+
+    programados = [
+        {'fecha': fecha.isoformat(), 'titulo': album['titulo'], 'ids': album['ids']}
+        for fecha, album in zip(libres, albumes)
+    ]
+    if guardar and programados:
+        asignaciones = [
+            {'imagen_id': imagen_id, 'fecha': programado['fecha'], 'orden_dia': orden}
+            for programado in programados
+            for orden, imagen_id in enumerate(programado['ids'], start=1)
+        ]
+        modelo.programar_imagenes(
+            asignaciones, imagenes_por_album=imagenes_por_album, lote=Config.PROGRAMACION_LOTE
+        )
+        try:
+            modelo.actualizar_resumen(programado['fecha'] for programado in programados)
+        except Exception as e:
+            log.warning("No se pudo actualizar el resumen del historial: %s", e)
+        log.info("Días programados", extra={
+            'desde': desde, 'dias': dias, 'programados': len(programados)
+        })
+
+    if calentar and guardar:
+        completos = {programado['fecha'] for programado in programados}
+        completos.update(fecha for fecha, total in totales.items() if total == imagenes_por_album)
+        limite = (desde + timedelta(days=dias_calentar or Config.PLANIFICADOR_CALENTAR)).isoformat()
+        for fecha in sorted(fecha for fecha in completos if fecha < limite):
+            try:
+                calentar(date.fromisoformat(fecha))
+            except Exception as e:
+                log.warning("No se pudo precargar el álbum de %s: %s", fecha, e)
+
+    return {
+        'programados': [{'fecha': p['fecha'], 'titulo': p['titulo']} for p in programados],
+        'sin_album': [fecha.isoformat() for fecha in libres[len(programados):]],
+        'incompletos': incompletos,
+    }
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dias', type=int, default=30, help='días a cubrir desde --desde')
+    parser.add_argument('--desde', type=date.fromisoformat, help='primer día (hoy por defecto)')
+    parser.add_argument('--dry-run', action='store_true', help='mostrar el plan sin guardarlo')
+    args = parser.parse_args(argv)
+
+    resumen = planificar(args.dias, args.desde, guardar=not args.dry_run)
+    for programado in resumen['programados']:
+        print(f"  {programado['fecha']}  {programado['titulo']}")
+    print(f"{len(resumen['programados'])} días programados"
+          f"{' (dry-run: no se guardó nada)' if args.dry_run else ''}")
+    if resumen['sin_album']:
+        print(f"Sin álbumes para {len(resumen['sin_album'])} días: {', '.join(resumen['sin_album'])}")
+    for fecha in resumen['incompletos']:
+        print(f"  ✗ {fecha}: no tiene {Config.ALBUM_IMAGENES} imágenes")
+    return 1 if resumen['incompletos'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,210 @@
+"""Genera las variantes optimizadas de todo lo que ya hay en uploads/.
+
+Uso: python recodificar_uploads.py [--procesos N] [--sin-bd] [--forzar]
+
+Recorre la tabla imagenes y la carpeta de uploads, reparte el trabajo en un
+pool de procesos y va guardando uploads/variantes/manifest.json. Si se
+interrumpe, al volver a lanzarlo salta los archivos que ya están en el
+manifiesto con el mismo tamaño y fecha y con todas sus variantes en disco.
+También calcula dimensiones y previsualización (LQIP) de cada imagen; a
+los archivos procesados antes de existir la previsualización solo se les
+calcula esta.
+
+La tabla imagenes se actualiza por lotes justo antes de cada escritura del
+manifiesto, así que nada queda en el manifiesto sin estar en la BD. Además,
+en cada ejecución se registran los archivos del manifiesto cuyas filas aún
+no tienen variantes o previsualización (de una ejecución interrumpida o
+que falló al escribir en la BD).
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from config import Config
+from imagenes_derivadas import CARPETA_VARIANTES, generar_variantes, calcular_previa, formatos_disponibles
+
+EXTENSIONES = tuple(f".{ext}" for ext in Config.ALLOWED_EXTENSIONS)
+GUARDAR_CADA = 25  # archivos procesados entre escrituras del manifiesto
+
+
+def ruta_manifiesto(carpeta):
+    return os.path.join(carpeta, CARPETA_VARIANTES, 'manifest.json')
+
+
+def cargar_manifiesto(carpeta):
+    try:
+        with open(ruta_manifiesto(carpeta), encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def guardar_manifiesto(carpeta, manifiesto):
+    ruta = ruta_manifiesto(carpeta)
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    temporal = f"{ruta}.tmp"
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(manifiesto, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(temporal, ruta)
+
+
+def esta_al_dia(carpeta, archivo, entrada):
+    """True si el manifiesto ya cubre el archivo tal y como está en disco"""
+    if not entrada:
+        return False
+    estado = os.stat(os.path.join(carpeta, archivo))
+    if entrada.get('bytes') != estado.st_size or entrada.get('mtime') != int(estado.st_mtime):
+        return False
+    return all(os.path.exists(os.path.join(carpeta, v['archivo'])) for v in entrada['variantes'])
+
+
+def procesar(carpeta, archivo, anchos, formatos, calidad, entrada=None):
+    """Trabajo de cada proceso: hash del original, variantes y previsualización.
+
+    Si se pasa la `entrada` del manifiesto (variantes ya al día), solo se
+    calcula la previsualización.
+    """
+    ruta = os.path.join(carpeta, archivo)
+    if entrada is not None:
+        return archivo, dict(entrada, previa=calcular_previa(ruta))
+
+    sha256 = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(1024 * 1024), b''):
+            sha256.update(bloque)
+
+    variantes = generar_variantes(ruta, carpeta, anchos, formatos, calidad=calidad)
+    for variante in variantes:
+        with open(os.path.join(carpeta, variante['archivo']), 'rb') as f:
+            variante['sha256'] = hashlib.sha256(f.read()).hexdigest()
+
+    estado = os.stat(ruta)
+    return archivo, {
+        'sha256': sha256.hexdigest(),
+        'bytes': estado.st_size,
+        'mtime': int(estado.st_mtime),
+        'variantes': variantes,
+        'previa': calcular_previa(ruta),
+    }
+
+
+def archivos_a_procesar(carpeta, usar_bd):
+    """Archivos referenciados en imagenes más los sueltos de la carpeta"""
+    archivos = set()
+    if usar_bd:
+        from database import Database
+        filas = Database().execute_query("SELECT DISTINCT ruta_archivo FROM imagenes", fetch=True)
+        if filas is None:
+            raise SystemExit("No se pudo leer la tabla imagenes (usa --sin-bd para solo la carpeta)")
+        archivos.update(os.path.basename(f['ruta_archivo']) for f in filas if f['ruta_archivo'])
+    archivos.update(
+        nombre for nombre in os.listdir(carpeta)
+        if nombre.lower().endswith(EXTENSIONES) and os.path.isfile(os.path.join(carpeta, nombre))
+    )
+    return sorted(a for a in archivos if os.path.isfile(os.path.join(carpeta, a)))
+
+
+def archivos_sin_registrar():
+    """Archivos con alguna fila de imagenes sin variantes o sin previsualización"""
+    from database import Database
+    filas = Database().execute_query(
+        "SELECT DISTINCT ruta_archivo FROM imagenes WHERE variantes IS NULL OR previa IS NULL", fetch=True
+    )
+    if filas is None:
+        raise SystemExit("No se pudo leer la tabla imagenes (usa --sin-bd para solo la carpeta)")
+    return {os.path.basename(f['ruta_archivo']) for f in filas if f['ruta_archivo']}
+
+
+def registrar_en_bd(modelo, manifiesto, archivos):
+    """Guarda variantes y previsualización de `archivos` en la tabla imagenes"""
+    for archivo in archivos:
+        modelo.guardar_variantes(archivo, manifiesto[archivo]['variantes'])
+        if manifiesto[archivo].get('previa'):
+            modelo.guardar_previa(archivo, manifiesto[archivo]['previa'])
+
+
+def bytes_servidos(entrada):
+    """Bytes que descarga un navegador con WebP al pedir la imagen sin ancho"""
+    webp = [v for v in entrada['variantes'] if v['formato'] == 'webp']
+    return max(webp, key=lambda v: v['ancho'])['bytes'] if webp else entrada['bytes']
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--procesos', type=int, default=os.cpu_count() or 2)
+    parser.add_argument('--sin-bd', action='store_true', help='no leer ni actualizar la tabla imagenes')
+    parser.add_argument('--forzar', action='store_true', help='regenerar aunque ya estén en el manifiesto')
+    args = parser.parse_args(argv)
+
+    carpeta = os.path.abspath(Config.UPLOAD_FOLDER)
+    formatos = formatos_disponibles(Config.VARIANTES_AVIF)
+    manifiesto = {} if args.forzar else cargar_manifiesto(carpeta)
+
+    archivos = archivos_a_procesar(carpeta, not args.sin_bd)
+    # archivo -> None (procesar entero) o su entrada (solo falta la previsualización)
+    trabajos = {}
+    for archivo in archivos:
+        entrada = manifiesto.get(archivo)
+        if not esta_al_dia(carpeta, archivo, entrada):
+            trabajos[archivo] = None
+        elif 'previa' not in entrada:
+            trabajos[archivo] = entrada
+    pendientes = list(trabajos)
+    print(f"{len(archivos)} archivos, {len(pendientes)} pendientes ({args.procesos} procesos)")
+
+    modelo = None
+    por_registrar = []  # procesados cuyo resultado aún no está en la BD
+    if not args.sin_bd:
+        from models import ImagenModel
+        modelo = ImagenModel()
+        # Al día en el manifiesto pero no en la BD (p. ej. una ejecución interrumpida)
+        sin_registrar = archivos_sin_registrar()
+        por_registrar = [a for a in archivos if a in sin_registrar and a not in trabajos and a in manifiesto]
+        if por_registrar:
+            print(f"{len(por_registrar)} archivos del manifiesto sin registrar en la BD")
+
+    def guardar():
+        # Primero la BD: el manifiesto nunca da por hecho algo que no está registrado
+        if modelo is not None and por_registrar:
+            registrar_en_bd(modelo, manifiesto, por_registrar)
+            por_registrar.clear()
+        guardar_manifiesto(carpeta, manifiesto)
+
+    inicio = time.monotonic()
+    hechos, errores = [], 0
+    with ProcessPoolExecutor(max_workers=args.procesos) as pool:
+        futuros = {
+            pool.submit(
+                procesar, carpeta, archivo, Config.VARIANTES_ANCHOS, formatos, Config.VARIANTES_CALIDAD, entrada
+            ): archivo
+            for archivo, entrada in trabajos.items()
+        }
+        for i, futuro in enumerate(as_completed(futuros), 1):
+            try:
+                archivo, entrada = futuro.result()
+            except Exception as e:
+                errores += 1
+                print(f"  ✗ {futuros[futuro]}: {e}")
+                continue
+            manifiesto[archivo] = entrada
+            hechos.append(archivo)
+            por_registrar.append(archivo)
+            if i % GUARDAR_CADA == 0:
+                guardar()
+                print(f"  {i}/{len(pendientes)}")
+    guardar()
+
+    total_original = sum(manifiesto[a]['bytes'] for a in archivos if a in manifiesto)
+    total_servido = sum(bytes_servidos(manifiesto[a]) for a in archivos if a in manifiesto)
+    ahorro = total_original - total_servido
+    print(f"Procesados {len(hechos)} en {time.monotonic() - inicio:.1f}s, {errores} errores")
+    print(f"Originales: {total_original / 1e6:.1f} MB -> WebP a tamaño completo: {total_servido / 1e6:.1f} MB "
+          f"(ahorro {ahorro / 1e6:.1f} MB, {100 * ahorro / total_original if total_original else 0:.0f}%)")
+    return 1 if errores else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,505 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from mysql.connector import DataError, Error, IntegrityError, ProgrammingError
+from database import Database
+
+log = logging.getLogger(__name__)
+
+COLUMNAS_ESTADISTICAS = (
+    'total_jugadores', 'aciertos', 'fallos', 'total_intentos',
+    'aciertos_intento_1', 'aciertos_intento_2', 'aciertos_intento_3',
+    'aciertos_intento_4', 'aciertos_intento_5'
+)
+# Errores que no se arreglan reintentando el mismo lote: hay que aislar la partida que los causa
+ERRORES_PERMANENTES = (IntegrityError, DataError, ProgrammingError)
+
+
+def deltas_estadisticas(acierto, intentos):
+    """Incrementos de estadisticas_album que produce la primera partida de un jugador"""
+    deltas = Counter(total_jugadores=1, total_intentos=intentos)
+    if acierto:
+        deltas['aciertos'] = 1
+        deltas[f'aciertos_intento_{intentos}'] = 1
+    else:
+        deltas['fallos'] = 1
+    return deltas
+
+
+class RegistroIntentos:
+    """Registro write-behind de las partidas terminadas.
+
+    La petición solo comprueba si es la primera partida del jugador (una
+    lectura por clave, sumando las partidas que aún están en la cola) y
+    encola el intento. Un hilo en segundo plano agrupa la cola cada
+    `intervalo` segundos y la persiste en una sola transacción: INSERT de
+    varias filas para los jugadores nuevos, UPDATE por lotes para los que
+    repiten y un único INSERT ... ON DUPLICATE KEY UPDATE con los incrementos
+    de estadisticas_album sumados por álbum.
+
+    Mientras un intento no se ha escrito, sus incrementos se guardan en
+    memoria y se suman al leer las estadísticas, así que las respuestas
+    siguen siendo exactas para este proceso. Con `en_vivo` las lecturas de
+    estadísticas salen de memoria y solo van a MySQL para reconciliar. Si la cola está llena la
+    petición escribe directamente (no se pierden partidas). Con varios
+    workers, una "primera partida" cuya fila ya escribió otro se suma como
+    repetida y no vuelve a contar en estadisticas_album.
+
+    Si MySQL rechaza un lote por un error que no es de conexión, el lote se
+    parte en dos hasta aislar las partidas culpables, que se descartan (y se
+    registran en el log) para no bloquear la cola.
+    """
+
+    def __init__(self, max_cola=10000, intervalo=0.5, max_lote=500, activo=True, en_vivo=None):
+        self._cola = queue.Queue(maxsize=max_cola)
+        self._intervalo = intervalo
+        self._max_lote = max_lote
+        self._activo = activo
+        self._en_vivo = en_vivo  # EstadisticasEnVivo opcional para servir lecturas
+        self._lock = threading.Lock()
+        # Un lock por franja de jugadores para que dos peticiones del mismo
+        # jugador no se consideren ambas "primera vez"
+        self._locks_jugador = [threading.Lock() for _ in range(64)]
+        self._pendientes_jugador = {}    # (hash, fecha, numero) -> partidas sin escribir
+        self._pendientes_album = {}      # (fecha, numero) -> Counter de incrementos
+        self._primeras_pendientes = {}   # (hash, fecha, numero) -> primera partida sin escribir
+        # Contador tipo seqlock: impar mientras un lote pasa de memoria a BD
+        self._generacion = 0
+        self._hilo = None
+        self._pid = None
+        self._atexit_registrado = False
+        self._detener = threading.Event()
+        self.lotes_escritos = 0
+        self.intentos_escritos = 0
+        self.escrituras_directas = 0
+        self.intentos_descartados = 0
+
+    # -- Petición --------------------------------------------------------
+
+    def registrar(self, user_id_hash, fecha_album, numero_album, acierto, intentos):
+        """Encola una partida y devuelve (es_primera_vez, veces_jugado)"""
+        # Fuera de rango dejaría en memoria una columna que no existe (aciertos_intento_0)
+        if not (1 <= intentos <= 5 if acierto else intentos == 6):
+            raise ValueError(f'intentos no válido: {intentos}')
+        clave = (user_id_hash, str(fecha_album), int(numero_album))
+
+        with self._locks_jugador[hash(clave) % len(self._locks_jugador)]:
+            with self._lock:
+                pendientes = self._pendientes_jugador.get(clave, 0)
+
+            veces_previas = self._veces_jugado_en_bd(clave) + pendientes
+            es_primera_vez = veces_previas == 0
+
+            evento = {
+                'clave': clave,
+                'acierto': bool(acierto),
+                'intentos': intentos,
+                'primera_vez': es_primera_vez,
+            }
+            with self._lock:
+                self._pendientes_jugador[clave] = self._pendientes_jugador.get(clave, 0) + 1
+                if es_primera_vez:
+                    self._primeras_pendientes[clave] = evento
+                    album = clave[1:]
+                    deltas = deltas_estadisticas(evento['acierto'], intentos)
+                    self._pendientes_album.setdefault(album, Counter()).update(deltas)
+                    if self._en_vivo is not None:
+                        self._en_vivo.sumar(album, deltas)
+
+        try:
+            self._encolar(evento)
+        except Exception:
+            # La escritura directa falló: la partida no está ni en la cola ni en BD
+            self._quitar_pendientes([evento], descartar=True)
+            raise
+        return es_primera_vez, veces_previas + 1
+
+    def mi_intento(self, user_id_hash, fecha_album, numero_album, fila):
+        """`fila` de CONSULTA_MI_INTENTO (o None) con las partidas del jugador que siguen en la cola"""
+        clave = (user_id_hash, str(fecha_album), int(numero_album))
+        with self._lock:
+            veces = self._pendientes_jugador.get(clave, 0)
+            primera = self._primeras_pendientes.get(clave)
+        return self._con_pendientes(fila, veces, primera)
+
+    def mis_intentos(self, user_id_hash, desde, hasta, filas):
+        """`filas` de CONSULTA_MIS_INTENTOS con las partidas del jugador que siguen en la cola"""
+        desde, hasta = str(desde), str(hasta)
+        with self._lock:
+            pendientes = {
+                clave[1:]: (veces, self._primeras_pendientes.get(clave))
+                for clave, veces in self._pendientes_jugador.items()
+                if clave[0] == user_id_hash and desde <= clave[1] <= hasta
+            }
+        if not pendientes:
+            return filas
+        por_album = {(str(fila['fecha_album']), int(fila['numero_album'])): fila for fila in filas}
+        for album, (veces, primera) in pendientes.items():
+            fila = self._con_pendientes(por_album.get(album), veces, primera)
+            if fila is not None:
+                por_album[album] = dict(fila, fecha_album=album[0], numero_album=album[1])
+        return [por_album[album] for album in sorted(por_album)]
+
+    @staticmethod
+    def _con_pendientes(fila, veces, primera):
+        if not veces:
+            return fila
+        if fila is not None:
+            return dict(fila, veces_jugado=fila['veces_jugado'] + veces)
+        if primera is None:
+            # Se escribió después de leer la fila: no hay con qué rellenarla
+            return None
+        return {
+            'acierto': primera['acierto'],
+            'intentos_necesarios': primera['intentos'],
+            'veces_jugado': veces,
+            'es_primera_vez': True,
+            'created_at': None,
+            'updated_at': None,
+        }
+
+    def estadisticas_en_vivo(self, fecha_album, numero_album):
+        """Estadísticas si están en memoria y recientes, o None (nunca va a la BD)"""
+        if self._en_vivo is None:
+            return None
+        with self._lock:
+            return self._en_vivo.obtener((str(fecha_album), int(numero_album)))
+
+    def estadisticas(self, fecha_album, numero_album):
+        """Estadísticas del álbum: de memoria si está reciente, si no BD + pendientes"""
+        album = (str(fecha_album), int(numero_album))
+        contadores = self.estadisticas_en_vivo(*album)
+        if contadores is not None:
+            return contadores
+
+        for _ in range(10):
+            generacion = self._generacion
+            if generacion % 2:
+                time.sleep(0.001)
+                continue
+            fila = self._leer_estadisticas(album)
+            with self._lock:
+                # Si se escribió un lote durante la lectura, repetir para no contar doble
+                if generacion != self._generacion:
+                    continue
+                resultado = self._sumar_pendientes(fila, self._pendientes_album.get(album))
+                # Reconciliado: a partir de aquí registrar() lo mantiene al día
+                if self._en_vivo is not None:
+                    self._en_vivo.guardar(album, resultado)
+            return resultado
+
+        return self._sumar_pendientes(self._leer_estadisticas(album), None)
+
+    @staticmethod
+    def _sumar_pendientes(fila, pendientes):
+        resultado = {columna: int((fila or {}).get(columna) or 0) for columna in COLUMNAS_ESTADISTICAS}
+        for columna, valor in (pendientes or {}).items():
+            resultado[columna] += valor
+        return resultado
+
+    def _veces_jugado_en_bd(self, clave):
+        fila = self._leer_fila('''
+                SELECT veces_jugado
+                FROM intentos_usuario_album
+                WHERE user_id_hash_bin = %s
+                  AND fecha_album = %s
+                  AND numero_album = %s
+            ''', clave)
+        return fila[0] if fila else 0
+
+    def _leer_estadisticas(self, album):
+        return self._leer_fila(f'''
+                SELECT {", ".join(COLUMNAS_ESTADISTICAS)}
+                FROM estadisticas_album
+                WHERE fecha_album = %s AND numero_album = %s
+            ''', album, dictionary=True)
+
+    @staticmethod
+    def _leer_fila(sentencia, params, dictionary=False):
+        """Una fila leída en su propia transacción.
+
+        La conexión de la petición no está en autocommit: con REPEATABLE READ
+        la primera lectura fija la instantánea y las siguientes de la misma
+        petición no verían los lotes que el hilo escriba entre medias (que ya
+        no están en los pendientes). Se cierra la transacción antes y después.
+        """
+        db = Database()
+        conexion = db.connect()
+        if conexion is None:
+            raise Error('No hay conexión con la base de datos')
+        cursor = conexion.cursor(dictionary=dictionary)
+        try:
+            conexion.commit()
+            cursor.execute(sentencia, params)
+            # fetchall: el commit no admite resultados sin leer
+            filas = cursor.fetchall()
+            conexion.commit()
+            return filas[0] if filas else None
+        finally:
+            cursor.close()
+            db.close()
+
+    # -- Cola y escritura ------------------------------------------------
+
+    def _encolar(self, evento):
+        if self._activo:
+            self._arrancar()
+            try:
+                self._cola.put_nowait(evento)
+                return
+            except queue.Full:
+                pass
+        # Sin write-behind, o cola llena: escribir ahora mismo
+        self.escrituras_directas += 1
+        self._persistir([evento])
+
+    def _arrancar(self):
+        # Tras un fork el hilo del padre no existe en el hijo: arrancar otro
+        if self._hilo is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._hilo is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._detener.clear()
+            self._hilo = threading.Thread(target=self._bucle, name='registro-intentos', daemon=True)
+            self._hilo.start()
+            if not self._atexit_registrado:
+                atexit.register(self.detener)
+                self._atexit_registrado = True
+
+    def _bucle(self):
+        reintentar = []
+        while not (self._detener.is_set() and self._cola.empty() and not reintentar):
+            lote = reintentar
+            limite = time.monotonic() + self._intervalo
+            while len(lote) < self._max_lote:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                try:
+                    lote.append(self._cola.get(timeout=restante))
+                except queue.Empty:
+                    break
+            if self._detener.is_set():
+                # Vaciando por cierre: no esperar a que pase el intervalo
+                while len(lote) < self._max_lote:
+                    try:
+                        lote.append(self._cola.get_nowait())
+                    except queue.Empty:
+                        break
+
+            if not lote:
+                reintentar = []
+                continue
+            reintentar, error = self._escribir(lote)
+            if reintentar:
+                log.warning("Error escribiendo lote de intentos, se reintentará: %s", error,
+                            extra={'intentos': len(reintentar)})
+                if self._detener.wait(1):
+                    # Cerrando y la BD sigue fallando: un último intento y salir
+                    perdidos, error = self._escribir(reintentar)
+                    if perdidos:
+                        log.error("Se pierden intentos sin escribir: %s", error, extra={'intentos': len(perdidos)})
+                    reintentar = []
+
+    def _escribir(self, lote):
+        """Persiste `lote` aislando las partidas que MySQL rechaza.
+
+        Ante un error permanente parte el lote en dos y reintenta cada mitad;
+        una partida que falla sola se descarta. Devuelve (partidas sin
+        escribir por un error transitorio, ese error) para reintentarlas.
+        """
+        try:
+            self._persistir(lote)
+            return [], None
+        except ERRORES_PERMANENTES as e:
+            if len(lote) == 1:
+                self._descartar(lote[0], e)
+                return [], None
+            mitad = len(lote) // 2
+            pendientes, error = self._escribir(lote[:mitad])
+            if pendientes:
+                return pendientes + lote[mitad:], error
+            return self._escribir(lote[mitad:])
+        except Exception as e:
+            return lote, e
+
+    def _descartar(self, evento, error):
+        user_id_hash, fecha, numero = evento['clave']
+        log.error("Se descarta una partida que MySQL rechaza: %s", error, extra={
+            'user_id_hash': user_id_hash.hex(), 'fecha_album': fecha, 'numero_album': numero,
+            'primera_vez': evento['primera_vez'],
+        })
+        self.intentos_descartados += 1
+        self._quitar_pendientes([evento], descartar=True)
+
+    @property
+    def en_cola(self):
+        """Partidas encoladas que el hilo aún no ha recogido"""
+        return self._cola.qsize()
+
+    def detener(self, timeout=10):
+        """Vacía la cola y para el hilo (se llama al cerrar el proceso)"""
+        if self._hilo is None or self._pid != os.getpid():
+            return
+        self._detener.set()
+        self._hilo.join(timeout)
+        self._hilo = None
+
+    def _persistir(self, lote):
+        """Escribe un lote de partidas en una única transacción"""
+        partidas = Counter()
+        primeras = {}
+        for evento in lote:
+            clave = evento['clave']
+            partidas[clave] += 1
+            if evento['primera_vez']:
+                primeras[clave] = evento
+
+        db = Database()
+        conexion = db.connect()
+        if conexion is None:
+            raise Error('No hay conexión con la base de datos')
+        cursor = conexion.cursor()
+        try:
+            # Otro worker también pudo tomarla por su primera partida y escribir
+            # ya la fila: esas partidas se suman sin volver a contar al jugador
+            # en las estadísticas. FOR UPDATE lee lo confirmado y bloquea el
+            # hueco, así que dos lotes no insertan a la vez la misma fila.
+            duplicadas = self._filas_existentes(cursor, list(primeras)) if primeras else set()
+            for clave in duplicadas:
+                del primeras[clave]
+
+            # Jugadores nuevos: una fila con todas las partidas del lote
+            # (user_id_hash en hexadecimal se sigue rellenando para el código anterior).
+            # ON DUPLICATE KEY por si aun así la fila aparece: mejor sumar que fallar el lote.
+            nuevos = [
+                (clave[0], clave[0].hex(), clave[1], clave[2], evento['acierto'], evento['intentos'], partidas[clave])
+                for clave, evento in primeras.items()
+            ]
+            # Jugadores que ya tenían fila: sumar las partidas
+            repetidos = [
+                (veces, clave[0], clave[1], clave[2])
+                for clave, veces in partidas.items() if clave not in primeras
+            ]
+            incrementos = {}
+            for clave, evento in primeras.items():
+                incrementos.setdefault(clave[1:], Counter()).update(
+                    deltas_estadisticas(evento['acierto'], evento['intentos'])
+                )
+            albumes = [
+                (fecha, numero) + tuple(deltas[columna] for columna in COLUMNAS_ESTADISTICAS)
+                for (fecha, numero), deltas in incrementos.items()
+            ]
+
+            if nuevos:
+                cursor.execute(
+                    '''
+                    INSERT INTO intentos_usuario_album
+                    (user_id_hash_bin, user_id_hash, fecha_album, numero_album, acierto, intentos_necesarios, veces_jugado)
+                    VALUES ''' + ', '.join(['(%s, %s, %s, %s, %s, %s, %s)'] * len(nuevos)) + '''
+                    ON DUPLICATE KEY UPDATE
+                        veces_jugado = veces_jugado + VALUES(veces_jugado),
+                        updated_at = CURRENT_TIMESTAMP
+                    ''',
+                    [valor for fila in nuevos for valor in fila]
+                )
+            if repetidos:
+                cursor.executemany('''
+                    UPDATE intentos_usuario_album
+                    SET veces_jugado = veces_jugado + %s,
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE user_id_hash_bin = %s
+                      AND fecha_album = %s
+                      AND numero_album = %s
+                ''', repetidos)
+            if albumes:
+                columnas = ('fecha_album', 'numero_album') + COLUMNAS_ESTADISTICAS
+                cursor.execute(
+                    f'''
+                    INSERT INTO estadisticas_album ({", ".join(columnas)})
+                    VALUES ''' + ', '.join(['(' + ', '.join(['%s'] * len(columnas)) + ')'] * len(albumes)) + '''
+                    ON DUPLICATE KEY UPDATE
+                    ''' + ',\n'.join(f'{c} = {c} + VALUES({c})' for c in COLUMNAS_ESTADISTICAS),
+                    [valor for fila in albumes for valor in fila]
+                )
+            with self._lock:
+                self._generacion += 1
+            try:
+                conexion.commit()
+            except Exception:
+                with self._lock:
+                    self._generacion += 1
+                raise
+        except Exception:
+            conexion.rollback()
+            raise
+        finally:
+            cursor.close()
+            db.close()
+
+        # Ya está en BD: dejar de sumarlo desde memoria
+        self._quitar_pendientes(lote, escrito=True, duplicadas=duplicadas)
+
+    @staticmethod
+    def _filas_existentes(cursor, claves):
+        """Claves de `claves` que ya tienen fila en intentos_usuario_album (bloqueadas hasta el commit)"""
+        cursor.execute(
+            '''
+            SELECT user_id_hash_bin, fecha_album, numero_album
+            FROM intentos_usuario_album
+            WHERE (user_id_hash_bin, fecha_album, numero_album) IN ('''
+            + ', '.join(['(%s, %s, %s)'] * len(claves)) + ''')
+            FOR UPDATE
+            ''',
+            [valor for clave in claves for valor in clave]
+        )
+        return {(bytes(fila[0]), str(fila[1]), int(fila[2])) for fila in cursor.fetchall()}
+
+    def _quitar_pendientes(self, lote, escrito=False, descartar=False, duplicadas=()):
+        """Deja de sumar desde memoria las partidas de `lote`.
+
+        `escrito`: ya están en BD (cierra el seqlock abierto por _persistir).
+        `descartar`: no se van a escribir nunca, así que también se restan de
+        los contadores en vivo. `duplicadas`: claves cuya primera partida
+        resultó no serlo (otro worker escribió antes la fila); sus incrementos
+        no llegaron a BD y también se restan de los contadores en vivo.
+        """
+        partidas = Counter(evento['clave'] for evento in lote)
+        incrementos = {}
+        no_escritos = {}
+        for evento in lote:
+            if evento['primera_vez']:
+                deltas = deltas_estadisticas(evento['acierto'], evento['intentos'])
+                incrementos.setdefault(evento['clave'][1:], Counter()).update(deltas)
+                if descartar or evento['clave'] in duplicadas:
+                    no_escritos.setdefault(evento['clave'][1:], Counter()).update(deltas)
+
+        with self._lock:
+            for evento in lote:
+                if self._primeras_pendientes.get(evento['clave']) is evento:
+                    del self._primeras_pendientes[evento['clave']]
+            for clave, veces in partidas.items():
+                restantes = self._pendientes_jugador.get(clave, 0) - veces
+                if restantes > 0:
+                    self._pendientes_jugador[clave] = restantes
+                else:
+                    self._pendientes_jugador.pop(clave, None)
+            for album, deltas in incrementos.items():
+                pendientes = self._pendientes_album.get(album)
+                if pendientes is not None:
+                    pendientes.subtract(deltas)
+                    if not any(pendientes.values()):
+                        del self._pendientes_album[album]
+            if self._en_vivo is not None:
+                for album, deltas in no_escritos.items():
+                    self._en_vivo.sumar(album, {columna: -valor for columna, valor in deltas.items()})
+            if escrito:
+                self._generacion += 1
+                self.lotes_escritos += 1
+                self.intentos_escritos += len(lote)
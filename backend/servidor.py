@@ -0,0 +1,171 @@
+"""Arranque en producción con gunicorn.
+
+Uso: python servidor.py
+     (equivale a: gunicorn -c servidor.py app:app)
+
+La app se importa una sola vez en el proceso maestro (preload) y allí se
+calientan el álbum del día, el corpus de títulos y el índice del buscador;
+los workers los heredan ya cargados al hacer fork. Cada worker crea su
+propio pool de MySQL, abre las conexiones antes de aceptar tráfico y, un
+poco antes de medianoche, carga el álbum de mañana para que la primera
+oleada de jugadores no espere a la base de datos.
+"""
+import logging
+import threading
+import time
+from datetime import date, datetime, timedelta
+from config import Config
+
+log = logging.getLogger('muzikdle.servidor')
+
+# -- Configuración de gunicorn (también se lee con `gunicorn -c servidor.py`) --
+
+wsgi_app = 'app:app'
+bind = Config.SERVIDOR_BIND
+workers = Config.SERVIDOR_WORKERS
+worker_class = 'gthread'
+threads = Config.SERVIDOR_THREADS
+timeout = Config.SERVIDOR_TIMEOUT
+graceful_timeout = 30
+preload_app = True
+# Reciclar workers de vez en cuando, escalonados para que no coincidan
+max_requests = 20000
+max_requests_jitter = 2000
+accesslog = '-'
+
+
+def calentar(fecha=None):
+    """Carga en memoria lo que necesitan las primeras peticiones de `fecha` (hoy por defecto)"""
+    from app import cache_albumes, corpus_titulos, indice_titulos
+
+    inicio = time.monotonic()
+    fecha = fecha or date.today()
+    album = cache_albumes.obtener(fecha)
+    snapshot = corpus_titulos.obtener()
+    indice_titulos.reconstruir()
+    log.info("Caches calentadas", extra={
+        'ms': round((time.monotonic() - inicio) * 1000),
+        'fecha': fecha,
+        'imagenes': len(album['imagenes']) if album else 0,
+        'corpus': snapshot['version'] if snapshot else None,
+    })
+
+
+def abrir_conexiones(cantidad):
+    """Abre `cantidad` conexiones del pool y las devuelve, para no pagar el handshake en una petición"""
+    from database import obtener_conexion, devolver_conexion
+
+    conexiones = []
+    try:
+        for _ in range(cantidad):
+            conexiones.append(obtener_conexion())
+    except Exception as e:
+        log.warning("No se pudieron abrir todas las conexiones del pool: %s", e)
+    finally:
+        for conexion in conexiones:
+            devolver_conexion(conexion)
+    return len(conexiones)
+
+
+def proxima_precarga(ahora=None, antes=None):
+    """Siguiente instante (futuro) en que toca cargar el álbum del día siguiente"""
+    ahora = ahora or datetime.now()
+    antes = Config.PRECALENTAR_ANTES_MEDIANOCHE if antes is None else antes
+    medianoche = datetime.combine(ahora.date() + timedelta(days=1), datetime.min.time())
+    objetivo = medianoche - timedelta(seconds=antes)
+    if objetivo <= ahora:
+        objetivo += timedelta(days=1)
+    return objetivo
+
+
+def _bucle_medianoche(detener):
+    from app import cache_albumes, recargar_album
+    from planificador import planificar
+
+    while True:
+        espera = (proxima_precarga() - datetime.now()).total_seconds()
+        if detener.wait(max(espera, 0)):
+            return
+        manana = date.today() + timedelta(days=1)
+        if Config.PLANIFICADOR_DIAS:
+            # Lo lanza cada worker: el primero programa y los demás ya no encuentran días libres
+            # (si dos coinciden, la comprobación de seis pistas deshace el segundo)
+            try:
+                planificar(Config.PLANIFICADOR_DIAS, manana, calentar=recargar_album)
+            except Exception as e:
+                log.warning("No se pudieron programar los próximos días: %s", e)
+        try:
+            album = cache_albumes.obtener(manana)
+            log.info("Álbum de mañana en caché", extra={
+                'fecha': manana, 'imagenes': len(album['imagenes']) if album else 0
+            })
+        except Exception as e:
+            log.warning("No se pudo precargar el álbum de %s: %s", manana, e)
+
+
+_detener_medianoche = threading.Event()
+
+
+def arrancar_precarga_medianoche():
+    hilo = threading.Thread(
+        target=_bucle_medianoche, args=(_detener_medianoche,), name='precarga-medianoche', daemon=True
+    )
+    hilo.start()
+    return hilo
+
+
+# -- Hooks de gunicorn --------------------------------------------------------
+
+def when_ready(server):
+    # Maestro, con la app ya importada y antes de crear los workers
+    try:
+        calentar()
+    except Exception as e:
+        log.warning("Calentamiento incompleto (se cargará bajo demanda): %s", e)
+    finally:
+        # Los workers no deben heredar sockets de MySQL abiertos por el maestro
+        from database import cerrar_pool
+        cerrar_pool()
+
+
+def post_fork(server, worker):
+    from database import reiniciar_pool
+    reiniciar_pool()
+
+
+def post_worker_init(worker):
+    # El worker aún no acepta conexiones: buen momento para abrir las del pool
+    abiertas = abrir_conexiones(min(Config.DB_POOL_SIZE, Config.SERVIDOR_THREADS))
+    # Si el maestro no pudo calentar (p. ej. MySQL aún no estaba), intentarlo aquí
+    from app import cache_albumes
+    entrada, _ = cache_albumes.consultar(date.today())
+    if entrada is None:
+        try:
+            calentar()
+        except Exception as e:
+            log.warning("Calentamiento del worker incompleto: %s", e)
+    arrancar_precarga_medianoche()
+    log.info("Worker listo", extra={'pid': worker.pid, 'conexiones': abiertas})
+
+
+def worker_exit(server, worker):
+    _detener_medianoche.set()
+
+
+if __name__ == '__main__':
+    from gunicorn.app.base import BaseApplication
+
+    class ServidorMuzikdle(BaseApplication):
+        def load_config(self):
+            ajustes = {
+                nombre: valor for nombre, valor in globals().items()
+                if nombre in self.cfg.settings and valor is not None
+            }
+            for nombre, valor in ajustes.items():
+                self.cfg.set(nombre, valor)
+
+        def load(self):
+            from app import app
+            return app
+
+    ServidorMuzikdle().run()
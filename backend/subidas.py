@@ -0,0 +1,111 @@
+import hashlib
+import os
+import tempfile
+from flask import Request, current_app
+from werkzeug.exceptions import RequestEntityTooLarge, UnsupportedMediaType
+
+# Firmas (magic bytes) de los formatos admitidos -> extensión con la que se guardan
+FIRMAS_IMAGEN = (
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+)
+BYTES_FIRMA = max(len(firma) for firma, _ in FIRMAS_IMAGEN)
+
+
+def tipo_por_firma(cabecera):
+    """Extensión real según los primeros bytes del archivo (None si no es una imagen admitida)"""
+    for firma, extension in FIRMAS_IMAGEN:
+        if cabecera.startswith(firma):
+            return extension
+    return None
+
+
+class ArchivoSubido:
+    """Destino de un archivo del multipart mientras Werkzeug lo va leyendo.
+
+    Cada bloque se escribe directamente en un temporal de la carpeta de
+    uploads mientras se calcula su sha256. Con los primeros bytes se
+    comprueba la firma y, si no es una imagen admitida o el archivo supera
+    `limite`, se corta la lectura del cuerpo en ese mismo momento. Después
+    basta un rename atómico (almacen.mover_por_contenido) para guardarlo.
+    """
+
+    def __init__(self, carpeta, limite, extensiones):
+        descriptor, self.ruta = tempfile.mkstemp(dir=carpeta, prefix='.subida-', suffix='.tmp')
+        self._archivo = os.fdopen(descriptor, 'w+b')
+        self._hash = hashlib.sha256()
+        self._limite = limite
+        self._extensiones = extensiones
+        self._cabecera = b''
+        self.tipo = None
+        self.bytes = 0
+
+    def write(self, datos):
+        self.bytes += len(datos)
+        if self._limite is not None and self.bytes > self._limite:
+            raise RequestEntityTooLarge('La imagen supera el tamaño máximo')
+
+        # Decidir el tipo en cuanto llegan los bytes de la firma (un archivo más corto queda sin tipo)
+        if self.tipo is None:
+            self._cabecera += datos[:BYTES_FIRMA - len(self._cabecera)]
+            if len(self._cabecera) >= BYTES_FIRMA:
+                self.tipo = tipo_por_firma(self._cabecera)
+                if self.tipo is None:
+                    raise UnsupportedMediaType('El archivo no es una imagen JPEG, PNG o GIF')
+                if self.tipo not in self._extensiones:
+                    raise UnsupportedMediaType(f'Tipo de imagen no permitido: {self.tipo}')
+
+        self._hash.update(datos)
+        return self._archivo.write(datos)
+
+    @property
+    def sha256(self):
+        return self._hash.hexdigest()
+
+    def cerrar(self):
+        """Vuelca y cierra el temporal antes de renombrarlo"""
+        if not self._archivo.closed:
+            self._archivo.flush()
+            self._archivo.close()
+
+    def descartar(self):
+        self.cerrar()
+        if os.path.exists(self.ruta):
+            os.remove(self.ruta)
+
+    def __getattr__(self, nombre):
+        # seek/read/tell... los usa FileStorage sobre el archivo ya escrito
+        return getattr(self._archivo, nombre)
+
+
+class PeticionConSubidas(Request):
+    """Request que escribe las imágenes subidas en streaming a la carpeta de uploads.
+
+    Solo se aplica a los endpoints de `endpoints_imagen`; el resto de
+    subidas (p. ej. la importación de archivos ZIP/TAR) usan el temporal
+    por defecto de Werkzeug. Los temporales que la vista no llegue a
+    renombrar se borran al cerrar la petición.
+    """
+
+    endpoints_imagen = {'subir_imagen'}
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if self.endpoint not in self.endpoints_imagen:
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+
+        archivo = ArchivoSubido(
+            current_app.config['UPLOAD_FOLDER'],
+            self.max_content_length,
+            current_app.config['ALLOWED_EXTENSIONS']
+        )
+        self.__dict__.setdefault('_archivos_subidos', []).append(archivo)
+        return archivo
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            for archivo in self.__dict__.get('_archivos_subidos', []):
+                archivo.descartar()
@@ -15,6 +15,16 @@ const btnJugar = document.getElementById('btn-jugar-historial');
 
 // Variables
 let albumes = [];
+// Paginación: fecha a pasar como ?antes= para la siguiente página (null = no hay más)
+let siguientePagina = null;
+let cargandoPagina = false;
+let observadorPagina = null;
+const ALBUMES_POR_PAGINA = 120;
+// Mismo user_id que guarda script.js (sin él, el jugador aún no ha jugado nada)
+const USER_ID = localStorage.getItem('muzikdle_user_id');
+// Días como mucho por petición a /api/mis-intentos (MIS_INTENTOS_MAX_DIAS en el servidor)
+const MAX_DIAS_MIS_INTENTOS = 366;
+const MS_POR_DIA = 1000 * 3600 * 24;
 //let albumSeleccionado = null;
 // ⚠️ CAMBIA ESTA FECHA a cuando empezó TU álbum
 const FECHA_INICIO = '2026-01-26';
@@ -36,32 +46,39 @@ function filtrarAlbumesPasados(albumes) {
         }
     });
 }
-// Cargar historial
+// Pedir una página del historial (del más reciente al más antiguo)
+async function pedirPaginaHistorial(antes) {
+    const params = new URLSearchParams({ limite: ALBUMES_POR_PAGINA });
+    if (antes) {
+        params.set('antes', antes);
+    }
+
+    const response = await fetch(`${API_URL}/historial-completo?${params}`);
+
+    if (!response.ok) {
+        throw new Error(`Error HTTP: ${response.status}`);
+    }
+
+    return response.json();
+}
+
+// Cargar historial (primera página)
 async function cargarHistorial() {
     try {
         cargandoElement.style.display = 'flex';
         sinAlbumesElement.style.display = 'none';
 
-        const response = await fetch(`${API_URL}/historial-completo`);
-
-        if (!response.ok) {
-            throw new Error(`Error HTTP: ${response.status}`);
-        }
-
-        const data = await response.json();
+        const data = await pedirPaginaHistorial(null);
 
         if (data.success && data.albumes && data.albumes.length > 0) {
-            // 1. Ordenar por fecha (más antiguo primero)
-            let albumesOrdenados = data.albumes.sort((a, b) => {
-                return new Date(a.fecha_programada) - new Date(b.fecha_programada);
-            });
-
-            // 2. FILTRAR: Solo álbumes que YA HAN PASADO (fecha <= hoy)
-            albumes = filtrarAlbumesPasados(albumesOrdenados);
-
+            // Solo álbumes que YA HAN PASADO (el servidor ya los da ordenados, más reciente primero)
+            albumes = filtrarAlbumesPasados(data.albumes);
+            siguientePagina = data.siguiente || null;
 
             if (albumes.length > 0) {
                 crearBotones();
+                marcarResultados(albumes);
+                observarFinalDeLista();
             } else {
                 mostrarMensajeSinAlbumes();
             }
@@ -78,6 +95,57 @@ async function cargarHistorial() {
     }
 }
 
+// Cargar la siguiente página (más antigua) y añadir sus botones
+async function cargarMasAlbumes() {
+    if (!siguientePagina || cargandoPagina) {
+        return;
+    }
+    cargandoPagina = true;
+    try {
+        const data = await pedirPaginaHistorial(siguientePagina);
+        const nuevos = data.success && data.albumes ? filtrarAlbumesPasados(data.albumes) : [];
+        siguientePagina = data.siguiente || null;
+        albumes = albumes.concat(nuevos);
+        nuevos.forEach(album => botonesGrid.appendChild(crearBotonAlbum(album)));
+        marcarResultados(nuevos);
+    } catch (error) {
+        console.error('❌ Error cargando más álbumes:', error);
+    } finally {
+        cargandoPagina = false;
+        if (!siguientePagina && observadorPagina) {
+            observadorPagina.disconnect();
+        }
+    }
+}
+
+// Pedir la siguiente página cuando el final de la lista se acerca a la pantalla
+function observarFinalDeLista() {
+    if (!siguientePagina) {
+        return;
+    }
+    let centinela = document.getElementById('fin-historial');
+    if (!centinela) {
+        centinela = document.createElement('div');
+        centinela.id = 'fin-historial';
+        botonesGrid.insertAdjacentElement('afterend', centinela);
+    }
+    if (!('IntersectionObserver' in window)) {
+        // Navegadores antiguos: todo de una vez
+        (async () => {
+            while (siguientePagina) {
+                await cargarMasAlbumes();
+            }
+        })();
+        return;
+    }
+    observadorPagina = new IntersectionObserver(entradas => {
+        if (entradas.some(entrada => entrada.isIntersecting)) {
+            cargarMasAlbumes();
+        }
+    }, { rootMargin: '400px' });
+    observadorPagina.observe(centinela);
+}
+
 
 // Calcular número del día desde fecha
 function calcularNumeroDia(fechaString) {
@@ -110,28 +178,102 @@ function crearBotones() {
     botonesGrid.innerHTML = '';
     botonesGrid.style.display = 'grid';
 
-    albumes.forEach((album, index) => {
-        const numeroDia = calcularNumeroDia(album.fecha_programada);
+    albumes.forEach(album => {
+        botonesGrid.appendChild(crearBotonAlbum(album));
+    });
 
-        const boton = document.createElement('button');
-        boton.className = 'btn-dia';
-        boton.dataset.fecha = album.fecha_programada;
-        boton.dataset.numero = numeroDia;
+}
+
+// Botón de un día (va directamente al juego)
+function crearBotonAlbum(album) {
+    const numeroDia = calcularNumeroDia(album.fecha_programada);
 
-        boton.innerHTML = `
-            <div class="numero-dia">${numeroDia}</div>
-        `;
+    const boton = document.createElement('button');
+    boton.className = 'btn-dia';
+    boton.dataset.fecha = album.fecha_programada;
+    boton.dataset.numero = numeroDia;
 
-        boton.addEventListener('click', () => {
-            jugarAlbum(album.fecha_programada, numeroDia);
-        });
+    boton.innerHTML = `
+        <div class="numero-dia">${numeroDia}</div>
+    `;
 
-        botonesGrid.appendChild(boton);
+    boton.addEventListener('click', () => {
+        jugarAlbum(album.fecha_programada, numeroDia);
     });
 
+    return boton;
+}
+
+
+// Fecha 'YYYY-MM-DD' <-> milisegundos UTC
+function fechaAMs(fecha) {
+    const [year, month, day] = fecha.split('-').map(Number);
+    return Date.UTC(year, month - 1, day);
+}
+
+function msAFecha(ms) {
+    return new Date(ms).toISOString().slice(0, 10);
+}
+
+// Pedir los resultados del jugador en los álbumes de una página (una petición por cada tramo de días)
+async function marcarResultados(albumesPagina) {
+    if (!USER_ID || albumesPagina.length === 0) {
+        return;
+    }
+
+    const fechas = albumesPagina.map(album => fechaAMs(album.fecha_programada));
+    const desde = Math.min(...fechas);
+    let hasta = Math.max(...fechas);
+
+    try {
+        while (hasta >= desde) {
+            const inicioTramo = Math.max(desde, hasta - (MAX_DIAS_MIS_INTENTOS - 1) * MS_POR_DIA);
+            const params = new URLSearchParams({ desde: msAFecha(inicioTramo), hasta: msAFecha(hasta) });
+            const response = await fetch(`${API_URL}/mis-intentos?${params}`, {
+                headers: { 'X-User-ID': USER_ID }
+            });
+            if (!response.ok) {
+                throw new Error(`Error HTTP: ${response.status}`);
+            }
+            const data = await response.json();
+            if (data.success) {
+                aplicarResultados(data);
+            }
+            hasta = inicioTramo - MS_POR_DIA;
+        }
+    } catch (error) {
+        // Las insignias son opcionales: el historial funciona igual sin ellas
+        console.warn('⚠️ No se pudieron cargar tus resultados:', error);
+    }
 }
 
+// Respuesta compacta: cada fila es [dia, numero, acierto, intentos, veces] según data.campos
+function aplicarResultados(data) {
+    const columna = {};
+    data.campos.forEach((campo, indice) => {
+        columna[campo] = indice;
+    });
+    const inicio = fechaAMs(data.desde);
 
+    data.intentos.forEach(fila => {
+        const fecha = msAFecha(inicio + fila[columna.dia] * MS_POR_DIA);
+        const boton = botonesGrid.querySelector(`.btn-dia[data-fecha="${fecha}"]`);
+        if (!boton || boton.querySelector('.insignia-resultado')) {
+            return;
+        }
+        const acierto = fila[columna.acierto] === 1;
+        const intentos = fila[columna.intentos];
+
+        const insignia = document.createElement('div');
+        insignia.className = 'insignia-resultado';
+        insignia.textContent = acierto ? `✓ ${intentos}` : '✗';
+        insignia.title = acierto
+            ? `Acertado en ${intentos} intento${intentos > 1 ? 's' : ''}`
+            : 'No acertado';
+        boton.classList.add(acierto ? 'resuelto' : 'fallado');
+        boton.appendChild(insignia);
+    });
+}
 
 // Ir directamente al álbum seleccionado
 function jugarAlbum(fecha, numeroDia) {